@@ -1,16 +1,48 @@
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient
+from shared_code.blob_streaming import stream_copy
+from shared_code.blob_dedup import BlobDedup
+from shared_code.blob_compression import CODECS, compress_chunks, content_settings_for
+from shared_code.storage_clients import get_blob_service_client
+from shared_code.instrumentation import instrumented, current_invocation
+import hashlib
 import os
 import logging
 
 # define the app instance
 app = func.FunctionApp() # This line defines the app instance
 
+# Streaming copy settings. When enabled the blob is copied in fixed-size staged blocks instead of
+# being read fully into memory, so multi-GB files don't exhaust the worker's memory.
+STREAMING_COPY_ENABLED = os.environ.get("STREAMING_COPY_ENABLED", "true").lower() == "true"
+STREAM_BLOCK_SIZE = int(os.environ.get("STREAM_BLOCK_SIZE", 4 * 1024 * 1024)) # Bytes per staged block
+STREAM_UPLOAD_CONCURRENCY = int(os.environ.get("STREAM_UPLOAD_CONCURRENCY", 4)) # Blocks uploaded in parallel
+
+# Skip copies whose target already has the same size and Content-MD5 (re-uploads of identical files).
+# The target fingerprints of recent copies are cached per worker, so most checks need no HEAD request.
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+blob_dedup = BlobDedup(max_entries=int(os.environ.get("DEDUP_CACHE_SIZE", 100000)),
+                       ttl_seconds=float(os.environ.get("DEDUP_CACHE_TTL_SECONDS", 3600)))
+
+# Optional transcoding of text blobs (.txt/.csv/.json) while they are copied. The target keeps its name and
+# gets Content-Encoding: gzip|zstd, so clients that honour Content-Encoding decompress it transparently.
+TRANSCODE_CODEC = os.environ.get("TRANSCODE_CODEC", "none").lower() # none, gzip or zstd (needs 'zstandard')
+TRANSCODE_LEVEL = int(os.environ["TRANSCODE_LEVEL"]) if os.environ.get("TRANSCODE_LEVEL") else None # Codec default if unset
+TRANSCODE_MIN_BYTES = int(os.environ.get("TRANSCODE_MIN_BYTES", 64 * 1024)) # Smaller blobs aren't worth compressing
+
+def _with_preview(chunks, log_preview):
+    # Passes the chunks through, handing the first one to log_preview
+    for index, chunk in enumerate(chunks):
+        if index == 0:
+            log_preview(chunk)
+        yield chunk
+
 # registers the function with the app
 @app.function_name(name="process_file") 
 # defines the trigger
 @app.blob_trigger(arg_name="myblob", path="input/{name}", connection="AzureWebJobsStorage")
 # defines the function that gets triggered. myblob is passes as func.InputStream
+# times the stages (download, dedup check, upload) and exports them when the invocation ends
+@instrumented("process_file")
 def process_file(myblob: func.InputStream):
     # reads the metadata and content of the blob
     logging.info(f"Blob name: {myblob.name}")
@@ -22,11 +54,13 @@ def process_file(myblob: func.InputStream):
     logging.info(f"Processing file: {file_name_only}")
 
     file_ext = os.path.splitext(file_name_only)[1].lower() # Use file_name_only for extension check
+    metrics = current_invocation()
     
-    #initialize the blob service clinet using the connection string from settings file
-    blob_service_client = BlobServiceClient.from_connection_string(os.environ["AzureWebJobsStorage"])
+    #get the blob service client for the AzureWebJobsStorage connection string from settings file.
+    #the client is built once per worker process and its connection pool is reused across invocations
+    blob_service_client = get_blob_service_client()
     #Define source and target container 
-    source_container_name = "input" # Not directly used for copying, but good for context
+    source_container_name = "input" # Used by the streaming copy to download the source blob
     target_container_name = "output"
    
     try:
@@ -36,16 +70,115 @@ def process_file(myblob: func.InputStream):
         # Get the blob client for the target file, using only the filename
         target_blob_client = target_container_client.get_blob_client(file_name_only)
         
+        is_text = file_ext in ['.txt', '.csv', '.json']
+
+        if STREAMING_COPY_ENABLED:
+            # myblob.name is "input/<path>", the path inside the container is everything after the first '/'
+            source_blob_name = myblob.name.split("/", 1)[1]
+            source_blob_client = blob_service_client.get_blob_client(container=source_container_name, blob=source_blob_name)
+
+            # Only the first block is looked at, the bytes are copied through unchanged (or compressed)
+            def log_preview(first_block):
+                if is_text:
+                    # The block may end in the middle of a multi-byte character, so ignore decode errors here
+                    logging.info(f"Content preview: {first_block[:400].decode('utf-8', errors='ignore')[:100]}")
+
+            # The download response already carries the source's size, ETag and Content-MD5 (if it has one),
+            # so an unchanged file is skipped before the rest of it is downloaded
+            with metrics.span("download_open"):
+                downloader = source_blob_client.download_blob()
+            source_md5 = downloader.properties.content_settings.content_md5
+            source_version = (source_blob_client.url, downloader.properties.etag)
+            transcode = is_text and TRANSCODE_CODEC in CODECS and downloader.size >= TRANSCODE_MIN_BYTES
+            # A compressed target can't be compared with the source's MD5, only with the source version it was made from
+            with metrics.span("dedup_check"):
+                unchanged = DEDUP_ENABLED and blob_dedup.is_unchanged(downloader.size, None if transcode else source_md5,
+                                                                      target_blob_client, source=source_version)
+            if unchanged:
+                metrics.count("skipped_unchanged")
+                logging.info(f"Dedup: {blob_dedup.stats()}")
+                return
+
+            # Without a usable MD5 it is computed (over the bytes as stored) while streaming; if it
+            # matches the target the staged blocks are simply not committed. This costs the download and
+            # the staging of a new source version, repeated triggers for the same version were skipped above.
+            hasher = hashlib.md5()
+            should_commit = None
+            skipped_at_commit = False
+            if DEDUP_ENABLED and (transcode or not source_md5):
+                def should_commit(size):
+                    nonlocal skipped_at_commit
+                    skipped_at_commit = blob_dedup.is_unchanged(size, hasher.digest(), target_blob_client)
+                    if skipped_at_commit:
+                        # Now the next trigger for this source version is skipped before staging
+                        blob_dedup.remember(target_blob_client, size, hasher.digest(), source=source_version)
+                    return not skipped_at_commit
+
+            # "download" covers the time spent waiting for source chunks, "upload" the whole streamed copy
+            chunks = metrics.iterate("download", downloader.chunks(), measure=len)
+            if transcode:
+                # The preview is taken from the uncompressed data, before the compressor
+                chunks = compress_chunks(_with_preview(chunks, log_preview), TRANSCODE_CODEC, TRANSCODE_LEVEL)
+            with metrics.span("upload") as span:
+                copied_bytes = stream_copy(
+                    chunks,
+                    target_blob_client,
+                    block_size=STREAM_BLOCK_SIZE,
+                    max_concurrency=STREAM_UPLOAD_CONCURRENCY,
+                    on_first_block=None if transcode else log_preview,
+                    content_settings=content_settings_for(file_ext, TRANSCODE_CODEC if transcode else None) if is_text else None,
+                    hasher=hasher,
+                    should_commit=should_commit,
+                )
+                span.add(items=1, nbytes=copied_bytes)
+            # Not copied_bytes == 0: that is also what a committed empty blob returns
+            if skipped_at_commit:
+                metrics.count("skipped_unchanged")
+                logging.info(f"Dedup: {blob_dedup.stats()}")
+                return
+            blob_dedup.remember(target_blob_client, copied_bytes, hasher.digest(), source=source_version)
+            if transcode:
+                logging.info(f"Compressed '{file_name_only}' with {TRANSCODE_CODEC}: {downloader.size} -> {copied_bytes} bytes.")
+            logging.info(f"Successfully streamed {'text' if is_text else 'binary'} blob '{file_name_only}' ({copied_bytes} bytes) to '{target_container_name}' container.")
+
         # Read content based on file type and upload
-        if file_ext in ['.txt', '.csv', '.json']:
-            data = myblob.read().decode('utf-8')
+        elif is_text:
+            with metrics.span("download", items=1, nbytes=myblob.length or 0):
+                data = myblob.read().decode('utf-8')
             logging.info(f"Content preview: {data[:100]}")
-            target_blob_client.upload_blob(data.encode('UTF-8'), overwrite=True)
+            encoded = data.encode('UTF-8')
+            transcode = TRANSCODE_CODEC in CODECS and len(encoded) >= TRANSCODE_MIN_BYTES
+            if transcode:
+                with metrics.span("compress", items=1, nbytes=len(encoded)):
+                    encoded = b"".join(compress_chunks([encoded], TRANSCODE_CODEC, TRANSCODE_LEVEL))
+            md5 = hashlib.md5(encoded).digest()
+            with metrics.span("dedup_check"):
+                unchanged = DEDUP_ENABLED and blob_dedup.is_unchanged(len(encoded), md5, target_blob_client)
+            if unchanged:
+                metrics.count("skipped_unchanged")
+                return
+            content_settings = content_settings_for(file_ext, TRANSCODE_CODEC if transcode else None)
+            content_settings.content_md5 = bytearray(md5)
+            with metrics.span("upload", items=1, nbytes=len(encoded)):
+                target_blob_client.upload_blob(encoded, overwrite=True, content_settings=content_settings)
+            blob_dedup.remember(target_blob_client, len(encoded), md5)
             logging.info(f"Successfully uploaded text blob '{file_name_only}' to '{target_container_name}' container.")
         else:
-            data = myblob.read()
-            target_blob_client.upload_blob(data, overwrite=True)
+            with metrics.span("download", items=1, nbytes=myblob.length or 0):
+                data = myblob.read()
+            md5 = hashlib.md5(data).digest()
+            with metrics.span("dedup_check"):
+                unchanged = DEDUP_ENABLED and blob_dedup.is_unchanged(len(data), md5, target_blob_client)
+            if unchanged:
+                metrics.count("skipped_unchanged")
+                return
+            content_settings = content_settings_for(file_ext)
+            content_settings.content_md5 = bytearray(md5)
+            with metrics.span("upload", items=1, nbytes=len(data)):
+                target_blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
+            blob_dedup.remember(target_blob_client, len(data), md5)
             logging.info(f"Successfully uploaded binary blob '{file_name_only}' to '{target_container_name}' container.")
 
     except Exception as e:
         logging.error(f"Error copying blob: {e}")
+        metrics.count("copy_errors")
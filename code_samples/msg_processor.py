@@ -1,52 +1,79 @@
 import azure.functions as func
 import logging
 import json
-import sqlite3
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from shared_code.order_store import get_order_store, parse_orders
+from shared_code.email_outbox import OutboxDispatcher
+from shared_code.idempotency import IdempotencyCache
+from shared_code.instrumentation import instrumented, current_invocation
 import os
 
 app = func.FunctionApp()
 
+# Redelivered orders are skipped by order_id: first in memory, then by the processed_orders seen-set
+order_store = get_order_store(outbox=True, idempotency=IdempotencyCache(
+    max_entries=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "100000")),
+    ttl_seconds=float(os.environ.get("IDEMPOTENCY_CACHE_TTL_SECONDS", "3600"))))
+
+# Module level so the pooled SendGrid connections survive between timer runs
+email_outbox_dispatcher = OutboxDispatcher(order_store.path,
+                                           requests_per_second=float(os.environ.get("SENDGRID_REQUESTS_PER_SECOND", "10")))
+
 @app.queue_trigger(arg_name="msg", queue_name="order-queue", connection="AzureWebJobsStorage")
+@instrumented("order_processor")
 def order_processor(msg: func.QueueMessage):
     """
-    Processes orders from a queue, updates a database, and sends a confirmation email.
+    Processes orders from a queue, updates a database, and queues a confirmation email.
     """
+    metrics = current_invocation()
     try:
-        # Decode message body
-        order_data = json.loads(msg.get_body().decode('utf-8'))
+        # Decode and validate the message body (a single order, or several packed by send_orders)
+        body = msg.get_body()
+        with metrics.span("parse", nbytes=len(body)) as span:
+            orders = parse_orders(body)
+            span.add(items=len(orders))
+        if len(orders) > 1:
+            # A packed message is written in one transaction, so a retry never finds it half inserted
+            with metrics.span("store", items=len(orders)):
+                written = order_store.insert_orders(orders, status='Processed')
+            metrics.count("duplicates", len(orders) - written)
+            logging.info(f"Processed {written} packed orders ({len(orders) - written} duplicates skipped) "
+                         f"and queued their confirmation emails")
+            return
+        order_data = orders[0]
         logging.info(f"Processing order: {order_data}")
 
-        # Validate order data
-        required_fields = ['order_id', 'customer_email', 'amount']
-        if not all(field in order_data for field in required_fields):
-            raise ValueError("Missing required order fields")
-
-        # Update database (using SQLite for simplicity)
-        conn = sqlite3.connect('orders.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO orders (order_id, customer_email, amount, status)
-            VALUES (?, ?, ?, ?)
-        ''', (order_data['order_id'], order_data['customer_email'], order_data['amount'], 'Processed'))
-        conn.commit()
-        conn.close()
-
-        # Send confirmation email using SendGrid
-        message = Mail(
-            from_email='no-reply@ecommerce.com',
-            to_emails=order_data['customer_email'],
-            subject='Order Confirmation',
-            html_content=f'Thank you for your order #{order_data["order_id"]}! Total: ${order_data["amount"]}')
-        sg = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
-        sg.send(message)
-        logging.info(f"Sent confirmation email for order {order_data['order_id']}")
+        # Update database (using SQLite for simplicity). The worker's connection is reused and
+        # concurrent invocations are committed together in one transaction (group commit).
+        # The confirmation email is written to the outbox in the same transaction and sent by
+        # email_dispatcher, so a SendGrid outage can't make the queue retry (and re-insert) the order.
+        # submit() returns 0 for a redelivered order (an idempotency cache hit skips it before any I/O).
+        with metrics.span("store", items=1):
+            written = order_store.submit(order_data, status='Processed')
+        if not written:
+            metrics.count("duplicates")
+            logging.info(f"Skipping duplicate order {order_data['order_id']} ({order_store.idempotency.stats()})")
+            return
+        logging.info(f"Queued confirmation email for order {order_data['order_id']}")
 
     except json.JSONDecodeError:
         logging.error("Invalid JSON in message body")
+        metrics.count("invalid_messages")
     except ValueError as ve:
         logging.error(f"Validation error: {str(ve)}")
+        metrics.count("invalid_messages")
     except Exception as e:
         logging.error(f"Error processing order: {str(e)}")
-        raise  # Re-raise to trigger retry
\ No newline at end of file
+        raise  # Re-raise to trigger retry
+
+@app.timer_trigger(schedule="*/30 * * * * *", arg_name="timer", run_on_startup=False)
+@instrumented("email_dispatcher")
+def email_dispatcher(timer: func.TimerRequest):
+    """
+    Sends the queued confirmation emails in batches (one SendGrid request per up to 1000 recipients).
+    """
+    metrics = current_invocation()
+    with metrics.span("drain") as span:
+        counters = email_outbox_dispatcher.drain()
+        span.add(items=counters["sent"])
+    for name in ("failed", "retried", "requests"):
+        metrics.count(f"emails_{name}", counters[name])
@@ -48,17 +48,37 @@ Sends those events to your Azure Function named process_blob_event.
 Deploy the function with the code (provided below)
 Create the Event Grid subscription using the above command
 Upload a .csv file to input/ container
-Azure triggers the function, which sends blob info to the queue"""
+Azure triggers the function, which sends blob info to the queue
+
+🔹 3. Batched alternative (process_blob_events)
+During bulk uploads one invocation per event adds up to thousands of executions. process_blob_events
+is an HTTP webhook that takes up to 1000 events per delivery and filters them in-process
+(BLOB_EVENT_TYPES, BLOB_EVENT_SUBJECT_SUFFIXES app settings), so subscribe it as a webhook with batching:
+
+az eventgrid event-subscription create \
+    --name "$SUBSCRIPTION_NAME-batched" \
+    --source-resource-id $STORAGE_ID \
+    --endpoint-type webhook \
+    --endpoint "https://$FUNCTION_APP_NAME.azurewebsites.net/api/blob_events?code=<function-key>" \
+    --included-event-types Microsoft.Storage.BlobCreated \
+    --max-events-per-batch 1000 \
+    --preferred-batch-size-in-kilobytes 1024 \
+    --event-delivery-schema eventgridschema   # or cloudeventschemav1_0"""
 
 
 import azure.functions as func
 import json
 import logging
+import os
+import typing
+from shared_code.blob_events import BlobEventFilter, parse_events, queue_messages, validation_response
+from shared_code.instrumentation import instrumented, current_invocation
 
 app = func.FunctionApp()
 
 @app.event_grid_trigger(arg_name="event")
 @app.queue_output(arg_name="outputQueue", queue_name="order-queue", connection="AzureWebJobsStorage")
+@instrumented("process_blob_event")
 def process_blob_event(event: func.EventGridEvent, outputQueue: func.Out[str]):
     try:
         event_data = event.get_json()
@@ -82,4 +102,45 @@ def process_blob_event(event: func.EventGridEvent, outputQueue: func.Out[str]):
     except Exception as e:
         logging.error(f"[✗] Failed to process Event Grid event: {str(e)}")
 
+# Filters for the batched webhook, e.g. BLOB_EVENT_SUBJECT_SUFFIXES=".csv,.json"
+blob_event_filter = BlobEventFilter.from_settings(os.environ.get("BLOB_EVENT_TYPES"),
+                                                  os.environ.get("BLOB_EVENT_SUBJECT_SUFFIXES"))
 
+@app.route(route="blob_events", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.FUNCTION)
+@app.queue_output(arg_name="outputQueue", queue_name="order-queue", connection="AzureWebJobsStorage")
+@instrumented("process_blob_events")
+def process_blob_events(req: func.HttpRequest, outputQueue: func.Out[typing.List[str]]) -> func.HttpResponse:
+    """
+    Batched variant of process_blob_event for a webhook subscription: handles a whole Event Grid
+    (or CloudEvents) delivery per invocation and writes all matching events with one list output.
+    Subscribe with --endpoint-type webhook --max-events-per-batch 1000.
+    """
+    if req.method == "OPTIONS":
+        # CloudEvents webhook validation handshake
+        return func.HttpResponse(status_code=200, headers={"WebHook-Allowed-Origin": req.headers.get("WebHook-Request-Origin", "*")})
+    metrics = current_invocation()
+    body = req.get_body()
+    try:
+        with metrics.span("parse", nbytes=len(body)) as span:
+            events = parse_events(body)
+            span.add(items=len(events))
+    except ValueError as e:
+        # A malformed body fails the same way on every redelivery, so don't ask for one
+        logging.error(f"[✗] Rejected malformed Event Grid batch: {str(e)}")
+        return func.HttpResponse(f"Invalid event batch: {str(e)}", status_code=400)
+    try:
+        validation = validation_response(events)
+        if validation:
+            return func.HttpResponse(validation, status_code=200, mimetype="application/json")
+
+        with metrics.span("filter", items=len(events)):
+            messages, skipped = queue_messages(events, blob_event_filter)
+        metrics.count("skipped_events", skipped)
+        if messages:
+            outputQueue.set(messages)
+        logging.info(f"[✓] Sent {len(messages)} blob event messages to queue, skipped {skipped} events")
+        return func.HttpResponse(status_code=200)
+    except Exception as e:
+        logging.error(f"[✗] Failed to process Event Grid batch: {str(e)}")
+        # A 500 makes Event Grid redeliver the batch
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
@@ -1,15 +1,56 @@
 import azure.functions as func
 import json
+import typing
+from shared_code.order_ingest import iter_order_items, pack_messages, validate_items
+from shared_code.order_store import validate_order
+from shared_code.instrumentation import instrumented, current_invocation
 
 app = func.FunctionApp()
 
 @app.route(route="send_order", methods=["POST"])
 @app.queue_output(arg_name="outputQueue", queue_name="order-queue", connection="AzureWebJobsStorage")
+@instrumented("send_order")
 def send_order(req: func.HttpRequest, outputQueue: func.Out[str]) -> func.HttpResponse:
     try:
-        order_data = req.get_json()
+        # Validated with the same rules order_processor applies, so an order it would drop is refused here
+        order_data = validate_order(req.get_json())
         message = json.dumps(order_data)
         outputQueue.set(message)
         return func.HttpResponse(f"Sent message to queue: {message}", status_code=200)
+    except ValueError as e: # Also raised by get_json() for a body that isn't JSON
+        return func.HttpResponse(f"Invalid order: {str(e)}", status_code=400)
     except Exception as e:
-        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
\ No newline at end of file
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
+
+@app.route(route="send_orders", methods=["POST"])
+@app.queue_output(arg_name="outputQueue", queue_name="order-queue", connection="AzureWebJobsStorage")
+@instrumented("send_orders")
+def send_orders(req: func.HttpRequest, outputQueue: func.Out[typing.List[str]]) -> func.HttpResponse:
+    """
+    Bulk variant of send_order: the body is NDJSON (one order per line) or a JSON array of orders.
+    Every valid order is enqueued in this one invocation, as-is or, with ?pack=true, packed into
+    multi-order messages (?max_orders_per_message=100). The response reports every line as accepted
+    or rejected (?report=errors lists only the rejected lines, for very large bodies).
+    """
+    try:
+        pack = req.params.get("pack", "false").lower() == "true"
+        max_orders = int(req.params.get("max_orders_per_message", "100"))
+        metrics = current_invocation()
+        body = req.get_body()
+        with metrics.span("validate", nbytes=len(body)) as span:
+            accepted, report = validate_items(iter_order_items(body, req.headers.get("Content-Type", "")))
+            span.add(items=len(report))
+        metrics.count("rejected", len(report) - len(accepted))
+        # Valid orders are enqueued with their original JSON text, no json.dumps round trip
+        with metrics.span("pack", items=len(accepted)):
+            messages = pack_messages(accepted, max_orders) if pack else accepted
+        if messages:
+            outputQueue.set(messages)
+        if req.params.get("report") == "errors":
+            report = [line for line in report if not line["accepted"]]
+        result = {"accepted": len(accepted), "rejected": sum(1 for line in report if not line["accepted"]),
+                  "messages": len(messages), "lines": report}
+        return func.HttpResponse(json.dumps(result), status_code=200 if accepted or not report else 400,
+                                 mimetype="application/json")
+    except Exception as e:
+        return func.HttpResponse(f"Error: {str(e)}", status_code=500)
@@ -1,7 +1,7 @@
 ```python
 import json
 import os
-from azure.storage.queue import QueueClient, QueueMessage
+from shared_code.storage_clients import get_queue_client
 from azure.core.exceptions import AzureError
 
 # Get the connection string from environment variable
@@ -9,8 +9,8 @@ connection_string = os.environ.get("AzureWebJobsStorage")
 queue_name = "order-queue"
 
 try:
-    # Initialize the QueueClient
-    queue_client = QueueClient.from_connection_string(connection_string, queue_name)
+    # Get the QueueClient from the shared registry (built once per process, connection pool reused)
+    queue_client = get_queue_client(queue_name, connection_string)
 
     # Create the queue if it doesn't exist
     queue_client.create_queue()
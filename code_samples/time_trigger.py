@@ -1,7 +1,11 @@
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from azure.data.tables import TableServiceClient # Import for Azure Table Storage
-from datetime import datetime, timedelta
+from shared_code.storage_clients import get_blob_service_client, get_table_service_client
+from shared_code.blob_manifest import load_manifest, save_manifest, iter_changed_blobs
+from shared_code.copy_engine import CopyEngine, get_container_sas
+from shared_code.blob_dedup import BlobDedup
+from shared_code.instrumentation import instrumented, current_invocation
+from shared_code.table_batcher import TableWriteBuffer
+from datetime import datetime
 import os
 import logging
 import json # Import for JSON serialization of custom metadata
@@ -10,17 +14,58 @@ import json # Import for JSON serialization of custom metadata
 app = func.FunctionApp()
 
 # --- Configuration Constants (fetched from environment variables for flexibility) ---
-# These variables define the names of your storage containers and the timestamp blob.
+# These variables define the names of your storage containers and the scan manifest blob.
 # They are retrieved from environment variables (e.g., in local.settings.json or Azure portal app settings).
 SOURCE_CONTAINER_NAME = os.environ.get("SOURCE_CONTAINER_NAME", "input") # Default to 'input' if not set
 TARGET_CONTAINER_NAME = os.environ.get("TARGET_CONTAINER_NAME", "output") # Default to 'output' if not set
-LAST_SCAN_TIMESTAMP_BLOB_NAME = os.environ.get("LAST_SCAN_TIMESTAMP_BLOB_NAME", "last_scan_timestamp.txt") # Default filename for the timestamp blob
-METADATA_CONTAINER_NAME = os.environ.get("METADATA_CONTAINER_NAME", "function-metadata") # Container dedicated to storing timestamp blob
+SCAN_MANIFEST_BLOB_NAME = os.environ.get("SCAN_MANIFEST_BLOB_NAME", "scan_manifest.json.gz") # Blob holding the manifest of already scanned blobs
+METADATA_CONTAINER_NAME = os.environ.get("METADATA_CONTAINER_NAME", "function-metadata") # Container dedicated to storing metadata like the scan manifest
+# Listing is split into shards by blob name prefix (comma separated, e.g. "2024/,2025/"). The default "" is one shard for the whole container.
+SCAN_PREFIXES = [prefix.strip() for prefix in os.environ.get("SCAN_PREFIXES", "").split(",")]
+SCAN_MAX_PAGES = int(os.environ.get("SCAN_MAX_PAGES", 20)) # Max listing pages per run, the rest is resumed by the next run
+SCAN_PAGE_SIZE = int(os.environ.get("SCAN_PAGE_SIZE", 5000)) # Blobs per listing page (5000 is the service maximum)
+COPY_MAX_IN_FLIGHT = int(os.environ.get("COPY_MAX_IN_FLIGHT", 16)) # Number of copies started concurrently
+COPY_POLL_TIMEOUT = float(os.environ.get("COPY_POLL_TIMEOUT", 30)) # Seconds to wait for pending copies before the run ends
+# Skip copies whose target already has the same size and Content-MD5 (identical re-uploads get a new etag but the same MD5)
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+# Fill the dedup cache with one listing of the target per prefix (per worker and TTL) instead of a HEAD request per blob
+DEDUP_PRIME_TARGET = os.environ.get("DEDUP_PRIME_TARGET", "true").lower() == "true"
+
+# Cached target fingerprints live as long as the worker process, so later runs reuse them
+blob_dedup = BlobDedup(max_entries=int(os.environ.get("DEDUP_CACHE_SIZE", 100000)),
+                       ttl_seconds=float(os.environ.get("DEDUP_CACHE_TTL_SECONDS", 3600)))
 TABLE_NAME = os.environ.get("TABLE_NAME", "BlobMetadataTable") # Name of the Azure Table to store metadata
+TABLE_WRITE_WORKERS = int(os.environ.get("TABLE_WRITE_WORKERS", 4)) # Number of table batches written in parallel
+
+def build_metadata_entity(blob_item):
+    """
+    Builds the Azure Table entity holding the metadata of a listed blob.
+    PartitionKey and RowKey are mandatory, RowKey must be unique within a PartitionKey.
+    """
+    # Look up content_settings once instead of once per content field
+    content_settings = blob_item.content_settings
+    return {
+        "PartitionKey": SOURCE_CONTAINER_NAME, # Using source container name as PartitionKey
+        "RowKey": blob_item.name.replace("/", "---"), # Blob name as RowKey, replace '/' for validity
+        "BlobName": blob_item.name,
+        "BlobSize": blob_item.size,
+        "LastModified": blob_item.last_modified.isoformat() if blob_item.last_modified else None,
+        "CreationTime": blob_item.creation_time.isoformat() if blob_item.creation_time else None,
+        "ETag": blob_item.etag,
+        "BlobType": str(blob_item.blob_type), # Convert enum to string
+        "ContentType": content_settings.content_type if content_settings else None,
+        "ContentMD5": content_settings.content_md5 if content_settings else None,
+        "ContentEncoding": content_settings.content_encoding if content_settings else None,
+        "ContentDisposition": content_settings.content_disposition if content_settings else None,
+        "ContentLanguage": content_settings.content_language if content_settings else None,
+        "CacheControl": content_settings.cache_control if content_settings else None,
+        "CustomMetadata": json.dumps(blob_item.metadata) if blob_item.metadata else "{}" # Serialize custom metadata dictionary to JSON string
+    }
 
 # Register the function with the app instance and define its trigger
 @app.function_name(name="BlobScannerFunction") # Logical name for this function within the app
 @app.timer_trigger(schedule="0 * * * * *", arg_name="myTimer") # Timer trigger: "0 * * * * *" runs every 1 minute
+@instrumented("BlobScannerFunction") # Per-stage timings, exported as a JSON log line and OpenMetrics when the run ends
 def blob_scanner_function(myTimer: func.TimerRequest):
     """
     This Azure Function scans a specified source container for blobs
@@ -29,30 +74,26 @@ def blob_scanner_function(myTimer: func.TimerRequest):
     and appends it to an Azure Table Storage.
     """
     
-    # Capture the current UTC time when the function starts.
-    # This will be used as the new 'last scan time' after this run.
+    # Capture the current UTC time when the function starts (for logging).
     utc_now = datetime.utcnow()
     logging.info(f"BlobScannerFunction triggered at {utc_now.isoformat()}")
+    metrics = current_invocation()
 
     # Retrieve the Azure Storage connection string from environment variables.
     # This is typically 'AzureWebJobsStorage' for Azure Functions.
     connection_string = os.environ["AzureWebJobsStorage"]
     
-    # Initialize the BlobServiceClient to interact with the Azure Blob Storage account.
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+    # Get the BlobServiceClient to interact with the Azure Blob Storage account.
+    # It is created once per worker process and reused by later runs, so its connections stay warm.
+    blob_service_client = get_blob_service_client(connection_string)
     
-    # Initialize the TableServiceClient to interact with Azure Table Storage.
-    table_service_client = TableServiceClient.from_connection_string(connection_string)
+    # Get the (shared) TableServiceClient to interact with Azure Table Storage.
+    table_service_client = get_table_service_client(connection_string)
     table_client = None # Initialize table_client to None
 
-    # Initialize last_scan_time to the minimum possible datetime.
-    # This ensures that on the very first run (when no timestamp blob exists),
-    # all existing blobs in the source container will be considered 'new' and copied.
-    last_scan_time = datetime.min 
-    
-    # --- 1. Retrieve the Last Scan Timestamp from Storage ---
-    # This block tries to read the timestamp of the previous successful scan
-    # from a dedicated blob in the metadata container.
+    # --- 1. Load the Scan Manifest from Storage ---
+    # The manifest records the etag/last modified/size of every blob already copied, plus the
+    # continuation tokens of any listing that did not finish in a previous run.
     try:
         # Get a client for the metadata container.
         metadata_container_client = blob_service_client.get_container_client(METADATA_CONTAINER_NAME)
@@ -67,30 +108,14 @@ def blob_scanner_function(myTimer: func.TimerRequest):
             if "ContainerAlreadyExists" not in str(e): 
                 logging.warning(f"Failed to create metadata container (might already exist): {e}")
 
-        # Get a client for the specific blob that stores the timestamp.
-        timestamp_blob_client = metadata_container_client.get_blob_client(LAST_SCAN_TIMESTAMP_BLOB_NAME)
-
-        # Check if the timestamp blob exists.
-        if timestamp_blob_client.exists():
-            # If it exists, download its content (which is the timestamp string)
-            timestamp_content = timestamp_blob_client.download_blob().readall().decode('utf-8')
-            try:
-                # Attempt to parse the timestamp string back into a datetime object.
-                last_scan_time = datetime.fromisoformat(timestamp_content)
-                logging.info(f"Last scan time retrieved: {last_scan_time.isoformat()}")
-            except ValueError:
-                # If parsing fails (e.g., malformed timestamp), log a warning
-                # and proceed with datetime.min, causing a full scan.
-                logging.warning(f"Invalid timestamp format in '{LAST_SCAN_TIMESTAMP_BLOB_NAME}': {timestamp_content}. Starting from minimum time.")
-        else:
-            # If the timestamp blob does not exist (first run), log it.
-            logging.info(f"'{LAST_SCAN_TIMESTAMP_BLOB_NAME}' not found. Starting scan from minimum time.")
+        # A missing or unreadable manifest gives an empty one, so all blobs are treated as new.
+        with metrics.span("load_manifest"):
+            manifest = load_manifest(metadata_container_client, SCAN_MANIFEST_BLOB_NAME)
 
     except Exception as e:
-        # Catch any other errors during timestamp retrieval and log them.
-        # The function will still proceed, scanning from datetime.min.
-        logging.error(f"Error retrieving last scan timestamp: {e}")
-        last_scan_time = datetime.min # Fallback to min time to ensure all files are scanned
+        # Without the manifest every blob would look new, so skip this run rather than recopy everything.
+        logging.error(f"Error loading scan manifest: {e}")
+        return
 
     # --- 2. Get Container Clients for Source and Target & Initialize Table Client ---
     # Get clients for the source and target blob containers.
@@ -118,81 +143,118 @@ def blob_scanner_function(myTimer: func.TimerRequest):
 
 
     copied_count = 0 # Initialize a counter for successfully copied files
+    skipped_count = 0 # Changed blobs whose content the target already has
     metadata_processed_count = 0 # Initialize a counter for processed metadata entries
+    # Write-behind buffer that batches the metadata upserts (None if the table client is not available)
+    table_buffer = TableWriteBuffer(table_client, max_workers=TABLE_WRITE_WORKERS) if table_client else None
+    # Blobs whose metadata is buffered; they go into the manifest only once their entity is stored
+    awaiting_metadata = [] # (prefix, blob_item, entity)
 
     # --- 3. List Blobs in Source Container, Copy New/Modified Files, and Store Metadata ---
-    # This block iterates through all blobs in the source container
+    # This block lists the source container shard by shard (up to SCAN_MAX_PAGES pages per run)
+    # and hands every new/modified blob to the copy engine, which keeps COPY_MAX_IN_FLIGHT copies running.
+    copy_engine = CopyEngine(max_in_flight=COPY_MAX_IN_FLIGHT, poll_timeout=COPY_POLL_TIMEOUT)
     try:
-        for blob_item in source_container_client.list_blobs():
-            # Check if the blob's last modified time is newer than the last scan time.
-            # We use 'last_modified' as it reflects uploads and updates.
-            if blob_item.last_modified and blob_item.last_modified > last_scan_time:
-                # --- Copy Blob (Existing Logic) ---
-                source_blob_client = source_container_client.get_blob_client(blob_item.name)
-                target_blob_client = target_container_client.get_blob_client(blob_item.name)
-
-                source_blob_sas_url = source_blob_client.url + "?" + generate_blob_sas(
-                    account_name=blob_service_client.account_name,
-                    container_name=source_container_client.container_name,
-                    blob_name=blob_item.name,
-                    account_key=blob_service_client.credential.account_key, 
-                    permission=BlobSasPermissions(read=True), 
-                    expiry=utc_now + timedelta(hours=1) 
-                )
-
-                logging.info(f"Copying '{blob_item.name}' (Last Modified: {blob_item.last_modified.isoformat()})...")
-                copy_result = target_blob_client.start_copy_from_url(source_blob_sas_url)
-                copied_count += 1
-
-                # --- Extract and Store Metadata ---
-                if table_client: # Ensure table_client was successfully initialized
-                    try:
-                        # Construct the entity for Azure Table Storage
-                        # PartitionKey and RowKey are mandatory
-                        # RowKey should be unique within a PartitionKey
-                        entity = {
-                            "PartitionKey": SOURCE_CONTAINER_NAME, # Using source container name as PartitionKey
-                            "RowKey": blob_item.name.replace("/", "---"), # Blob name as RowKey, replace '/' for validity
-                            "BlobName": blob_item.name,
-                            "BlobSize": blob_item.size,
-                            "LastModified": blob_item.last_modified.isoformat() if blob_item.last_modified else None,
-                            "CreationTime": blob_item.creation_time.isoformat() if blob_item.creation_time else None,
-                            "ETag": blob_item.etag,
-                            "BlobType": str(blob_item.blob_type), # Convert enum to string
-                            "ContentType": blob_item.content_settings.content_type if blob_item.content_settings else None,
-                            "ContentMD5": blob_item.content_settings.content_md5 if blob_item.content_settings else None,
-                            "ContentEncoding": blob_item.content_settings.content_encoding if blob_item.content_settings else None,
-                            "ContentDisposition": blob_item.content_settings.content_disposition if blob_item.content_settings else None,
-                            "ContentLanguage": blob_item.content_settings.content_language if blob_item.content_settings else None,
-                            "CacheControl": blob_item.content_settings.cache_control if blob_item.content_settings else None,
-                            "CustomMetadata": json.dumps(blob_item.metadata) if blob_item.metadata else "{}" # Serialize custom metadata dictionary to JSON string
-                        }
-                        
-                        # Upsert the entity: inserts if not exists, updates if exists.
-                        table_client.upsert_entity(entity=entity)
-                        metadata_processed_count += 1
-                        logging.info(f"Metadata for '{blob_item.name}' upserted to Azure Table '{TABLE_NAME}'.")
-
-                    except Exception as table_e:
-                        logging.error(f"Error processing metadata for '{blob_item.name}': {table_e}")
+        # One read-only SAS token for the whole source container, cached across runs
+        with metrics.span("sas"):
+            source_sas_token = get_container_sas(blob_service_client, SOURCE_CONTAINER_NAME)
+
+        if DEDUP_ENABLED and DEDUP_PRIME_TARGET:
+            for prefix in SCAN_PREFIXES:
+                if not blob_dedup.is_primed(target_container_client, prefix):
+                    with metrics.span("dedup_prime"):
+                        blob_dedup.prime(target_container_client, prefix)
+
+        # "list" times the paged listing (and the manifest comparison) as the loop pulls blobs from it
+        changed_blobs = iter_changed_blobs(source_container_client, manifest, SCAN_PREFIXES, SCAN_MAX_PAGES, SCAN_PAGE_SIZE)
+        for prefix, blob_item in metrics.iterate("list", changed_blobs):
+            # Only blobs that are new or whose etag differs from the manifest are yielded,
+            # unchanged blobs are counted and skipped inside iter_changed_blobs.
+            # --- Copy Blob ---
+            source_blob_client = source_container_client.get_blob_client(blob_item.name)
+            target_blob_client = target_container_client.get_blob_client(blob_item.name)
+
+            # The listing already carries the source's Content-MD5, so identical content costs no copy at all
+            with metrics.span("dedup_check"):
+                unchanged = DEDUP_ENABLED and blob_dedup.is_unchanged(blob_item.size, blob_item.content_settings.content_md5, target_blob_client)
+            if unchanged:
+                skipped_count += 1
+                metrics.count("skipped_unchanged")
+                # The blob did change (new etag), so its metadata is still refreshed
+                if table_buffer:
+                    entity = build_metadata_entity(blob_item)
+                    table_buffer.add(entity)
+                    awaiting_metadata.append((prefix, blob_item, entity))
                 else:
-                    logging.warning(f"Table client not initialized. Skipping metadata storage for '{blob_item.name}'.")
-            else:
-                logging.info(f"Skipping '{blob_item.name}' (Last Modified: {blob_item.last_modified.isoformat()}) - not newer than last scan time.")
+                    manifest.record(blob_item, prefix)
+                continue
+
+            logging.info(f"Copying '{blob_item.name}' (Last Modified: {blob_item.last_modified.isoformat()})...")
+            with metrics.span("copy_start", items=1, nbytes=blob_item.size):
+                copy_engine.submit(blob_item.name, source_blob_client.url + "?" + source_sas_token, target_blob_client,
+                                   size=blob_item.size, context=(prefix, blob_item))
 
     except Exception as e:
         # Catch and log any errors that occur during the listing or copying process.
         logging.error(f"Error listing or copying blobs: {e}")
 
-    # --- 4. Update the Last Scan Timestamp in Storage ---
-    # This block updates the timestamp blob with the current time (utc_now),
-    # so the next function execution knows from when to start scanning.
+    # Wait for the copies and poll the pending ones. Only completed copies are recorded in the manifest
+    # and the table; failed copies and copies still pending at the poll timeout are picked up again on
+    # the shard's next listing pass, where the dedup check skips the ones that have completed since.
+    with metrics.span("copy_wait"):
+        copy_results = copy_engine.finish()
+    for copy_result in copy_results:
+        if not copy_result.succeeded:
+            continue
+        prefix, blob_item = copy_result.context
+        # A blob copy carries the source's Content-MD5 over to the target
+        blob_dedup.remember(copy_result.target_blob_client, blob_item.size, blob_item.content_settings.content_md5)
+        copied_count += 1
+        metrics.count("copied_bytes", blob_item.size)
+
+        # --- Extract and Store Metadata ---
+        # Entities are buffered and written as transactional batches of up to 100 per partition
+        if table_buffer: # Ensure table_client was successfully initialized
+            entity = build_metadata_entity(blob_item)
+            table_buffer.add(entity)
+            awaiting_metadata.append((prefix, blob_item, entity))
+        else:
+            logging.warning(f"Table client not initialized. Skipping metadata storage for '{blob_item.name}'.")
+            manifest.record(blob_item, prefix)
+
+    # Force the buffered metadata out before the manifest is saved, so a saved manifest never
+    # refers to blobs whose metadata was still sitting in memory. Blobs whose entity failed are left
+    # out of the manifest, so the next listing pass sees them as changed again and retries the metadata
+    # (the dedup check keeps the already copied ones from being copied twice).
+    if table_buffer:
+        try:
+            with metrics.span("table_upsert") as span:
+                table_buffer.close()
+                span.add(items=table_buffer.succeeded)
+            metadata_processed_count = table_buffer.succeeded
+            failed_keys = table_buffer.failed_keys
+        except Exception as table_e:
+            logging.error(f"Error writing metadata batches to Azure Table '{TABLE_NAME}': {table_e}")
+            failed_keys = None # Unknown which entities were stored, so none of the blobs is recorded
+        not_recorded = 0
+        for prefix, blob_item, entity in awaiting_metadata:
+            if failed_keys is not None and (entity["PartitionKey"], entity["RowKey"]) not in failed_keys:
+                manifest.record(blob_item, prefix)
+            else:
+                not_recorded += 1
+        if not_recorded:
+            logging.warning(f"{not_recorded} blobs left out of the scan manifest because their metadata was not stored. "
+                            "They are retried on the next listing pass.")
+
+    # --- 4. Save the Scan Manifest to Storage ---
+    # This block saves the manifest (including any unfinished listing's continuation tokens),
+    # so the next function execution skips blobs already copied and resumes the listing.
     try:
-        new_scan_time = utc_now 
-        # Upload the current UTC time (in ISO format) to the timestamp blob, overwriting previous value.
-        timestamp_blob_client.upload_blob(new_scan_time.isoformat(), overwrite=True)
-        logging.info(f"Updated last scan time to: {new_scan_time.isoformat()}. Copied {copied_count} new files. Processed {metadata_processed_count} metadata entries.")
+        with metrics.span("save_manifest"):
+            save_manifest(metadata_container_client, SCAN_MANIFEST_BLOB_NAME, manifest)
+        logging.info(f"Scan finished. Copied {copied_count} new files, skipped {skipped_count} unchanged ones "
+                     f"({blob_dedup.bytes_saved} bytes saved so far). Processed {metadata_processed_count} metadata entries.")
     except Exception as e:
-        # Catch and log any errors during the timestamp update.
-        logging.error(f"Error updating last scan timestamp: {e}")
+        # Catch and log any errors during the manifest update.
+        logging.error(f"Error saving scan manifest: {e}")
 
@@ -0,0 +1,96 @@
+"""
+Benchmark: one Event Grid event per invocation (process_blob_event) vs. batched webhook deliveries
+(process_blob_events), both called in-process with the same synthetic BlobCreated/BlobDeleted events.
+
+The functions are called directly, so the numbers leave out the Functions host's own per-invocation
+cost; --invocation-overhead-ms adds an estimate of it (a few ms per execution is typical) to both paths.
+
+    python scripts/bench_blob_events.py --events 100000 --batch-size 1000 [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, "src"), os.path.join(REPO_ROOT, "code_samples")]
+import azure.functions as func
+import msg_sender_event_grid
+
+class ListOut:
+    # Stand-in for func.Out
+    def __init__(self):
+        self.values = []
+
+    def set(self, value):
+        self.values.append(value)
+
+def make_events(count):
+    extensions = [".csv", ".json", ".csv", ".parquet"]
+    return [{
+        "id": f"event-{index}",
+        "eventType": "Microsoft.Storage.BlobDeleted" if index % 10 == 0 else "Microsoft.Storage.BlobCreated",
+        "subject": f"/blobServices/default/containers/input/blobs/file-{index}{extensions[index % 4]}",
+        "data": {"url": f"https://account.blob.core.windows.net/input/file-{index}{extensions[index % 4]}", "contentLength": 1024},
+        "eventTime": "2025-01-01T00:00:00Z",
+        "dataVersion": "1",
+        "topic": "/subscriptions/x/resourceGroups/y/providers/Microsoft.Storage/storageAccounts/account",
+    } for index in range(count)]
+
+def prepare_single(events, batch_size):
+    # What the host hands to process_blob_event: one EventGridEvent per invocation
+    return [func.EventGridEvent(id=event["id"], data=event["data"], topic=event["topic"], subject=event["subject"],
+                                event_type=event["eventType"], event_time=None, data_version=event["dataVersion"])
+            for event in events]
+
+def run_single(invocations):
+    out = ListOut()
+    for event in invocations:
+        msg_sender_event_grid.process_blob_event(event, out)
+    return len(out.values)
+
+def prepare_batched(events, batch_size):
+    # What Event Grid POSTs to the webhook: one JSON array of up to batch_size events per delivery
+    return [func.HttpRequest(method="POST", url="/api/blob_events", headers={"Content-Type": "application/json"},
+                             body=json.dumps(events[start:start + batch_size]).encode("utf-8"))
+            for start in range(0, len(events), batch_size)]
+
+def run_batched(invocations):
+    out = ListOut()
+    for request in invocations:
+        response = msg_sender_event_grid.process_blob_events(request, out)
+        assert response.status_code == 200
+    return sum(len(messages) for messages in out.values)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Events per webhook delivery (Event Grid max: 5000)")
+    parser.add_argument("--invocation-overhead-ms", type=float, default=0, help="Estimated host cost per invocation")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    events = make_events(args.events)
+    results = {}
+    for name, prepare, run in (("single", prepare_single, run_single), ("batched", prepare_batched, run_batched)):
+        invocations = prepare(events, args.batch_size)
+        started = time.perf_counter()
+        messages = run(invocations)
+        seconds = time.perf_counter() - started + len(invocations) * args.invocation_overhead_ms / 1000
+        results[name] = {"events": len(events), "invocations": len(invocations), "messages": messages, "seconds": seconds,
+                         "events_per_s": len(events) / seconds, "events_per_invocation": len(events) / len(invocations)}
+    assert results["single"]["messages"] == results["batched"]["messages"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'path':<10}{'events':>9}{'invocations':>13}{'messages':>10}{'seconds':>9}{'events/s':>11}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['events']:>9}{result['invocations']:>13}{result['messages']:>10}"
+              f"{result['seconds']:>9.2f}{result['events_per_s']:>11.0f}")
+
+if __name__ == "__main__":
+    main()
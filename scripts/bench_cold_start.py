@@ -0,0 +1,97 @@
+"""
+Benchmark: import (cold start) time of every function module, measured with `python -X importtime`
+in a fresh interpreter per run.
+
+By default azure.functions is imported first, because the Functions worker has already loaded it when
+it imports the app; --include-azure-functions counts it too. For every module the table shows the
+median import time, the heaviest direct imports, and the time of the SDKs the module only imports on
+first use. That deferred time is paid by the first invocation that needs the SDK, not by loading the app.
+
+    python scripts/bench_cold_start.py [--repeat 5] [--top 3] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_PATH = os.pathsep.join([os.path.join(REPO_ROOT, "src"), os.path.join(REPO_ROOT, "code_samples")])
+
+# Function module -> SDKs it imports lazily, on the code path that needs them
+MODULES = {
+    "blob_trigger": ["azure.storage.blob"],
+    "time_trigger": ["azure.storage.blob", "azure.data.tables"],
+    "msg_processor": ["requests"],
+    "msg_sender_http": [],
+    "msg_sender_event_grid": [],
+}
+
+def parse_importtime(stderr):
+    # Lines look like "import time:  self [us] |  cumulative | <indent>package", two spaces of indent per level
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part for part in line.replace("import time:", "|", 1).split("|"))
+        level = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((level, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(module, lazy_sdks, include_azure_functions):
+    preload = "" if include_azure_functions else "import azure.functions; "
+    code = f"{preload}import {module}"
+    # Prepended, so an existing PYTHONPATH (e.g. where the Azure SDKs are installed) still applies
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SEARCH_PATH, os.environ.get("PYTHONPATH")])))
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True,
+                            text=True, check=True).stderr
+    rows = parse_importtime(stderr)
+    # The module is the last top-level import; its direct imports are the level-1 rows right before it
+    index = max(i for i, row in enumerate(rows) if row[0] == 0 and row[1] == module)
+    children = []
+    for level, name, _, cumulative in reversed(rows[:index]):
+        if level == 0:
+            break
+        if level == 1:
+            children.append((name, cumulative))
+    result = {"import_ms": rows[index][3] / 1000, "children": {name: cumulative / 1000 for name, cumulative in children}}
+
+    # What the lazy imports cost once the module is loaded (i.e. on the first invocation that needs them)
+    deferred = 0
+    if lazy_sdks:
+        code += "; " + "; ".join(f"import {sdk}" for sdk in lazy_sdks)
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True,
+                                text=True, check=True).stderr
+        deferred = sum(row[3] for row in parse_importtime(stderr) if row[0] == 0 and row[1] in lazy_sdks) / 1000
+    result["deferred_ms"] = deferred
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", default=",".join(MODULES), help="Comma separated function modules")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (the median is reported)")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest direct imports to list per module")
+    parser.add_argument("--include-azure-functions", action="store_true", help="Don't preload azure.functions")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules.split(","):
+        runs = [measure(module, MODULES.get(module, []), args.include_azure_functions) for _ in range(args.repeat)]
+        children = {name: statistics.median(run["children"].get(name, 0) for run in runs) for name in runs[0]["children"]}
+        results[module] = {"import_ms": statistics.median(run["import_ms"] for run in runs),
+                           "deferred_ms": statistics.median(run["deferred_ms"] for run in runs),
+                           "lazy_sdks": MODULES.get(module, []),
+                           "top_imports": dict(sorted(children.items(), key=lambda item: -item[1])[:args.top])}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'module':<24}{'import ms':>10}{'deferred ms':>13}  heaviest direct imports (ms)")
+    for module, result in results.items():
+        top = ", ".join(f"{name} {ms:.1f}" for name, ms in result["top_imports"].items())
+        print(f"{module:<24}{result['import_ms']:>10.1f}{result['deferred_ms']:>13.1f}  {top}")
+
+if __name__ == "__main__":
+    main()
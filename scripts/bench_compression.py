@@ -0,0 +1,83 @@
+"""
+Benchmark: CPU time vs. bytes saved for the transcoding stage (shared_code.blob_compression), per codec
+and level, on a text blob streamed in blocks the way process_file streams it.
+
+The default input is src/Phase1/iphone.csv, its rows shuffled and repeated up to --size-mb. It has
+only ~1.3 MB of distinct rows, which favours codecs with large windows (zstd at higher levels); pass a
+real blob with --input for representative ratios. zstd levels are only run when the
+optional 'zstandard' package is installed.
+
+    python scripts/bench_compression.py [--input file.csv] [--size-mb 64] [--block-size-mb 4] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+from shared_code.blob_compression import compress_chunks
+
+GZIP_LEVELS = range(1, 10)
+ZSTD_LEVELS = (1, 3, 6, 9, 12, 19)
+
+def load_input(path, size_mb):
+    # Each copy of the sample gets its rows shuffled; plain repeats would let zstd's long window
+    # match whole copies and report ratios no real blob gets
+    with open(path, "rb") as f:
+        header, *rows = f.read().splitlines(keepends=True)
+    rng = random.Random(0)
+    parts = [header]
+    size = len(header)
+    while size < size_mb * 1024 * 1024:
+        rng.shuffle(rows)
+        parts.extend(rows)
+        size += sum(len(row) for row in rows)
+    return b"".join(parts)
+
+def blocks(data, block_size):
+    for start in range(0, len(data), block_size):
+        yield data[start:start + block_size]
+
+def run(data, codec, level, block_size):
+    started_cpu = time.process_time()
+    started = time.perf_counter()
+    compressed = sum(len(chunk) for chunk in compress_chunks(blocks(data, block_size), codec, level))
+    cpu_seconds = time.process_time() - started_cpu
+    seconds = time.perf_counter() - started
+    return {"codec": codec, "level": level, "input_bytes": len(data), "output_bytes": compressed,
+            "bytes_saved": len(data) - compressed, "ratio": len(data) / compressed, "cpu_seconds": cpu_seconds,
+            "seconds": seconds, "mb_per_s": len(data) / 1024 / 1024 / seconds,
+            "cpu_ms_per_mb_saved": cpu_seconds * 1000 / max(len(data) - compressed, 1) * 1024 * 1024}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=os.path.join(REPO_ROOT, "src", "Phase1", "iphone.csv"))
+    parser.add_argument("--size-mb", type=int, default=64, help="Repeat the input up to this size")
+    parser.add_argument("--block-size-mb", type=int, default=4, help="Size of the streamed blocks")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    data = load_input(args.input, args.size_mb)
+    block_size = args.block_size_mb * 1024 * 1024
+    runs = [("gzip", level) for level in GZIP_LEVELS]
+    try:
+        import zstandard # noqa: F401
+        runs += [("zstd", level) for level in ZSTD_LEVELS]
+    except ImportError:
+        print("zstandard is not installed, skipping zstd", file=sys.stderr)
+    results = [run(data, codec, level, block_size) for codec, level in runs]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(data) / 1024 / 1024:.1f} MB of {os.path.basename(args.input)}")
+    print(f"{'codec':<6}{'level':>6}{'ratio':>8}{'saved MB':>10}{'cpu s':>8}{'MB/s':>9}{'cpu ms/MB saved':>17}")
+    for result in results:
+        print(f"{result['codec']:<6}{result['level']:>6}{result['ratio']:>8.2f}{result['bytes_saved'] / 1024 / 1024:>10.1f}"
+              f"{result['cpu_seconds']:>8.2f}{result['mb_per_s']:>9.1f}{result['cpu_ms_per_mb_saved']:>17.1f}")
+
+if __name__ == "__main__":
+    main()
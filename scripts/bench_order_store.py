@@ -0,0 +1,87 @@
+"""
+Benchmark: per-message SQLite writes (the original order_processor) vs. shared_code.order_store.
+
+Modes, all writing the same orders to a fresh database:
+    per-message   connect, INSERT, commit, close for every order (default journal / synchronous)
+    group-commit  OrderStore.submit() from --threads concurrent callers (what order_processor does now)
+    batch         OrderStore.save_messages() with --batch-size message bodies per transaction
+
+    python scripts/bench_order_store.py --orders 20000 --threads 16 --batch-size 500 [--json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from shared_code.order_store import CREATE_ORDERS_SQL, OrderStore
+
+def make_messages(count):
+    return [json.dumps({"order_id": f"ORD-{index:08d}", "customer_email": f"customer{index % 1000}@example.com",
+                        "amount": round(10 + index % 500 * 0.37, 2)}).encode("utf-8") for index in range(count)]
+
+def per_message(path, messages, threads, batch_size):
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_ORDERS_SQL)
+    conn.close()
+    for body in messages:
+        order = json.loads(body.decode("utf-8"))
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO orders (order_id, customer_email, amount, status) VALUES (?, ?, ?, ?)",
+                       (order["order_id"], order["customer_email"], order["amount"], "Processed"))
+        conn.commit()
+        conn.close()
+    return len(messages)
+
+def group_commit(path, messages, threads, batch_size):
+    store = OrderStore(path, max_batch_size=batch_size)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda body: store.submit(json.loads(body)), messages))
+    print(f"  group-commit: {store.transactions} transactions, {store.committed_orders / store.transactions:.1f} orders each")
+    store.close()
+    return store.committed_orders
+
+def batch(path, messages, threads, batch_size):
+    store = OrderStore(path)
+    for start in range(0, len(messages), batch_size):
+        store.save_messages(messages[start:start + batch_size])
+    store.close()
+    return store.committed_orders
+
+MODES = {"per-message": per_message, "group-commit": group_commit, "batch": batch}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent invocations for group-commit")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    messages = make_messages(args.orders)
+    results = {}
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = os.path.join(work_dir, "orders.db")
+            started = time.perf_counter()
+            written = MODES[mode](path, messages, args.threads, args.batch_size)
+            seconds = time.perf_counter() - started
+            with sqlite3.connect(path) as conn:
+                assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == written == len(messages)
+        results[mode] = {"orders": written, "seconds": seconds, "orders_per_s": written / seconds}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<15}{'orders':>10}{'seconds':>10}{'orders/s':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<15}{result['orders']:>10}{result['seconds']:>10.2f}{result['orders_per_s']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+File-format benchmark over the sample datasets shipped with the repo.
+
+Every sample (users.avro, users.orc, users_parquet, src/Phase1/iphone.csv by default, or any
+Avro/ORC/Parquet/CSV/JSON-lines files given on the command line) is scaled synthetically to the
+requested row counts and then written and read back in every format (CSV, Avro, Parquet, ORC)
+and compression codec. For each combination it records:
+
+    write / read throughput (rows/s, MB/s), peak RSS of the operation, size on disk,
+    and the speed-up of reading a single column (column projection) over reading all columns.
+
+Each measurement runs in a fresh process so its peak RSS is not polluted by earlier runs.
+Results are written as JSON lines (one object per measurement) so runs of different releases
+can be compared:
+
+    python scripts/benchmark_formats.py --rows 1x,100000,1000000 --output bench_results.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+import fastavro
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.orc as pa_orc
+import pyarrow.parquet as pq
+from run_data_pipeline import READERS, WRITERS, arrow_to_avro_schema, detect_format
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATASETS = ["users.avro", "users.orc", "users_parquet", "src/Phase1/iphone.csv"]
+
+# Codecs benchmarked per format (None = uncompressed)
+CODECS = {
+    "csv": [None, "gzip"],
+    "avro": ["null", "deflate"],
+    "parquet": ["none", "snappy", "zstd", "gzip"],
+    "orc": ["uncompressed", "snappy", "zstd", "zlib"],
+}
+EXTENSIONS = {"csv": ".csv", "avro": ".avro", "parquet": ".parquet", "orc": ".orc"}
+CHUNK_ROWS = 64 * 1024
+
+def _status_mb(key):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _reset_peak_rss():
+    """
+    Starts a new peak RSS measurement and returns the current RSS in MB. Writing 5 to clear_refs
+    resets the VmHWM high-water mark (Linux >= 4.0), so the interpreter start-up and import peaks
+    are not attributed to the operation.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return _status_mb("VmRSS")
+
+def _peak_rss_mb():
+    peak = _status_mb("VmHWM")
+    # ru_maxrss (KiB on Linux) when /proc is not available
+    return peak or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# --- Dataset preparation ---
+
+def load_sample(path):
+    if path.endswith((".jsonl", ".ndjson")):
+        table = pa_json.read_json(path)
+    else:
+        schema, batches = READERS[detect_format(path)](path, CHUNK_ROWS, None)
+        table = pa.Table.from_batches(list(batches), schema=schema)
+    # Dictionary columns are decoded so every format sees the same plain types
+    return table.cast(pa.schema([field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field for field in table.schema]))
+
+def scale_table(table, rows):
+    """
+    Repeats the sample until it has `rows` rows. A unique row number column keeps the
+    repeated rows from being perfectly compressible.
+    """
+    repeats = -(-rows // table.num_rows)
+    scaled = pa.concat_tables([table] * repeats).slice(0, rows)
+    return scaled.append_column("row_number", pa.array(range(rows), type=pa.int64()))
+
+def parse_row_counts(spec, sample_rows):
+    # "1x,100000,1000000" -> [sample_rows, 100000, 1000000]
+    counts = []
+    for item in spec.split(","):
+        item = item.strip()
+        counts.append(int(float(item[:-1]) * sample_rows) if item.endswith("x") else int(item))
+    return counts
+
+# --- Operations (each runs in its own process) ---
+
+def _write(source_path, target_path, fmt, codec):
+    table = pq.read_table(source_path)
+    rss_before = _reset_peak_rss()
+    started = time.perf_counter()
+    if fmt == "csv" and codec:
+        with pa.CompressedOutputStream(target_path, codec) as stream:
+            WRITERS["csv"](stream, table.schema, table.to_batches(CHUNK_ROWS), None, None)
+    elif fmt == "avro":
+        WRITERS["avro"](target_path, table.schema, table.to_batches(CHUNK_ROWS), arrow_to_avro_schema(table.schema), codec)
+    else:
+        WRITERS[fmt](target_path, table.schema, table.to_batches(CHUNK_ROWS), None, codec)
+    return time.perf_counter() - started, _peak_rss_mb() - rss_before, table.num_rows
+
+def _read(path, fmt, column=None):
+    rss_before = _reset_peak_rss()
+    started = time.perf_counter()
+    # Both the full and the projected reads stream batches, so the two timings are comparable
+    if column is None:
+        # Full read through the same streaming readers the conversion engine uses
+        _, batches = READERS[fmt](path, CHUNK_ROWS, None)
+        rows = sum(batch.num_rows for batch in batches)
+    elif fmt == "parquet":
+        rows = sum(batch.num_rows for batch in pq.ParquetFile(path).iter_batches(batch_size=CHUNK_ROWS, columns=[column]))
+    elif fmt == "orc":
+        orc_file = pa_orc.ORCFile(path)
+        rows = sum(orc_file.read_stripe(index, columns=[column]).num_rows for index in range(orc_file.nstripes))
+    elif fmt == "csv":
+        reader = pa_csv.open_csv(path, convert_options=pa_csv.ConvertOptions(include_columns=[column]))
+        rows = sum(batch.num_rows for batch in reader)
+    else:
+        # Avro is row oriented: a reader schema with one field still has to skip over every other field
+        with open(path, "rb") as f:
+            writer_schema = fastavro.reader(f).writer_schema
+        reader_schema = dict(writer_schema, fields=[field for field in writer_schema["fields"] if field["name"] == column])
+        with open(path, "rb") as f:
+            rows = sum(1 for _ in fastavro.reader(f, reader_schema))
+    return time.perf_counter() - started, _peak_rss_mb() - rss_before, rows
+
+def _run_isolated(pool, function, *args):
+    return pool.submit(function, *args).result()
+
+# --- Benchmark driver ---
+
+def benchmark(datasets, row_specs, formats, work_dir, emit):
+    # max_tasks_per_child=1: every measurement gets a fresh interpreter (and a clean peak RSS)
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1) as pool:
+        for dataset in datasets:
+            sample = load_sample(dataset)
+            for rows in parse_row_counts(row_specs, sample.num_rows):
+                table = scale_table(sample, rows)
+                source_path = os.path.join(work_dir, "source.parquet")
+                pq.write_table(table, source_path, compression="none")
+                in_memory_mb = table.nbytes / 1024 / 1024
+                # Project the first top-level column that isn't nested
+                column = next(field.name for field in table.schema if not pa.types.is_nested(field.type))
+                del table
+
+                for fmt in formats:
+                    for codec in CODECS[fmt]:
+                        target_path = os.path.join(work_dir, f"data{EXTENSIONS[fmt]}" + (".gz" if fmt == "csv" and codec else ""))
+                        base = {"dataset": os.path.relpath(dataset, REPO_ROOT), "rows": rows, "format": fmt,
+                                "codec": codec or "none", "in_memory_mb": round(in_memory_mb, 3)}
+
+                        seconds, rss_mb, _ = _run_isolated(pool, _write, source_path, target_path, fmt, codec)
+                        file_bytes = os.path.getsize(target_path)
+                        emit(dict(base, op="write", seconds=seconds, rows_per_s=rows / seconds,
+                                  mb_per_s=in_memory_mb / seconds, peak_rss_delta_mb=rss_mb, file_bytes=file_bytes))
+
+                        read_format = "csv" if fmt == "csv" else fmt
+                        full_seconds, rss_mb, _ = _run_isolated(pool, _read, target_path, read_format)
+                        emit(dict(base, op="read", seconds=full_seconds, rows_per_s=rows / full_seconds,
+                                  mb_per_s=in_memory_mb / full_seconds, peak_rss_delta_mb=rss_mb, file_bytes=file_bytes))
+
+                        projected_seconds, rss_mb, _ = _run_isolated(pool, _read, target_path, read_format, column)
+                        emit(dict(base, op="read_projection", column=column, seconds=projected_seconds,
+                                  rows_per_s=rows / projected_seconds, peak_rss_delta_mb=rss_mb, file_bytes=file_bytes,
+                                  projection_speedup=full_seconds / projected_seconds))
+                        os.remove(target_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV/Avro/Parquet/ORC read and write over the sample datasets")
+    parser.add_argument("datasets", nargs="*", help="Sample files (default: the samples shipped with the repo)")
+    parser.add_argument("--rows", default="1x,100000,1000000",
+                        help="Comma separated row counts; 'Nx' means N times the sample's own row count")
+    parser.add_argument("--formats", default="csv,avro,parquet,orc")
+    parser.add_argument("--output", default="bench_results.jsonl", help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    datasets = args.datasets or [os.path.join(REPO_ROOT, path) for path in DEFAULT_DATASETS]
+    run_info = {
+        "run_started": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "pyarrow": pa.__version__,
+        "fastavro": fastavro.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="format-bench-")
+    try:
+        with open(args.output, "a") as out:
+            def emit(result):
+                result = dict(run_info, **{key: round(value, 6) if isinstance(value, float) else value for key, value in result.items()})
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                print(f"{result['dataset']:<24}{result['rows']:>10} {result['format']:<8}{result['codec']:<13}{result['op']:<16}"
+                      f"{result['rows_per_s']:>14.0f} rows/s {result.get('peak_rss_delta_mb', 0):>8.1f} MB RSS {result['file_bytes']:>12} B")
+            benchmark(datasets, args.rows, args.formats.split(","), work_dir, emit)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
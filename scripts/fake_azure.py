@@ -0,0 +1,573 @@
+"""
+In-memory fakes of the Azure Storage (blob, table, queue) and Event Hubs clients, for offline load tests.
+
+FakeAzure holds the state of one fake storage account and one event hub. Its clients implement the
+calls the functions in this repo make:
+
+- BlobServiceClient/ContainerClient/BlobClient: list_blobs().by_page(), download_blob() with
+  chunks()/readall(), upload_blob, stage_block/commit_block_list, start_copy_from_url,
+  get_blob_properties and exists.
+- TableClient: upsert_entity and submit_transaction, with the service's batch rules.
+- QueueClient: send_message, receive_messages and delete_message, with the 64 KiB message limit.
+- EventHubProducerClient: create_batch, send_batch and send_event.
+
+They raise the same azure.core exceptions the SDK does. Every call goes through a FaultInjector,
+which adds per-operation latency (plus jitter and optional bandwidth) and throttles calls with 503
+ServerBusy, either at random (throttle_probability) or when the account goes over max_ops_per_second.
+Throttled calls are retried like the SDK does; the 503 is raised once the retries are used up.
+A seed makes the runs reproducible.
+
+    backend = FakeAzure(FaultInjector(latency_ms={"default": 5, "stage_block": 20}, max_ops_per_second=2000))
+    backend.install()   # storage_clients now hands out the fakes for AzureWebJobsStorage
+    backend.put_blob("input", "a.csv", b"...")
+
+scripts/load_harness.py drives the function handlers against these fakes.
+"""
+import base64
+import hashlib
+import itertools
+import random
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from urllib.parse import quote, unquote, urlsplit
+
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+ACCOUNT_NAME = "fakeaccount"
+ACCOUNT_KEY = base64.b64encode(b"fake-account-key").decode("ascii") # Lets generate_container_sas sign tokens offline
+CONNECTION_STRING = (f"DefaultEndpointsProtocol=https;AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};"
+                     f"EndpointSuffix=core.windows.net")
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024 # The SDK's default max_chunk_get_size
+MAX_QUEUE_MESSAGE_BYTES = 64 * 1024
+MAX_TRANSACTION_OPERATIONS = 100
+MAX_EVENT_BATCH_BYTES = 1024 * 1024
+
+def _throttled_error(operation):
+    error = HttpResponseError(message=f"Fake throttling of '{operation}': The server is busy. ErrorCode:ServerBusy")
+    error.status_code = 503
+    error.error_code = "ServerBusy"
+    return error
+
+class FaultInjector:
+    """
+    Latency and throttling applied to every fake call.
+
+    latency_ms: milliseconds per call, a number or a dict of operation -> ms with a "default" key.
+    jitter_ms: uniform random extra latency. bytes_per_second: extra transfer time for calls that
+    carry data (uploads, downloads, copies). throttle_probability: chance of a 503 per call.
+    max_ops_per_second: account-wide call budget (1 s window); calls over it get a 503.
+
+    Like the SDK's retry policy, a throttled call is retried up to retry_total times with exponential
+    backoff (retry_backoff_ms, doubling) before the 503 reaches the caller.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, bytes_per_second=None, throttle_probability=0.0,
+                 max_ops_per_second=None, retry_total=3, retry_backoff_ms=100, seed=0):
+        self.latency_ms = latency_ms if isinstance(latency_ms, dict) else {"default": latency_ms}
+        self.jitter_ms = jitter_ms
+        self.bytes_per_second = bytes_per_second
+        self.throttle_probability = throttle_probability
+        self.max_ops_per_second = max_ops_per_second
+        self.retry_total = retry_total
+        self.retry_backoff_ms = retry_backoff_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0, 0) # (second, calls in that second)
+        self.calls = {}
+        self.throttled = {}
+        self.failed = {}
+
+    def __call__(self, operation, nbytes=0):
+        for attempt in range(self.retry_total + 1):
+            if self._attempt(operation, nbytes):
+                return
+            if attempt < self.retry_total:
+                time.sleep(self.retry_backoff_ms * 2 ** attempt / 1000)
+        with self._lock:
+            self.failed[operation] = self.failed.get(operation, 0) + 1
+        raise _throttled_error(operation)
+
+    def _attempt(self, operation, nbytes):
+        # Returns False if the attempt was throttled
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            second = int(time.monotonic())
+            window_second, window_calls = self._window
+            window_calls = window_calls + 1 if window_second == second else 1
+            self._window = (second, window_calls)
+            throttle = ((self.max_ops_per_second and window_calls > self.max_ops_per_second)
+                        or (self.throttle_probability and self._random.random() < self.throttle_probability))
+            delay = self.latency_ms.get(operation, self.latency_ms.get("default", 0)) / 1000
+            if self.jitter_ms:
+                delay += self._random.uniform(0, self.jitter_ms) / 1000
+            if throttle:
+                self.throttled[operation] = self.throttled.get(operation, 0) + 1
+        if not throttle and nbytes and self.bytes_per_second:
+            delay += nbytes / self.bytes_per_second
+        if delay:
+            time.sleep(delay)
+        return not throttle
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled), "failed": dict(self.failed)}
+
+class FakeAzure:
+    """
+    State of one fake storage account (containers, tables, queues) and one event hub.
+    """
+
+    def __init__(self, injector=None, account_name=ACCOUNT_NAME, partition_count=4):
+        self.injector = injector or FaultInjector()
+        self.account_name = account_name
+        self.containers = {} # container -> {blob name -> _Blob}
+        self.uncommitted = {} # (container, blob name) -> {block id -> bytes}
+        self.tables = {} # table -> {(PartitionKey, RowKey) -> entity}
+        self.queues = {} # queue -> _Queue
+        self.partitions = {str(partition): [] for partition in range(partition_count)} # event hub partition -> events
+        self.lock = threading.RLock()
+        self.blob_service_client = FakeBlobServiceClient(self)
+        self.table_service_client = FakeTableServiceClient(self)
+        self.queue_service_client = FakeQueueServiceClient(self)
+
+    def install(self, connection_string=None):
+        """
+        Registers the fake service clients in shared_code.storage_clients for the connection string
+        (default: AzureWebJobsStorage), so every get_*_client call returns a fake.
+        """
+        from shared_code.storage_clients import set_clients
+        set_clients(connection_string, blob_service_client=self.blob_service_client,
+                    table_service_client=self.table_service_client, queue_service_client=self.queue_service_client)
+
+    def producer(self, eventhub_name="FeedbackHub"):
+        return FakeEventHubProducerClient(self, eventhub_name)
+
+    def put_blob(self, container, name, data, content_md5=True):
+        """
+        Seeds a blob without going through the injector. content_md5=False stores it without an MD5,
+        like blobs uploaded in blocks.
+        """
+        with self.lock:
+            blobs = self.containers.setdefault(container, {})
+            blobs[name] = _Blob(name, data, ContentSettings(), with_md5=content_md5)
+
+    def stats(self):
+        with self.lock:
+            return {**self.injector.stats(),
+                    "blobs": {name: len(blobs) for name, blobs in self.containers.items()},
+                    "entities": {name: len(entities) for name, entities in self.tables.items()},
+                    "queue_messages": {name: len(queue.messages) for name, queue in self.queues.items()},
+                    "events": sum(len(events) for events in self.partitions.values())}
+
+# --- Blob storage ---
+
+class _Blob:
+    _sequence = itertools.count()
+
+    def __init__(self, name, data, content_settings, with_md5=True, copy=None):
+        now = datetime.now(timezone.utc)
+        self.name = name
+        self.data = bytes(data)
+        self.content_settings = ContentSettings(
+            content_type=content_settings.content_type or "application/octet-stream",
+            content_encoding=content_settings.content_encoding, content_language=content_settings.content_language,
+            content_disposition=content_settings.content_disposition, cache_control=content_settings.cache_control,
+            content_md5=content_settings.content_md5 or (bytearray(hashlib.md5(self.data).digest()) if with_md5 else None))
+        self.etag = f'"0x{next(self._sequence):016X}"'
+        self.last_modified = now
+        self.creation_time = now
+        self.metadata = {}
+        self.copy = copy or SimpleNamespace(id=None, status=None, status_description=None)
+
+    def properties(self, container):
+        return SimpleNamespace(name=self.name, container=container, size=len(self.data), etag=self.etag,
+                               last_modified=self.last_modified, creation_time=self.creation_time,
+                               blob_type="BlockBlob", metadata=dict(self.metadata),
+                               content_settings=self.content_settings, copy=self.copy)
+
+class FakeBlobServiceClient:
+    def __init__(self, backend):
+        self._backend = backend
+        self.account_name = backend.account_name
+        self.credential = SimpleNamespace(account_name=backend.account_name, account_key=ACCOUNT_KEY)
+        self.url = f"https://{backend.account_name}.blob.core.windows.net/"
+
+    def get_container_client(self, container):
+        return FakeContainerClient(self._backend, container)
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self._backend, container, blob)
+
+    def close(self):
+        pass
+
+class _PageIterator:
+    # Like ItemPaged.by_page(): iterates pages and exposes the token of the next page
+    def __init__(self, backend, container, prefix, page_size, continuation_token):
+        self._backend = backend
+        self._container = container
+        self._prefix = prefix or ""
+        self._page_size = page_size
+        self.continuation_token = continuation_token
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        self._backend.injector("list_blobs")
+        with self._backend.lock:
+            blobs = self._backend.containers.get(self._container)
+            if blobs is None:
+                raise ResourceNotFoundError(f"The specified container '{self._container}' does not exist. ErrorCode:ContainerNotFound")
+            marker = self.continuation_token or ""
+            names = sorted(name for name in blobs if name.startswith(self._prefix) and name >= marker)
+            page = [blobs[name].properties(self._container) for name in names[:self._page_size]]
+        self.continuation_token = names[self._page_size] if len(names) > self._page_size else None
+        self._done = self.continuation_token is None
+        return page
+
+class _BlobPager:
+    def __init__(self, backend, container, prefix, page_size):
+        self._args = (backend, container, prefix, page_size)
+
+    def by_page(self, continuation_token=None):
+        return _PageIterator(*self._args, continuation_token)
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+class FakeContainerClient:
+    def __init__(self, backend, container):
+        self._backend = backend
+        self.container_name = container
+        self.url = f"https://{backend.account_name}.blob.core.windows.net/{container}"
+
+    def create_container(self):
+        self._backend.injector("create_container")
+        with self._backend.lock:
+            if self.container_name in self._backend.containers:
+                raise ResourceExistsError("The specified container already exists. ErrorCode:ContainerAlreadyExists")
+            self._backend.containers[self.container_name] = {}
+
+    def list_blobs(self, name_starts_with=None, results_per_page=5000, include=None):
+        # Blob items always carry their copy properties, as if include=["copy"] were given
+        return _BlobPager(self._backend, self.container_name, name_starts_with, results_per_page)
+
+    def get_blob_client(self, blob):
+        return FakeBlobClient(self._backend, self.container_name, blob)
+
+    def close(self):
+        pass
+
+class _Downloader:
+    # Like StorageStreamDownloader: size/properties are known after the first GET
+    def __init__(self, backend, blob, container):
+        self._backend = backend
+        self._data = blob.data
+        self.properties = blob.properties(container)
+        self.size = len(blob.data)
+
+    def chunks(self):
+        for start in range(0, len(self._data), DOWNLOAD_CHUNK_SIZE):
+            chunk = self._data[start:start + DOWNLOAD_CHUNK_SIZE]
+            if start: # The first chunk came with the download_blob call
+                self._backend.injector("download_chunk", len(chunk))
+            yield chunk
+
+    def readall(self):
+        self._backend.injector("download_chunk", max(len(self._data) - DOWNLOAD_CHUNK_SIZE, 0))
+        return self._data
+
+class FakeBlobClient:
+    def __init__(self, backend, container, blob):
+        self._backend = backend
+        self.container_name = container
+        self.blob_name = blob
+        self.url = f"https://{backend.account_name}.blob.core.windows.net/{container}/{quote(blob)}"
+        self._key = (container, blob)
+
+    def _container(self):
+        blobs = self._backend.containers.get(self.container_name)
+        if blobs is None:
+            raise ResourceNotFoundError(f"The specified container '{self.container_name}' does not exist. ErrorCode:ContainerNotFound")
+        return blobs
+
+    def _blob(self):
+        blob = self._container().get(self.blob_name)
+        if blob is None:
+            raise ResourceNotFoundError(f"The specified blob '{self.blob_name}' does not exist. ErrorCode:BlobNotFound")
+        return blob
+
+    def exists(self):
+        self._backend.injector("get_blob_properties")
+        with self._backend.lock:
+            return self.blob_name in self._backend.containers.get(self.container_name, {})
+
+    def get_blob_properties(self):
+        self._backend.injector("get_blob_properties")
+        with self._backend.lock:
+            return self._blob().properties(self.container_name)
+
+    def download_blob(self):
+        with self._backend.lock:
+            blob = self._blob()
+        self._backend.injector("download_blob", min(len(blob.data), DOWNLOAD_CHUNK_SIZE))
+        return _Downloader(self._backend, blob, self.container_name)
+
+    def upload_blob(self, data, overwrite=False, content_settings=None):
+        data = data.encode("utf-8") if isinstance(data, str) else data.read() if hasattr(data, "read") else data
+        self._backend.injector("upload_blob", len(data))
+        with self._backend.lock:
+            blobs = self._container()
+            if not overwrite and self.blob_name in blobs:
+                raise ResourceExistsError("The specified blob already exists. ErrorCode:BlobAlreadyExists")
+            # A single Put Blob gets a service computed Content-MD5
+            blobs[self.blob_name] = _Blob(self.blob_name, data, content_settings or ContentSettings())
+        return {"etag": blobs[self.blob_name].etag}
+
+    def stage_block(self, block_id, data):
+        self._backend.injector("stage_block", len(data))
+        with self._backend.lock:
+            self._container()
+            self._backend.uncommitted.setdefault(self._key, {})[block_id] = bytes(data)
+
+    def commit_block_list(self, block_list, content_settings=None):
+        self._backend.injector("commit_block_list")
+        with self._backend.lock:
+            staged = self._backend.uncommitted.pop(self._key, {})
+            try:
+                data = b"".join(staged[block.id] for block in block_list)
+            except KeyError as e:
+                raise HttpResponseError(message=f"The specified block list is invalid ({e}). ErrorCode:InvalidBlockList")
+            # Put Block List stores Content-MD5 only if the client sends one
+            self._container()[self.blob_name] = _Blob(self.blob_name, data, content_settings or ContentSettings(), with_md5=False)
+        return {"etag": self._backend.containers[self.container_name][self.blob_name].etag}
+
+    def start_copy_from_url(self, source_url):
+        # The source URL is "<account url>/<container>/<blob>?<sas>"; the copy completes synchronously
+        container, _, name = urlsplit(source_url).path.lstrip("/").partition("/")
+        with self._backend.lock:
+            source = self._backend.containers.get(container, {}).get(unquote(name))
+        self._backend.injector("start_copy_from_url", len(source.data) if source else 0)
+        if source is None:
+            raise ResourceNotFoundError(f"The specified copy source '{source_url.split('?')[0]}' does not exist. ErrorCode:CannotVerifyCopySource")
+        copy_id = str(uuid.uuid4())
+        with self._backend.lock:
+            target = _Blob(self.blob_name, source.data, source.content_settings,
+                           copy=SimpleNamespace(id=copy_id, status="success", status_description=None))
+            self._container()[self.blob_name] = target
+        return {"copy_id": copy_id, "copy_status": "success", "etag": target.etag}
+
+    def close(self):
+        pass
+
+# --- Table storage ---
+
+class FakeTableServiceClient:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get_table_client(self, table_name):
+        return FakeTableClient(self._backend, table_name)
+
+    def close(self):
+        pass
+
+class FakeTableClient:
+    def __init__(self, backend, table_name):
+        self._backend = backend
+        self.table_name = table_name
+
+    def _table(self):
+        table = self._backend.tables.get(self.table_name)
+        if table is None:
+            raise ResourceNotFoundError(f"The table '{self.table_name}' was not found. ErrorCode:TableNotFound")
+        return table
+
+    def create_table(self):
+        self._backend.injector("create_table")
+        with self._backend.lock:
+            if self.table_name in self._backend.tables:
+                raise ResourceExistsError("The table specified already exists. ErrorCode:TableAlreadyExists")
+            self._backend.tables[self.table_name] = {}
+
+    def upsert_entity(self, entity, mode=None):
+        self._backend.injector("upsert_entity")
+        with self._backend.lock:
+            self._table()[(entity["PartitionKey"], entity["RowKey"])] = dict(entity)
+        return {}
+
+    def submit_transaction(self, operations):
+        operations = list(operations)
+        self._backend.injector("submit_transaction")
+        keys = [(entity["PartitionKey"], entity["RowKey"]) for _, entity in operations]
+        # The service's entity group transaction rules
+        if len(operations) > MAX_TRANSACTION_OPERATIONS:
+            raise HttpResponseError(message="The batch request exceeds 100 operations. ErrorCode:InvalidInput")
+        if len({key[0] for key in keys}) > 1:
+            raise HttpResponseError(message="All entities in a batch must have the same PartitionKey. ErrorCode:CommandsInBatchActOnDifferentPartitions")
+        if len(set(keys)) != len(keys):
+            raise HttpResponseError(message="The batch contains multiple operations on one entity. ErrorCode:InvalidDuplicateRow")
+        with self._backend.lock:
+            table = self._table()
+            for (operation, entity), key in zip(operations, keys):
+                if operation not in ("upsert", "create"):
+                    raise HttpResponseError(message=f"Unsupported fake operation '{operation}'")
+                table[key] = dict(entity)
+        return [{} for _ in operations]
+
+    def get_entity(self, partition_key, row_key):
+        self._backend.injector("get_entity")
+        with self._backend.lock:
+            entity = self._table().get((partition_key, row_key))
+        if entity is None:
+            raise ResourceNotFoundError("The specified resource does not exist. ErrorCode:ResourceNotFound")
+        return dict(entity)
+
+    def close(self):
+        pass
+
+# --- Queue storage ---
+
+class _Queue:
+    def __init__(self):
+        self.messages = {} # message id -> [content, visible_at, dequeue_count, pop_receipt]
+
+class FakeQueueServiceClient:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get_queue_client(self, queue):
+        return FakeQueueClient(self._backend, queue)
+
+    def close(self):
+        pass
+
+class FakeQueueClient:
+    def __init__(self, backend, queue_name):
+        self._backend = backend
+        self.queue_name = queue_name
+
+    def _queue(self):
+        queue = self._backend.queues.get(self.queue_name)
+        if queue is None:
+            raise ResourceNotFoundError("The specified queue does not exist. ErrorCode:QueueNotFound")
+        return queue
+
+    def create_queue(self):
+        self._backend.injector("create_queue")
+        with self._backend.lock:
+            if self.queue_name in self._backend.queues:
+                raise ResourceExistsError("The specified queue already exists. ErrorCode:QueueAlreadyExists")
+            self._backend.queues[self.queue_name] = _Queue()
+
+    def send_message(self, content, visibility_timeout=None):
+        size = len(content.encode("utf-8") if isinstance(content, str) else content)
+        self._backend.injector("send_message", size)
+        if size > MAX_QUEUE_MESSAGE_BYTES:
+            raise HttpResponseError(message=f"The message is {size} bytes, the limit is 64 KiB. ErrorCode:RequestBodyTooLarge")
+        message_id = str(uuid.uuid4())
+        with self._backend.lock:
+            self._queue().messages[message_id] = [content, time.monotonic() + (visibility_timeout or 0), 0, None]
+        return {"id": message_id}
+
+    def receive_messages(self, messages_per_page=32, visibility_timeout=30, max_messages=None):
+        self._backend.injector("receive_messages")
+        now = time.monotonic()
+        received = []
+        with self._backend.lock:
+            for message_id, message in self._queue().messages.items():
+                if len(received) >= min(messages_per_page, max_messages or messages_per_page):
+                    break
+                if message[1] <= now:
+                    message[1] = now + visibility_timeout
+                    message[2] += 1
+                    message[3] = str(uuid.uuid4())
+                    received.append(SimpleNamespace(id=message_id, content=message[0], dequeue_count=message[2], pop_receipt=message[3]))
+        return received
+
+    def delete_message(self, message, pop_receipt=None):
+        self._backend.injector("delete_message")
+        message_id = getattr(message, "id", message)
+        pop_receipt = pop_receipt or getattr(message, "pop_receipt", None)
+        with self._backend.lock:
+            stored = self._queue().messages.get(message_id)
+            if stored is None or stored[3] != pop_receipt:
+                raise ResourceNotFoundError("The specified message does not exist or the pop receipt is stale. ErrorCode:MessageNotFound")
+            del self._queue().messages[message_id]
+
+    def close(self):
+        pass
+
+# --- Event Hubs ---
+
+class FakeEventDataBatch:
+    EVENT_OVERHEAD = 24 # Rough per-event AMQP framing overhead in bytes
+
+    def __init__(self, partition_key=None, partition_id=None, max_size_in_bytes=None):
+        self.partition_key = partition_key
+        self.partition_id = partition_id
+        self.max_size_in_bytes = max_size_in_bytes or MAX_EVENT_BATCH_BYTES
+        self.size_in_bytes = 0
+        self.events = []
+
+    def add(self, event):
+        size = sum(len(part) for part in event.body) + self.EVENT_OVERHEAD
+        if self.size_in_bytes + size > self.max_size_in_bytes:
+            raise ValueError("EventDataBatch has reached its size limit")
+        self.events.append(event)
+        self.size_in_bytes += size
+
+    def __len__(self):
+        return len(self.events)
+
+class FakeEventHubProducerClient:
+    """
+    Sync EventHubProducerClient look-alike. Batches go to a partition chosen by partition_id or by
+    hashing the partition key (round robin without either).
+    """
+
+    def __init__(self, backend, eventhub_name):
+        self._backend = backend
+        self.eventhub_name = eventhub_name
+        self._round_robin = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def create_batch(self, partition_key=None, partition_id=None, max_size_in_bytes=None):
+        return FakeEventDataBatch(partition_key, partition_id, max_size_in_bytes)
+
+    def send_batch(self, batch, partition_key=None, partition_id=None):
+        if not isinstance(batch, FakeEventDataBatch):
+            events, batch = batch, FakeEventDataBatch(partition_key, partition_id)
+            for event in events:
+                batch.add(event)
+        self._backend.injector("send_batch", batch.size_in_bytes)
+        partitions = self._backend.partitions
+        if batch.partition_id is not None:
+            partition = str(batch.partition_id)
+        elif batch.partition_key is not None:
+            partition = str(zlib.crc32(batch.partition_key.encode("utf-8")) % len(partitions))
+        else:
+            partition = str(next(self._round_robin) % len(partitions))
+        with self._backend.lock:
+            partitions[partition].extend(batch.events)
+
+    def send_event(self, event, partition_key=None, partition_id=None):
+        self.send_batch([event], partition_key=partition_key, partition_id=partition_id)
+
+    def close(self):
+        pass
@@ -0,0 +1,162 @@
+"""
+Local fake of the SendGrid v3 mail/send endpoint, for exercising shared_code.email_outbox offline.
+
+FakeSendGrid records every request and can inject latency, throttling (429 with Retry-After) and
+server errors (503), and rejects (400) personalizations whose recipient has no '@'. Run on its own
+to point a function app at it (SENDGRID_API_URL=http://127.0.0.1:8025), or with --demo to queue
+orders through OrderStore and drain the outbox against it:
+
+    python scripts/fake_sendgrid.py --demo --orders 20000 --throttle-every 5 --error-every 7
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+class FakeSendGrid:
+    """
+    Threaded HTTP server answering POST /v3/mail/send like SendGrid (202 Accepted).
+
+    throttle_every / error_every make every n-th request fail with 429 / 503. Accepted requests
+    and recipients are kept in `requests` and `recipients`.
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, throttle_every=0, error_every=0):
+        self.latency = latency_ms / 1000
+        self.throttle_every = throttle_every
+        self.error_every = error_every
+        self.requests = []
+        self.recipients = []
+        self.calls = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, so connection reuse is visible in fake.connections
+            disable_nagle_algorithm = True # headers and body are separate writes
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                with fake._lock:
+                    fake.calls += 1
+                    call = fake.calls
+                if self.path != "/v3/mail/send" or not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self._reply(401 if self.path == "/v3/mail/send" else 404, {"errors": [{"message": "unauthorized"}]})
+                if fake.throttle_every and call % fake.throttle_every == 0:
+                    return self._reply(429, {"errors": [{"message": "too many requests"}]}, {"Retry-After": "0"})
+                if fake.error_every and call % fake.error_every == 0:
+                    return self._reply(503, {"errors": [{"message": "service unavailable"}]})
+                message = json.loads(body)
+                personalizations = message.get("personalizations", [])
+                recipients = [to["email"] for p in personalizations for to in p.get("to", [])]
+                if not personalizations or len(personalizations) > 1000 or any("@" not in r for r in recipients):
+                    return self._reply(400, {"errors": [{"message": "invalid personalizations"}]})
+                with fake._lock:
+                    fake.requests.append(message)
+                    fake.recipients.extend(recipients)
+                self._reply(202)
+
+            def _reply(self, status, payload=None, headers=None):
+                body = json.dumps(payload).encode("utf-8") if payload else b""
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def demo(args):
+    from shared_code.email_outbox import OutboxDispatcher
+    from shared_code.order_store import OrderStore
+
+    with tempfile.TemporaryDirectory() as work_dir, FakeSendGrid(latency_ms=args.latency_ms, throttle_every=args.throttle_every,
+                                                                  error_every=args.error_every) as fake:
+        path = os.path.join(work_dir, "orders.db")
+        store = OrderStore(path, outbox=True)
+        store.insert_orders([{"order_id": f"ORD-{index:08d}", "customer_email": f"customer{index}@example.com" if index % 997 else "not-an-email",
+                              "amount": 10 + index % 50} for index in range(args.orders)])
+        store.close()
+
+        dispatcher = OutboxDispatcher(path, api_key="fake", api_url=fake.url, batch_size=args.batch_size,
+                                      requests_per_second=args.rate, backoff_seconds=0)
+        started = time.perf_counter()
+        totals = {"sent": 0, "failed": 0, "retried": 0, "requests": 0}
+        # Rescheduled rows become due again right away (backoff_seconds=0), so drain until nothing is left
+        while True:
+            result = dispatcher.drain()
+            for key in totals:
+                totals[key] += result[key]
+            if not result["retried"]:
+                break
+        elapsed = time.perf_counter() - started
+        print(f"{totals['sent']} emails sent, {totals['failed']} failed, {totals['retried']} rescheduled in "
+              f"{totals['requests']} requests over {fake.connections} connections in {elapsed:.2f}s: "
+              f"{totals['sent'] / elapsed:.0f} emails/s")
+        assert len(fake.recipients) == totals["sent"] == len(set(fake.recipients))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SendGrid v3 mail/send server")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every n-th request with 429")
+    parser.add_argument("--error-every", type=int, default=0, help="Answer every n-th request with 503")
+    parser.add_argument("--demo", action="store_true", help="Queue --orders orders and drain the outbox against the fake")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0, help="Dispatcher requests per second (0 = unlimited)")
+    args = parser.parse_args()
+
+    if args.demo:
+        demo(args)
+        return
+    fake = FakeSendGrid(port=args.port, latency_ms=args.latency_ms, throttle_every=args.throttle_every, error_every=args.error_every)
+    print(f"Fake SendGrid listening on {fake.url} (set SENDGRID_API_URL to this)")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Offline load harness: drives the function handlers against the in-memory Azure fakes (scripts/fake_azure.py)
+at a target rate and reports throughput, latency percentiles, the fake backend's call/throttle counts
+and the per-stage numbers from shared_code.instrumentation.
+
+Pipelines:
+  process_file  blob trigger copies of seeded blobs (code_samples/blob_trigger.py)
+  scanner       BlobScannerFunction runs over a seeded container, with --churn of the blobs
+                rewritten (same content, new etag) between runs (code_samples/time_trigger.py)
+  orders        send_orders HTTP batches into the fake order-queue, then order_processor per
+                message received from it (code_samples/msg_sender_http.py, msg_processor.py)
+  blob_events   batched Event Grid webhook deliveries into the fake queue (msg_sender_event_grid.py)
+  feedback      generate_feedback.run_throughput against the fake Event Hub (src/Phase1)
+
+Invocations are scheduled open loop at --rate per second (latency includes time spent waiting for
+one of the --concurrency workers), or closed loop as fast as the workers allow with --rate 0.
+A fixed --seed keeps the injected jitter and throttling reproducible.
+
+    python scripts/load_harness.py process_file --invocations 2000 --rate 200 --concurrency 16 --latency-ms 5
+    python scripts/load_harness.py orders --invocations 20000 --throttle-probability 0.01 --json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, "src"), os.path.join(REPO_ROOT, "code_samples")]
+from fake_azure import CONNECTION_STRING, FakeAzure, FaultInjector
+
+class InputStream:
+    # Stand-in for func.InputStream
+    def __init__(self, name, data):
+        self.name = name
+        self.length = len(data)
+        self._data = data
+
+    def read(self, size=-1):
+        return self._data
+
+class QueueOut:
+    # Stand-in for a func.Out queue binding that writes to the fake queue, like the host does after the call
+    def __init__(self, queue_client):
+        self.queue_client = queue_client
+
+    def set(self, value):
+        for message in value if isinstance(value, list) else [value]:
+            self.queue_client.send_message(message)
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def drive(handler, inputs, rate, concurrency):
+    """
+    Calls handler(item) for every input on `concurrency` threads, started at `rate` per second
+    (0: as fast as the threads allow). Returns the run's throughput, latency and error counts.
+    """
+    latencies = []
+    service_times = []
+    errors = []
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency) if not rate else None
+
+    def call(item, scheduled):
+        started = time.perf_counter()
+        try:
+            handler(item)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+        finished = time.perf_counter()
+        with lock:
+            latencies.append(finished - scheduled)
+            service_times.append(finished - started)
+        if slots:
+            slots.release()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, item in enumerate(inputs):
+            if rate:
+                scheduled = started + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                slots.acquire()
+                scheduled = time.perf_counter()
+            pool.submit(call, item, scheduled)
+    seconds = time.perf_counter() - started
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {"invocations": len(latencies), "seconds": round(seconds, 3), "invocations_per_s": round(len(latencies) / seconds, 1),
+            "latency_ms": {name: to_ms(percentile(latencies, fraction)) for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "service_ms": {name: to_ms(percentile(service_times, fraction)) for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "max_latency_ms": to_ms(max(latencies, default=None)), "errors": len(errors), "first_errors": errors[:5]}
+
+def seed_blobs(backend, count, size_kb, prefix="", extension=".csv"):
+    line = b"order_id,customer_email,amount,comment\n"
+    data = (line * (size_kb * 1024 // len(line) + 1))[:size_kb * 1024]
+    names = [f"{prefix}file-{index:07d}{extension}" for index in range(count)]
+    for index, name in enumerate(names):
+        # Distinct content per blob, so dedup only kicks in for real re-uploads
+        backend.put_blob("input", name, data + str(index).encode("ascii"))
+    return names
+
+def run_process_file(backend, args):
+    import blob_trigger
+    names = seed_blobs(backend, min(args.invocations, args.distinct_blobs), args.blob_kb)
+    backend.containers.setdefault("output", {}) # process_file expects a deployed target container
+    # Each invocation reads the source like the host does before calling the function
+    handler = lambda name: blob_trigger.process_file(InputStream(f"input/{name}", backend.containers["input"][name].data))
+    return drive(handler, (names[index % len(names)] for index in range(args.invocations)), args.rate, args.concurrency)
+
+def run_scanner(backend, args):
+    import time_trigger
+    names = seed_blobs(backend, args.invocations, args.blob_kb, prefix="2025/")
+    # Runs are sequential like timer executions; the churn between runs rewrites blobs with their current content
+    def handler(run):
+        if run:
+            for name in names[:int(len(names) * args.churn)]:
+                blob = backend.containers["input"][name]
+                backend.put_blob("input", name, blob.data)
+        time_trigger.blob_scanner_function(None)
+    result = drive(handler, range(args.runs), 0, 1)
+    result["blobs"] = len(names)
+    return result
+
+def run_orders(backend, args):
+    import azure.functions as func
+    import msg_processor
+    import msg_sender_http
+    from shared_code.storage_clients import get_queue_client
+
+    queue_client = get_queue_client("order-queue")
+    queue_client.create_queue()
+    out = QueueOut(queue_client)
+    batch_size = args.orders_per_request
+    bodies = []
+    for start in range(0, args.invocations, batch_size):
+        lines = (json.dumps({"order_id": f"order-{index}", "customer_email": f"user{index}@example.com", "amount": 10 + index % 90})
+                 for index in range(start, min(start + batch_size, args.invocations)))
+        bodies.append("\n".join(lines).encode("utf-8"))
+    send = lambda body: msg_sender_http.send_orders(
+        func.HttpRequest("POST", "/api/send_orders", body=body, headers={"Content-Type": "application/x-ndjson"}), out)
+    producer = drive(send, bodies, 0, args.concurrency)
+
+    # The queue trigger: receive a page, call order_processor per message, delete it when it succeeded
+    def messages():
+        while True:
+            page = queue_client.receive_messages(messages_per_page=32)
+            if not page:
+                return
+            yield from page
+
+    def process(message):
+        msg_processor.order_processor(func.QueueMessage(id=message.id, body=message.content.encode("utf-8")))
+        queue_client.delete_message(message)
+
+    result = drive(process, messages(), args.rate, args.concurrency)
+    result["producer"] = producer
+    return result
+
+def run_blob_events(backend, args):
+    import azure.functions as func
+    import msg_sender_event_grid
+    from shared_code.storage_clients import get_queue_client
+
+    queue_client = get_queue_client("order-queue")
+    queue_client.create_queue()
+    out = QueueOut(queue_client)
+    deliveries = []
+    for start in range(0, args.invocations * args.events_per_delivery, args.events_per_delivery):
+        events = [{"id": f"event-{index}", "eventType": "Microsoft.Storage.BlobCreated", "subject": f"/blobServices/default/containers/input/blobs/file-{index}.csv",
+                   "data": {"url": f"https://fakeaccount.blob.core.windows.net/input/file-{index}.csv"}, "dataVersion": "1"}
+                  for index in range(start, start + args.events_per_delivery)]
+        deliveries.append(json.dumps(events).encode("utf-8"))
+    handler = lambda body: msg_sender_event_grid.process_blob_events(
+        func.HttpRequest("POST", "/api/blob_events", body=body, headers={"Content-Type": "application/json"}), out)
+    return drive(handler, deliveries, args.rate, args.concurrency)
+
+def run_feedback(backend, args):
+    phase1 = os.path.join(REPO_ROOT, "src", "Phase1")
+    sys.path.insert(0, phase1)
+    import pandas as pd
+    import generate_feedback
+    from avro_codec import SchemaRegistry, SingleObjectEncoder
+
+    producer = backend.producer()
+    encode = SingleObjectEncoder(generate_feedback.load_schema(os.path.join(phase1, "feedback_schema.avsc")),
+                                 SchemaRegistry(tempfile.mkdtemp(prefix="schema_registry_"))).encode
+    df = pd.read_csv(os.path.join(phase1, "iphone.csv"))
+    # One "invocation" is a whole throughput run; --invocations is the number of events and --rate the events/s
+    handler = lambda _: generate_feedback.run_throughput(producer, df, encode, rate=args.rate, count=args.invocations)
+    result = drive(handler, [None], 0, 1)
+    result["events_per_s"] = round(backend.stats()["events"] / result["seconds"], 1)
+    return result
+
+PIPELINES = {"process_file": run_process_file, "scanner": run_scanner, "orders": run_orders,
+             "blob_events": run_blob_events, "feedback": run_feedback}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pipeline", choices=PIPELINES)
+    parser.add_argument("--invocations", type=int, default=1000, help="Invocations (scanner: blobs, feedback: events)")
+    parser.add_argument("--rate", type=float, default=0, help="Target invocations per second (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent invocations")
+    parser.add_argument("--latency-ms", type=float, default=2, help="Injected latency per storage call")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="Simulated transfer rate of data calls (0 = unlimited)")
+    parser.add_argument("--throttle-probability", type=float, default=0, help="Chance of a 503 ServerBusy per call")
+    parser.add_argument("--max-ops-per-second", type=int, default=0, help="Account call budget, calls over it get a 503")
+    parser.add_argument("--retry-total", type=int, default=3, help="Retries of a throttled call before the 503 is raised")
+    parser.add_argument("--retry-backoff-ms", type=float, default=100, help="First retry backoff, doubled per retry")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blob-kb", type=int, default=256, help="Size of the seeded blobs")
+    parser.add_argument("--distinct-blobs", type=int, default=1000, help="process_file: blobs cycled through")
+    parser.add_argument("--runs", type=int, default=3, help="scanner: timer runs")
+    parser.add_argument("--churn", type=float, default=0.1, help="scanner: fraction of blobs rewritten between runs")
+    parser.add_argument("--orders-per-request", type=int, default=1000, help="orders: orders per send_orders request")
+    parser.add_argument("--events-per-delivery", type=int, default=100, help="blob_events: events per webhook delivery")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    # The handler modules read their settings when imported, so the environment is set up first
+    workdir = tempfile.mkdtemp(prefix="load_harness_")
+    os.environ["AzureWebJobsStorage"] = CONNECTION_STRING
+    os.environ.setdefault("ORDERS_DB_PATH", os.path.join(workdir, "orders.db"))
+    logging.basicConfig(level=logging.WARNING)
+    backend = FakeAzure(FaultInjector(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                      bytes_per_second=args.bandwidth_mbps * 1024 * 1024 / 8 or None,
+                                      throttle_probability=args.throttle_probability,
+                                      max_ops_per_second=args.max_ops_per_second or None, retry_total=args.retry_total,
+                                      retry_backoff_ms=args.retry_backoff_ms, seed=args.seed))
+    backend.install()
+
+    from shared_code.instrumentation import registry
+    result = PIPELINES[args.pipeline](backend, args)
+    result["backend"] = backend.stats()
+    result["stages"] = registry.snapshot()
+
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+        return
+    print(f"{args.pipeline}: {result['invocations']} invocations in {result['seconds']}s "
+          f"({result['invocations_per_s']}/s), {result['errors']} errors")
+    print(f"latency ms  p50 {result['latency_ms']['p50']}  p95 {result['latency_ms']['p95']}  "
+          f"p99 {result['latency_ms']['p99']}  max {result['max_latency_ms']}")
+    for error in result["first_errors"]:
+        print(f"  error: {error}")
+    calls, throttled, failed = result["backend"]["calls"], result["backend"]["throttled"], result["backend"]["failed"]
+    print(f"{'storage call':<22}{'calls':>9}{'throttled':>11}{'failed':>8}")
+    for operation in sorted(calls):
+        print(f"{operation:<22}{calls[operation]:>9}{throttled.get(operation, 0):>11}{failed.get(operation, 0):>8}")
+    print(f"{'function/stage':<36}{'spans':>8}{'seconds':>10}{'items':>9}{'MB':>9}")
+    for function_name, function in result["stages"].items():
+        print(f"{function_name:<36}{function['invocations']:>8}{function['seconds']:>10.2f}")
+        for stage, stats in function["stages"].items():
+            print(f"  {stage:<34}{stats['spans']:>8}{stats['seconds']:>10.2f}{stats['items']:>9}{stats['bytes'] / 1024 / 1024:>9.1f}")
+        for name, value in function["counters"].items():
+            print(f"  {name:<34}{value:>8}")
+
+if __name__ == "__main__":
+    main()
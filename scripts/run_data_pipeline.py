@@ -0,0 +1,330 @@
+"""
+Chunked, parallel file-format conversion between CSV, Avro, Parquet and ORC.
+
+Every file is streamed through pyarrow in bounded chunks (record batches), so memory stays flat
+no matter how large the file is, and several files are converted in parallel with a process pool.
+The Avro schema of the output is either inferred from the data or given with --schema
+(e.g. src/Phase1/feedback_schema.avsc); with --schema the input columns are also cast to it.
+
+Examples:
+    python scripts/run_data_pipeline.py users.avro users_parquet users.orc --to csv --output-dir converted
+    python scripts/run_data_pipeline.py exports/*.csv --to avro --schema src/Phase1/feedback_schema.avsc --workers 8
+
+It can also be used as a library: convert_file() converts one file, convert_files() a list of files.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import fastavro
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.orc as pa_orc
+import pyarrow.parquet as pq
+
+FORMATS = ["csv", "avro", "parquet", "orc"]
+EXTENSIONS = {"csv": ".csv", "avro": ".avro", "parquet": ".parquet", "orc": ".orc"}
+DEFAULT_CHUNK_ROWS = 128 * 1024 # Rows per record batch (and per Parquet row group)
+CSV_BLOCK_BYTES = 16 * 1024 * 1024 # Bytes of CSV parsed per chunk
+
+# --- Schemas ---
+
+AVRO_PRIMITIVES = {
+    "string": pa.string(), "int": pa.int32(), "long": pa.int64(), "float": pa.float32(),
+    "double": pa.float64(), "boolean": pa.bool_(), "bytes": pa.binary(), "null": pa.null(),
+}
+AVRO_LOGICAL_TYPES = {
+    "timestamp-millis": pa.timestamp("ms", tz="UTC"), "timestamp-micros": pa.timestamp("us", tz="UTC"),
+    "date": pa.date32(), "time-millis": pa.time32("ms"), "time-micros": pa.time64("us"),
+}
+
+def avro_to_arrow_type(avro_type, named_types=None):
+    """
+    Returns (arrow type, nullable) for an Avro type. Records become structs, enums strings,
+    arrays lists, maps maps and ["null", T] unions nullable T.
+    """
+    named_types = {} if named_types is None else named_types
+    if isinstance(avro_type, list):
+        non_null = [t for t in avro_type if t != "null"]
+        if len(non_null) != 1:
+            raise ValueError(f"Only unions of null and one type are supported, got {avro_type}")
+        return avro_to_arrow_type(non_null[0], named_types)[0], "null" in avro_type
+    if isinstance(avro_type, str):
+        if avro_type in AVRO_PRIMITIVES:
+            return AVRO_PRIMITIVES[avro_type], False
+        return named_types[avro_type], False
+    if avro_type.get("logicalType") in AVRO_LOGICAL_TYPES:
+        return AVRO_LOGICAL_TYPES[avro_type["logicalType"]], False
+
+    kind = avro_type["type"]
+    if kind == "record":
+        fields = []
+        for field in avro_type["fields"]:
+            field_type, nullable = avro_to_arrow_type(field["type"], named_types)
+            fields.append(pa.field(field["name"], field_type, nullable=nullable))
+        arrow_type = pa.struct(fields)
+    elif kind == "enum":
+        arrow_type = pa.string()
+    elif kind == "fixed":
+        arrow_type = pa.binary(avro_type["size"])
+    elif kind == "array":
+        arrow_type = pa.list_(avro_to_arrow_type(avro_type["items"], named_types)[0])
+    elif kind == "map":
+        arrow_type = pa.map_(pa.string(), avro_to_arrow_type(avro_type["values"], named_types)[0])
+    else:
+        return avro_to_arrow_type(kind, named_types)
+    if "name" in avro_type:
+        named_types[avro_type["name"]] = arrow_type
+    return arrow_type, False
+
+def avro_to_arrow_schema(avro_schema):
+    return pa.schema(list(avro_to_arrow_type(avro_schema)[0]))
+
+def arrow_to_avro_type(arrow_type, name):
+    if pa.types.is_dictionary(arrow_type):
+        return arrow_to_avro_type(arrow_type.value_type, name)
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return "string"
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    if pa.types.is_integer(arrow_type):
+        return "long" if arrow_type.bit_width > 32 or arrow_type == pa.uint32() else "int"
+    if pa.types.is_float32(arrow_type):
+        return "float"
+    if pa.types.is_floating(arrow_type):
+        return "double"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type) or pa.types.is_fixed_size_binary(arrow_type):
+        return "bytes"
+    if pa.types.is_timestamp(arrow_type):
+        return {"type": "long", "logicalType": "timestamp-millis" if arrow_type.unit in ("s", "ms") else "timestamp-micros"}
+    if pa.types.is_date(arrow_type):
+        return {"type": "int", "logicalType": "date"}
+    if pa.types.is_struct(arrow_type):
+        return {"type": "record", "name": name, "fields": [arrow_to_avro_field(field, f"{name}_{field.name}") for field in arrow_type]}
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return {"type": "array", "items": arrow_to_avro_type(arrow_type.value_type, f"{name}_item")}
+    if pa.types.is_map(arrow_type):
+        return {"type": "map", "values": arrow_to_avro_type(arrow_type.item_type, f"{name}_value")}
+    raise ValueError(f"No Avro equivalent for Arrow type {arrow_type}")
+
+def arrow_to_avro_field(field, name):
+    avro_type = arrow_to_avro_type(field.type, name)
+    if field.nullable:
+        return {"name": field.name, "type": ["null", avro_type], "default": None}
+    return {"name": field.name, "type": avro_type}
+
+def arrow_to_avro_schema(arrow_schema, name="Record"):
+    """
+    Infers an Avro record schema from an Arrow schema (nullable columns become ["null", T] unions).
+    """
+    return {"type": "record", "name": name, "fields": [arrow_to_avro_field(field, f"{name}_{field.name}") for field in arrow_schema]}
+
+# --- Readers: every reader yields record batches of at most chunk_rows rows ---
+
+def detect_format(path):
+    """
+    Detects the format from the file's magic bytes (files like users_parquet have no extension).
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == b"PAR1":
+        return "parquet"
+    if magic[:3] == b"ORC":
+        return "orc"
+    if magic == b"Obj\x01":
+        return "avro"
+    return "csv"
+
+def _rechunk(batches, chunk_rows):
+    for batch in batches:
+        for offset in range(0, batch.num_rows, chunk_rows):
+            yield batch.slice(offset, chunk_rows)
+
+def _read_csv(path, chunk_rows, arrow_schema):
+    convert_options = pa_csv.ConvertOptions(column_types=arrow_schema) if arrow_schema is not None else None
+    reader = pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_BYTES), convert_options=convert_options)
+    return reader.schema, _rechunk(reader, chunk_rows)
+
+def _read_parquet(path, chunk_rows, arrow_schema):
+    parquet_file = pq.ParquetFile(path)
+    return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=chunk_rows)
+
+def _read_orc(path, chunk_rows, arrow_schema):
+    orc_file = pa_orc.ORCFile(path)
+    # ORC files are read one stripe at a time, so memory is bounded by the stripe size
+    stripes = (orc_file.read_stripe(index) for index in range(orc_file.nstripes))
+    return orc_file.schema, _rechunk(stripes, chunk_rows)
+
+def _read_avro(path, chunk_rows, arrow_schema):
+    f = open(path, "rb")
+    reader = fastavro.reader(f)
+    schema = avro_to_arrow_schema(reader.writer_schema)
+
+    def batches():
+        with f:
+            chunk = []
+            for record in reader:
+                chunk.append(record)
+                if len(chunk) >= chunk_rows:
+                    yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+                    chunk = []
+            if chunk:
+                yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+    return schema, batches()
+
+READERS = {"csv": _read_csv, "parquet": _read_parquet, "orc": _read_orc, "avro": _read_avro}
+
+# --- Writers: every writer consumes an iterator of record batches ---
+
+def _without_dictionaries(arrow_type):
+    # The same type with every (possibly nested) dictionary type replaced by its value type
+    if pa.types.is_dictionary(arrow_type):
+        return _without_dictionaries(arrow_type.value_type)
+    if pa.types.is_struct(arrow_type):
+        return pa.struct([field.with_type(_without_dictionaries(field.type)) for field in arrow_type])
+    if pa.types.is_list(arrow_type):
+        return pa.list_(_without_dictionaries(arrow_type.value_type))
+    return arrow_type
+
+def _plain_batch(batch, flatten=False):
+    # CSV and ORC writers can't handle dictionary columns (and CSV no nested ones either)
+    table = pa.Table.from_batches([batch])
+    table = table.cast(pa.schema([field.with_type(_without_dictionaries(field.type)) for field in table.schema]))
+    if flatten:
+        while any(pa.types.is_struct(field.type) for field in table.schema):
+            table = table.flatten()
+    return table
+
+def _write_csv(path, schema, batches, avro_schema, compression):
+    writer = None
+    try:
+        for batch in batches:
+            table = _plain_batch(batch, flatten=True)
+            if writer is None:
+                writer = pa_csv.CSVWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # No rows: still write the header
+        pa_csv.write_csv(_plain_batch(pa.RecordBatch.from_pylist([], schema=schema), flatten=True), path)
+
+def _write_parquet(path, schema, batches, avro_schema, compression):
+    with pq.ParquetWriter(path, schema, compression=compression or "snappy") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+def _write_orc(path, schema, batches, avro_schema, compression):
+    writer = pa_orc.ORCWriter(path, compression=compression or "zstd")
+    try:
+        for batch in batches:
+            writer.write(_plain_batch(batch))
+    finally:
+        writer.close()
+
+def _write_avro(path, schema, batches, avro_schema, compression):
+    parsed_schema = fastavro.parse_schema(avro_schema or arrow_to_avro_schema(schema))
+    # fastavro.writer consumes the records lazily, so only one batch is converted to dicts at a time
+    records = (record for batch in batches for record in batch.to_pylist())
+    with open(path, "wb") as f:
+        fastavro.writer(f, parsed_schema, records, codec=compression or "deflate")
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "orc": _write_orc, "avro": _write_avro}
+
+# --- Engine ---
+
+def _conform_batch(batch, arrow_schema, missing_defaults):
+    # The batch's columns in schema order and cast to it; missing columns are filled with their Avro default (or null)
+    columns = [pa.repeat(pa.scalar(missing_defaults[field.name], field.type), batch.num_rows) if field.name in missing_defaults
+               else batch.column(field.name) for field in arrow_schema]
+    return pa.RecordBatch.from_arrays(columns, names=arrow_schema.names).cast(arrow_schema)
+
+def convert_file(source_path, target_path, to_format, from_format=None, avro_schema=None,
+                 chunk_rows=DEFAULT_CHUNK_ROWS, compression=None):
+    """
+    Converts one file and returns a dict with the row count, bytes read/written and seconds taken.
+    avro_schema (a dict, as loaded from an .avsc file) fixes the output schema; input batches are
+    cast to it by column name. Input columns for nullable or defaulted fields are optional.
+    """
+    started = time.perf_counter()
+    from_format = from_format or detect_format(source_path)
+    arrow_schema = avro_to_arrow_schema(avro_schema) if avro_schema else None
+    schema, batches = READERS[from_format](source_path, chunk_rows, arrow_schema)
+    if arrow_schema is not None:
+        # Fields that are nullable or have a default may be missing from the input, the others are required
+        avro_fields = {field["name"]: field for field in avro_schema["fields"]}
+        missing = [field for field in arrow_schema if field.name not in schema.names]
+        required = [field.name for field in missing if not field.nullable and "default" not in avro_fields[field.name]]
+        if required:
+            raise ValueError(f"{source_path} has no column(s) {required} required by the schema")
+        missing_defaults = {field.name: avro_fields[field.name].get("default") for field in missing}
+        schema = arrow_schema
+        batches = (_conform_batch(batch, arrow_schema, missing_defaults) for batch in batches)
+
+    rows = 0
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += batch.num_rows
+            yield batch
+
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    WRITERS[to_format](target_path, schema, counted(batches), avro_schema, compression)
+    return {
+        "source": source_path,
+        "target": target_path,
+        "rows": rows,
+        "bytes_in": os.path.getsize(source_path),
+        "bytes_out": os.path.getsize(target_path),
+        "seconds": time.perf_counter() - started,
+    }
+
+def convert_files(source_paths, output_dir, to_format, workers=None, **options):
+    """
+    Converts the files in parallel (one process per file, at most `workers` at a time) into
+    output_dir, keeping the base names. Yields the result dict of every file as it finishes.
+    """
+    base_names = [os.path.splitext(os.path.basename(source_path))[0] for source_path in source_paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for source_path, base_name in zip(source_paths, base_names):
+            if base_names.count(base_name) > 1:
+                # e.g. users.avro and users.orc: keep the source extension so the outputs don't collide
+                base_name = os.path.basename(source_path).replace(".", "_")
+            target_path = os.path.join(output_dir, base_name + EXTENSIONS[to_format])
+            futures[pool.submit(convert_file, source_path, target_path, to_format, **options)] = source_path
+        for future in as_completed(futures):
+            yield future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert files between CSV, Avro, Parquet and ORC")
+    parser.add_argument("inputs", nargs="+", help="Input files (format detected from the file content)")
+    parser.add_argument("--to", dest="to_format", choices=FORMATS, required=True)
+    parser.add_argument("--from", dest="from_format", choices=FORMATS, default=None, help="Input format (default: detect)")
+    parser.add_argument("--output-dir", default="converted")
+    parser.add_argument("--schema", default=None, help="Avro schema (.avsc) for the output, e.g. feedback_schema.avsc")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--compression", default=None, help="Codec for the output (e.g. snappy, zstd, deflate)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    avro_schema = None
+    if args.schema:
+        with open(args.schema, "r") as f:
+            avro_schema = json.load(f)
+
+    started = time.perf_counter()
+    total_rows = 0
+    for result in convert_files(args.inputs, args.output_dir, args.to_format, workers=args.workers,
+                                from_format=args.from_format, avro_schema=avro_schema,
+                                chunk_rows=args.chunk_rows, compression=args.compression):
+        total_rows += result["rows"]
+        print(f"{result['source']} -> {result['target']}: {result['rows']} rows, "
+              f"{result['bytes_in']} -> {result['bytes_out']} bytes in {result['seconds']:.2f}s")
+    elapsed = time.perf_counter() - started
+    print(f"Converted {len(args.inputs)} files ({total_rows} rows) in {elapsed:.2f}s: {total_rows / max(elapsed, 1e-6):.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
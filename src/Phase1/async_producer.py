@@ -0,0 +1,218 @@
+"""
+Async, partition-aware Event Hub producer for FeedbackHub.
+
+Events are keyed by a record field (product_asin by default), one EventDataBatch is kept open per
+key, and batches are sent concurrently when they are full or have been open for `linger_ms`.
+Sends are throttled (backpressure) once the bytes being sent exceed `max_in_flight_bytes`.
+
+LocalEventHub is an in-process stand-in for azure.eventhub.aio.EventHubProducerClient, so the
+throughput can be measured without an Event Hubs namespace:
+
+    python async_producer.py --local --count 200000
+"""
+import argparse
+import asyncio
+import time
+import zlib
+from azure.eventhub import EventData
+import csv_cache
+from avro_codec import SchemaRegistry, SingleObjectEncoder
+from generate_feedback import CONNECTION_STR, EVENT_HUB_NAME, build_records, load_schema
+
+DEFAULT_MAX_BATCH_BYTES = 1024 * 1024 # Event Hubs Standard tier message size limit
+
+class PartitionedFeedbackProducer:
+    """
+    Wraps an async producer client (azure.eventhub.aio.EventHubProducerClient or LocalEventHub).
+
+    send() adds an encoded record to the open batch of its partition key; close() flushes every
+    batch, waits for the sends and closes the client. Counters: sent_events, sent_bytes, sent_batches.
+    """
+    def __init__(self, client, encode, key_field="product_asin", max_batch_bytes=None,
+                 linger_ms=50, max_in_flight_bytes=8 * 1024 * 1024):
+        self.client = client
+        self.encode = encode
+        self.key_field = key_field
+        self.max_batch_bytes = max_batch_bytes
+        self.linger = linger_ms / 1000
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self._batches = {} # partition key -> (open batch, time it was created)
+        self._tasks = set()
+        self._in_flight_bytes = 0
+        self._in_flight_changed = asyncio.Condition()
+        self._linger_task = None
+        self._closing = False
+        self._error = None # First failed send, raised from the next send() or close()
+        self.sent_events = 0
+        self.sent_bytes = 0
+        self.sent_batches = 0
+
+    def _raise_send_error(self):
+        if self._error is not None:
+            raise self._error
+
+    async def send(self, record):
+        self._raise_send_error()
+        if self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._flush_lingering())
+
+        key = str(record.get(self.key_field, ""))
+        event = EventData(body=self.encode(record))
+        batch = await self._open_batch(key)
+        try:
+            batch.add(event)
+        except ValueError:
+            # The batch is full: send it and start a new one for this key
+            await self._flush(key)
+            batch = await self._open_batch(key)
+            batch.add(event)
+
+    async def _open_batch(self, key):
+        if key not in self._batches:
+            batch = await self.client.create_batch(partition_key=key, max_size_in_bytes=self.max_batch_bytes)
+            self._batches[key] = (batch, time.monotonic())
+        return self._batches[key][0]
+
+    async def _flush(self, key):
+        # The linger task may already have taken this key's batch
+        batch, _ = self._batches.pop(key, (None, None))
+        if batch is None or not len(batch):
+            return
+        size = batch.size_in_bytes
+        # Backpressure: wait until enough of the in-flight sends have completed
+        async with self._in_flight_changed:
+            await self._in_flight_changed.wait_for(
+                lambda: self._in_flight_bytes == 0 or self._in_flight_bytes + size <= self.max_in_flight_bytes)
+            self._in_flight_bytes += size
+        task = asyncio.create_task(self._send(batch, size))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch, size):
+        try:
+            await self.client.send_batch(batch)
+            self.sent_events += len(batch)
+            self.sent_bytes += size
+            self.sent_batches += 1
+        except Exception as e:
+            # Kept instead of raised: the task is discarded once done, so nobody would retrieve its exception
+            if self._error is None:
+                self._error = e
+        finally:
+            async with self._in_flight_changed:
+                self._in_flight_bytes -= size
+                self._in_flight_changed.notify_all()
+
+    async def _flush_lingering(self):
+        # Sends batches that have been open longer than linger_ms, so slow keys don't wait forever
+        while not self._closing:
+            await asyncio.sleep(self.linger / 2)
+            now = time.monotonic()
+            for key in [key for key, (_, created) in self._batches.items() if now - created >= self.linger]:
+                await self._flush(key)
+
+    async def close(self):
+        # Let the linger task finish its current flush instead of cancelling it, which could drop a batch
+        self._closing = True
+        if self._linger_task:
+            await self._linger_task
+        try:
+            for key in list(self._batches):
+                await self._flush(key)
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.client.close()
+        # Raise the first send error, if any
+        self._raise_send_error()
+
+class LocalEventBatch:
+    """
+    Minimal EventDataBatch look-alike used by LocalEventHub.
+    """
+    EVENT_OVERHEAD = 24 # Rough per-event AMQP framing overhead in bytes
+
+    def __init__(self, partition_key, max_size_in_bytes):
+        self.partition_key = partition_key
+        self.max_size_in_bytes = max_size_in_bytes
+        self.size_in_bytes = 0
+        self.events = []
+
+    def add(self, event):
+        size = sum(len(part) for part in event.body) + self.EVENT_OVERHEAD
+        if self.events and self.size_in_bytes + size > self.max_size_in_bytes:
+            raise ValueError("EventDataBatch has reached its size limit")
+        self.events.append(event)
+        self.size_in_bytes += size
+
+    def __len__(self):
+        return len(self.events)
+
+class LocalEventHub:
+    """
+    In-process stand-in for azure.eventhub.aio.EventHubProducerClient.
+
+    Batches are assigned to `partition_count` partitions by hashing the partition key, and every
+    send_batch call waits `send_latency_ms` to mimic the network round trip. Sent events are kept
+    per partition when keep_events is True (e.g. to feed a local consumer).
+    """
+    def __init__(self, partition_count=4, send_latency_ms=5, keep_events=False):
+        self.partition_count = partition_count
+        self.send_latency = send_latency_ms / 1000
+        self.keep_events = keep_events
+        self.partitions = {str(partition): [] for partition in range(partition_count)}
+        self.events_per_partition = {partition: 0 for partition in self.partitions}
+
+    async def create_batch(self, partition_key=None, max_size_in_bytes=None, partition_id=None):
+        return LocalEventBatch(partition_key, max_size_in_bytes or DEFAULT_MAX_BATCH_BYTES)
+
+    async def send_batch(self, batch):
+        await asyncio.sleep(self.send_latency)
+        partition = str(zlib.crc32((batch.partition_key or "").encode("utf-8")) % self.partition_count)
+        self.events_per_partition[partition] += len(batch)
+        if self.keep_events:
+            self.partitions[partition].extend(batch.events)
+
+    async def close(self):
+        pass
+
+async def produce(client, records, encode, count, **producer_options):
+    producer = PartitionedFeedbackProducer(client, encode, **producer_options)
+    started = time.monotonic()
+    for index in range(count):
+        await producer.send(records[index % len(records)])
+    await producer.close()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Sent {producer.sent_events} events in {producer.sent_batches} batches ({producer.sent_bytes} bytes) "
+          f"in {elapsed:.2f}s: {producer.sent_events / elapsed:.0f} events/s, {producer.sent_bytes / elapsed / 1024:.0f} KiB/s")
+    return producer
+
+def main():
+    parser = argparse.ArgumentParser(description="Send iPhone feedback events with the async partitioned producer")
+    parser.add_argument("--count", type=int, default=100000, help="Events to send (CSV rows are repeated)")
+    parser.add_argument("--key", choices=["product_asin", "variant_asin"], default="product_asin")
+    parser.add_argument("--linger-ms", type=float, default=50)
+    parser.add_argument("--max-in-flight-mb", type=float, default=8)
+    parser.add_argument("--local", action="store_true", help="Use the in-process LocalEventHub instead of Event Hubs")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Simulated send latency with --local")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--schema", default="feedback_schema.avsc")
+    parser.add_argument("--registry", default="schema_registry")
+    args = parser.parse_args()
+
+    records = build_records(csv_cache.read_csv(args.csv))
+    encode = SingleObjectEncoder(load_schema(args.schema), SchemaRegistry(args.registry)).encode
+
+    if args.local:
+        client = LocalEventHub(send_latency_ms=args.latency_ms)
+    else:
+        # Imported here so --local runs don't need the async AMQP dependencies
+        from azure.eventhub.aio import EventHubProducerClient
+        client = EventHubProducerClient.from_connection_string(conn_str=CONNECTION_STR, eventhub_name=EVENT_HUB_NAME)
+
+    producer = asyncio.run(produce(client, records, encode, args.count, key_field=args.key, linger_ms=args.linger_ms,
+                                   max_in_flight_bytes=int(args.max_in_flight_mb * 1024 * 1024)))
+    if args.local:
+        print(f"Events per partition: {client.events_per_partition}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: Avro container file per event (to_avro_bytes) vs. single-object encoding (avro_codec).
+
+Reports bytes per event and encode/decode records per second for the records of iphone.csv.
+Run from src/Phase1:  python bench_avro_codec.py [--records 50000]
+"""
+import argparse
+import json
+import tempfile
+import time
+import pandas as pd
+from fastavro import parse_schema
+from avro_codec import SchemaRegistry, SingleObjectEncoder, SingleObjectDecoder
+from generate_feedback import build_records, load_schema, to_avro_bytes
+
+def _timed(function, items):
+    started = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, time.perf_counter() - started
+
+def run(records, schema, registry_dir):
+    registry = SchemaRegistry(registry_dir)
+    parsed_schema = parse_schema(schema)
+    encoder = SingleObjectEncoder(schema, registry)
+    decoder = SingleObjectDecoder(registry)
+
+    codecs = {
+        "container": lambda record: to_avro_bytes(record, parsed_schema),
+        "single-object": encoder.encode,
+    }
+    results = {}
+    for name, encode in codecs.items():
+        payloads, encode_seconds = _timed(encode, records)
+        # Both formats go through the same decoder, which detects the format from the magic bytes
+        decoded, decode_seconds = _timed(decoder.decode, payloads)
+        assert decoded[0] == records[0]
+        results[name] = {
+            "records": len(records),
+            "bytes_per_event": sum(len(payload) for payload in payloads) / len(payloads),
+            "encode_records_per_s": len(records) / encode_seconds,
+            "decode_records_per_s": len(records) / decode_seconds,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000, help="Number of records (CSV rows are repeated)")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--schema", default="feedback_schema.avsc")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    records = build_records(df)
+    records = (records * (args.records // len(records) + 1))[:args.records]
+
+    with tempfile.TemporaryDirectory() as registry_dir:
+        results = run(records, load_schema(args.schema), registry_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'format':<15}{'bytes/event':>12}{'encode rec/s':>15}{'decode rec/s':>15}")
+    for name, result in results.items():
+        print(f"{name:<15}{result['bytes_per_event']:>12.0f}{result['encode_records_per_s']:>15.0f}{result['decode_records_per_s']:>15.0f}")
+
+if __name__ == "__main__":
+    main()
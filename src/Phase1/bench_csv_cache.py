@@ -0,0 +1,92 @@
+"""
+Benchmark: loading iphone.csv (replicated to --rows) with pd.read_csv against the Arrow cache (csv_cache.py).
+
+Every measurement runs in a fresh process and reports the load time, the peak RSS it added and the RSS
+right after the load. Pages of a memory-mapped table only count towards RSS once they are touched, and
+they are file-backed, so the kernel can drop them under memory pressure instead of swapping.
+
+Run from src/Phase1:  python bench_csv_cache.py [--rows 1000000] [--repeat 3] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import pandas as pd
+from csv_cache import CsvCache
+
+def _status_mb(key):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets the VmHWM high-water mark (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return _status_mb("VmRSS")
+
+def _load(mode, csv_path, cache_dir):
+    cache = CsvCache(cache_dir)
+    rss_before = _reset_peak_rss()
+    started = time.perf_counter()
+    if mode == "pd.read_csv":
+        rows = len(pd.read_csv(csv_path))
+    elif mode == "cache_table":
+        rows = cache.load_table(csv_path).num_rows
+    else: # cache_miss and cache_dataframe: the same call, on an empty and on a filled cache
+        rows = len(cache.read_csv(csv_path))
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "rows": rows, "peak_rss_delta_mb": _status_mb("VmHWM") - rss_before,
+            "rss_delta_mb": _status_mb("VmRSS") - rss_before}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pd.read_csv against the memory-mapped Arrow CSV cache")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode (the median is reported)")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="csv-cache-bench-")
+    results = {}
+    try:
+        sample = pd.read_csv(args.csv)
+        csv_path = os.path.join(work_dir, "reviews.csv")
+        pd.concat([sample] * -(-args.rows // len(sample)), ignore_index=True).iloc[:args.rows].to_csv(csv_path, index=False)
+        cache_dir = os.path.join(work_dir, "cache")
+
+        # max_tasks_per_child=1: every measurement gets a fresh interpreter (and a clean peak RSS)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1) as pool:
+            for mode in ("pd.read_csv", "cache_miss", "cache_dataframe", "cache_table"):
+                runs = []
+                for _ in range(args.repeat):
+                    if mode == "cache_miss":
+                        shutil.rmtree(cache_dir, ignore_errors=True)
+                    runs.append(pool.submit(_load, mode, csv_path, cache_dir).result())
+                results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        results["cache_file_mb"] = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)) / 1024 / 1024
+        results["csv_file_mb"] = os.path.getsize(csv_path) / 1024 / 1024
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.rows} rows, CSV {results['csv_file_mb']:.1f} MB, cache entry {results['cache_file_mb']:.1f} MB")
+    print(f"{'mode':<18}{'seconds':>10}{'peak RSS +MB':>14}{'RSS +MB':>10}")
+    for mode in ("pd.read_csv", "cache_miss", "cache_dataframe", "cache_table"):
+        result = results[mode]
+        print(f"{mode:<18}{result['seconds']:>10.3f}{result['peak_rss_delta_mb']:>14.1f}{result['rss_delta_mb']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
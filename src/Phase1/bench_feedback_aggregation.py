@@ -0,0 +1,108 @@
+"""
+Benchmark: the Beam feedback rollup (feedback_aggregation.py) on the DirectRunner with 1..N worker
+processes, against the single-threaded pandas rollup it replaces.
+
+The rows of iphone.csv are replicated into --files CSV files and --files IphoneFeedback Avro files
+of --rows rows each. Every run's output is checked against the pandas result. Reports records/s and
+the speed-up over one Beam worker. The DirectRunner can't scale past the machine's cores.
+
+Run from src/Phase1:  python bench_feedback_aggregation.py [--rows 200000] [--files 4] [--workers 1,2,4,8] [--json]
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+import pyarrow.dataset as ds
+from fastavro import parse_schema, reader, writer
+from feedback_aggregation import RATINGS, review_month, run
+from generate_feedback import build_records, load_schema
+
+KEY_COLUMNS = ["product_asin", "variant_asin", "country", "month"]
+
+def make_inputs(directory, rows, files):
+    """
+    Writes `files` CSV and `files` Avro files of `rows` rows each and returns the number of records.
+    """
+    sample = pd.read_csv("iphone.csv", encoding="utf-8-sig")
+    data = pd.concat([sample] * -(-rows // len(sample)), ignore_index=True).iloc[:rows]
+    schema = parse_schema(load_schema())
+    records = build_records(data)
+    for index in range(files):
+        data.to_csv(os.path.join(directory, f"reviews-{index}.csv"), index=False)
+        with open(os.path.join(directory, f"reviews-{index}.avro"), "wb") as f:
+            writer(f, schema, records, codec="deflate")
+    return 2 * rows * files
+
+def rollup_with_pandas(directory):
+    frames = [pd.read_csv(path, encoding="utf-8-sig", usecols=["productAsin", "variantAsin", "country", "ratingScore", "isVerified", "date"])
+              .rename(columns={"productAsin": "product_asin", "variantAsin": "variant_asin", "ratingScore": "rating_score",
+                               "isVerified": "is_verified", "date": "review_date"})
+              for path in sorted(glob.glob(os.path.join(directory, "*.csv")))]
+    for path in sorted(glob.glob(os.path.join(directory, "*.avro"))):
+        with open(path, "rb") as f:
+            frames.append(pd.DataFrame.from_records(reader(f)))
+    data = pd.concat(frames, ignore_index=True)
+    data["is_verified"] = data["is_verified"].astype(str).str.lower() == "true"
+    data["month"] = data["review_date"].map(review_month)
+    data = data[data["rating_score"].isin(RATINGS) & data["month"].notna()]
+    for rating in RATINGS:
+        data[f"rating_{rating}"] = data["rating_score"] == rating
+    grouped = data.groupby(KEY_COLUMNS)
+    result = grouped[[f"rating_{rating}" for rating in RATINGS]].sum()
+    result["review_count"] = grouped.size()
+    result["verified_count"] = grouped["is_verified"].sum()
+    return result.reset_index()
+
+def _normalized(frame):
+    columns = KEY_COLUMNS + ["review_count", "verified_count"] + [f"rating_{rating}" for rating in RATINGS]
+    return frame[columns].astype({column: "int64" for column in columns[len(KEY_COLUMNS):]}).sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Beam feedback rollup against pandas")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows per input file")
+    parser.add_argument("--files", type=int, default=4, help="Input files per format")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma separated DirectRunner worker counts")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="feedback-rollup-bench-")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        os.makedirs(input_dir)
+        records = make_inputs(input_dir, args.rows, args.files)
+
+        started = time.perf_counter()
+        expected = _normalized(rollup_with_pandas(input_dir))
+        results = {"pandas": {"seconds": time.perf_counter() - started}}
+
+        inputs = [os.path.join(input_dir, "*.csv"), os.path.join(input_dir, "*.avro")]
+        for workers in map(int, args.workers.split(",")):
+            output_dir = os.path.join(work_dir, f"output-{workers}")
+            started = time.perf_counter()
+            # multi_processing for every count, so one worker pays the same process overhead as many
+            run(inputs, os.path.join(output_dir, "part"), workers, running_mode="multi_processing")
+            seconds = time.perf_counter() - started
+            actual = _normalized(ds.dataset(output_dir, format="parquet").to_table().to_pandas())
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+            results[f"beam_{workers}"] = {"seconds": seconds}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    beam_baseline = next((result["seconds"] for name, result in results.items() if name != "pandas"), None)
+    for result in results.values():
+        result["records_per_s"] = records / result["seconds"]
+        result["speedup_vs_1_worker"] = beam_baseline / result["seconds"] if beam_baseline else None
+    if args.json:
+        print(json.dumps({"records": records, "cpu_count": os.cpu_count(), "results": results}, indent=2))
+        return
+    print(f"{records} records, {len(expected)} groups, {os.cpu_count()} CPUs")
+    print(f"{'run':<12}{'seconds':>10}{'records/s':>14}{'speed-up':>10}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['seconds']:>10.2f}{result['records_per_s']:>14.0f}{result['speedup_vs_1_worker']:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
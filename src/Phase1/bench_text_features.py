@@ -0,0 +1,80 @@
+"""
+Benchmark: batch text feature extraction (text_features.py) against scoring one review at a time in Python.
+
+Both produce the same features (checked on every run) for the reviews of iphone.csv, replicated to --records.
+Reports records/s per batch size, and the cost of the features in build_records.
+Run from src/Phase1:  python bench_text_features.py [--records 300000] [--batch-sizes 1000,10000,100000] [--json]
+"""
+import argparse
+import json
+import re
+import time
+import pandas as pd
+from generate_feedback import build_records
+from text_features import COMPLAINT_TOPICS, NEGATIONS, NEGATIVE_WORDS, POSITIVE_WORDS, TextFeatureExtractor
+
+TOKEN_PATTERN = re.compile(rb"[A-Za-z0-9'\x80-\xff]+")
+
+def score_row(title, description):
+    # The per-review Python equivalent of TextFeatureExtractor.extract
+    tokens = [token.lower().decode("utf-8", "replace") for token in TOKEN_PATTERN.findall(f"{title} {description}".encode())]
+    positive = negative = 0
+    for index, token in enumerate(tokens):
+        polarity = 1 if token in POSITIVE_WORDS else -1 if token in NEGATIVE_WORDS else 0
+        if index and tokens[index - 1] in NEGATIONS:
+            polarity = -polarity
+        positive += polarity > 0
+        negative += polarity < 0
+    topics = [name for name, words in COMPLAINT_TOPICS.items() if any(token in words for token in tokens)]
+    return {"review_length": len(description), "word_count": len(tokens),
+            "sentiment_score": (positive - negative) / (positive + negative) if positive + negative else 0.0,
+            "complaint_topics": ",".join(topics) or None}
+
+def _timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch text feature extraction against per-row scoring")
+    parser.add_argument("--records", type=int, default=300000)
+    parser.add_argument("--batch-sizes", default="1000,10000,100000")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    sample = pd.read_csv(args.csv)
+    df = pd.concat([sample] * -(-args.records // len(sample)), ignore_index=True).iloc[:args.records]
+    titles, descriptions = df["reviewTitle"].map(str).tolist(), df["reviewDescription"].map(str).tolist()
+    results = {}
+
+    rows, seconds = _timed(lambda: [score_row(title, description) for title, description in zip(titles, descriptions)])
+    results["per_row"] = {"records_per_s": len(df) / seconds}
+
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        extractor = TextFeatureExtractor()
+        batches, seconds = _timed(lambda: [extractor.extract(titles[start:start + batch_size], descriptions[start:start + batch_size])
+                                           for start in range(0, len(df), batch_size)])
+        results[f"batch_{batch_size}"] = {"records_per_s": len(df) / seconds}
+        for name in rows[0]:
+            values = [value for batch in batches for value in batch[name].to_pylist()]
+            expected = [row[name] for row in rows]
+            if name == "sentiment_score":
+                # float32 in the batch result
+                assert all(abs(value - reference) < 1e-6 for value, reference in zip(values, expected)), name
+            else:
+                assert values == expected, name
+
+    for with_features in (False, True):
+        _, seconds = _timed(lambda: build_records(df, with_features=with_features))
+        results[f"build_records{'_with_features' if with_features else ''}"] = {"records_per_s": len(df) / seconds}
+
+    if args.json:
+        print(json.dumps({"records": len(df), "results": results}, indent=2))
+        return
+    print(f"{len(df)} records")
+    for name, result in results.items():
+        print(f"{name:<30}{result['records_per_s']:>12.0f} records/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Cache of parsed source CSVs as memory-mapped Arrow IPC files.
+
+The first read_csv() of a file parses it with pandas as before and stores the result as an
+uncompressed Arrow IPC (Feather v2) file in CSV_CACHE_DIR. Later calls memory-map that file instead
+of parsing: load_table() returns the Arrow table without copying, read_csv() converts it to the same
+DataFrame pd.read_csv would have returned.
+
+Entries are keyed on the CSV's absolute path, size and mtime (or, with verify="hash", its content
+hash) plus the read_csv keyword arguments, so an edited CSV is re-parsed automatically; the entries of
+its older versions are deleted then. When the cache grows past CSV_CACHE_MAX_BYTES, the least recently
+used entries are evicted.
+
+    df = csv_cache.read_csv("iphone.csv")          # instead of pd.read_csv("iphone.csv")
+
+CSV_CACHE_ENABLED=false makes read_csv() a plain pd.read_csv().
+"""
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+CSV_CACHE_ENABLED = os.environ.get("CSV_CACHE_ENABLED", "true").lower() == "true"
+CSV_CACHE_DIR = os.environ.get("CSV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "csv_cache"))
+CSV_CACHE_MAX_BYTES = int(os.environ.get("CSV_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+def _source_id(path):
+    # One id per source file, so the entries of its older versions can be found and dropped
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+
+def _cache_key(path, verify, read_options):
+    stat = os.stat(path)
+    if verify == "hash":
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                digest.update(chunk)
+        version = digest.hexdigest()
+    elif verify == "stat":
+        version = f"{stat.st_size}:{stat.st_mtime_ns}"
+    else:
+        raise ValueError(f"verify must be 'stat' or 'hash', got {verify!r}")
+    options = json.dumps(read_options, sort_keys=True, default=repr)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{version}|{options}".encode("utf-8")).hexdigest()[:16]
+
+class CsvCache:
+    """
+    Arrow IPC cache of parsed CSVs in `directory`, bounded to max_bytes.
+    """
+    def __init__(self, directory=CSV_CACHE_DIR, max_bytes=CSV_CACHE_MAX_BYTES, verify="stat"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, path, read_options):
+        return os.path.join(self.directory, f"{_source_id(path)}-{_cache_key(path, self.verify, read_options)}.arrow")
+
+    def load_table(self, path, **read_options):
+        """
+        Returns the CSV as a pyarrow Table backed by the memory-mapped cache file, parsing and caching it first
+        if there is no entry for the current version of the file. read_options are passed to pd.read_csv.
+        """
+        entry_path = self._entry_path(path, read_options)
+        try:
+            table = pa.ipc.open_file(pa.memory_map(entry_path, "r")).read_all()
+        except FileNotFoundError:
+            self.misses += 1
+            self._store(path, entry_path, pd.read_csv(path, **read_options))
+            return pa.ipc.open_file(pa.memory_map(entry_path, "r")).read_all()
+        self.hits += 1
+        # The entry's mtime is its last use, which is what eviction goes by
+        os.utime(entry_path)
+        return table
+
+    def read_csv(self, path, **read_options):
+        """
+        Same result as pd.read_csv(path, **read_options), read from the cache when possible.
+        """
+        df = self.load_table(path, **read_options).to_pandas()
+        # Arrow nulls come back as None in object columns (pandas < 3), where pd.read_csv has NaN; str() of
+        # the two differs ("None" vs "nan"), so they are put back
+        for column in df.columns[df.dtypes == object]:
+            missing = df[column].isna()
+            if missing.any():
+                df[column] = df[column].where(~missing, np.nan)
+        return df
+
+    def _store(self, path, entry_path, df):
+        os.makedirs(self.directory, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=not isinstance(df.index, pd.RangeIndex))
+        # Written next to the entry and renamed, so a concurrent reader never maps a half written file.
+        # Uncompressed, because compressed buffers would have to be decompressed (copied) on every load.
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, entry_path)
+        # Entries written before the CSV last changed belong to its older versions and can't be hit anymore
+        for stale_path in glob.glob(os.path.join(self.directory, f"{_source_id(path)}-*.arrow")):
+            if stale_path != entry_path and os.path.getmtime(stale_path) < os.path.getmtime(path):
+                self._remove(stale_path)
+        self.evict(keep=entry_path)
+
+    def _remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass # Removed by another process in the meantime
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes. Tables that are still
+        mapped stay valid: the file is only unlinked and disappears once the last map is closed.
+        """
+        entries = []
+        for entry_path in glob.glob(os.path.join(self.directory, "*.arrow")):
+            try:
+                stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_path != keep:
+                self._remove(entry_path)
+                total -= size
+        return total
+
+    def clear(self):
+        for entry_path in glob.glob(os.path.join(self.directory, "*.arrow")):
+            self._remove(entry_path)
+
+_default_cache = CsvCache()
+
+def load_table(path, **read_options):
+    return _default_cache.load_table(path, **read_options)
+
+def read_csv(path, **read_options):
+    """
+    Drop-in for pd.read_csv(path, ...) backed by the default cache (CSV_CACHE_DIR).
+    """
+    if not CSV_CACHE_ENABLED:
+        return pd.read_csv(path, **read_options)
+    return _default_cache.read_csv(path, **read_options)
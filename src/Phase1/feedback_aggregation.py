@@ -0,0 +1,184 @@
+"""
+Batch rollup of the iPhone review history with Apache Beam.
+
+Reads review exports as CSV (the iphone.csv layout) and IphoneFeedback Avro files (feedback_schema.avsc)
+and writes, per product_asin / variant_asin / country / month:
+
+    review_count, verified_count, verified_ratio, mean_rating and the rating distribution (rating_1..rating_5)
+
+as Parquet. The rollup is a combiner (RatingStatsFn), so every worker pre-aggregates its share of the
+records and only one small accumulator per key and worker is shuffled. The counts are additive:
+coarser rollups (per ASIN, per country, per year) are sums over the rows of this one.
+
+Avro files are split at block boundaries and read in parallel. CSV files are parsed one file per
+worker, because quoted review texts span lines and a CSV file cannot be split safely at arbitrary
+byte offsets; large exports should be split into several files.
+
+Runs on the DirectRunner by default, with --workers N worker processes:
+
+    python feedback_aggregation.py iphone.csv "archive/*.avro" --output rollup/feedback --workers 4
+
+Any other option is passed to Beam (e.g. --runner DataflowRunner --project ...).
+"""
+import argparse
+import csv
+import io
+import apache_beam as beam
+import pyarrow as pa
+from apache_beam.io import fileio
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions
+
+RATINGS = range(1, 6)
+
+OUTPUT_SCHEMA = pa.schema(
+    [pa.field(name, pa.string()) for name in ("product_asin", "variant_asin", "country", "month")]
+    + [pa.field("review_count", pa.int64()), pa.field("verified_count", pa.int64()),
+       pa.field("verified_ratio", pa.float64()), pa.field("mean_rating", pa.float64())]
+    + [pa.field(f"rating_{rating}", pa.int64()) for rating in RATINGS]
+)
+
+# iphone.csv column -> IphoneFeedback field (the same mapping generate_feedback.build_records uses)
+CSV_COLUMNS = {
+    "productAsin": "product_asin",
+    "variantAsin": "variant_asin",
+    "country": "country",
+    "ratingScore": "rating_score",
+    "isVerified": "is_verified",
+    "date": "review_date",
+}
+
+invalid_records = Metrics.counter("feedback_aggregation", "invalid_records")
+
+def review_month(review_date):
+    """
+    "yyyy-mm" of a review date: dd-mm-yyyy as in iphone.csv, or ISO yyyy-mm-dd[...]. None if it can't be parsed.
+    """
+    parts = str(review_date)[:10].split("-")
+    if len(parts) != 3:
+        return None
+    year, month = (parts[0], parts[1]) if len(parts[0]) == 4 else (parts[2], parts[1])
+    try:
+        year, month = int(year), int(month)
+    except ValueError:
+        return None
+    return f"{year:04d}-{month:02d}" if 1 <= month <= 12 else None
+
+def parse_csv_file(readable_file):
+    """
+    Yields the rows of a CSV review export as IphoneFeedback-like dicts (only the aggregated fields).
+    """
+    # utf-8-sig: iphone.csv starts with a byte order mark
+    with readable_file.open() as raw:
+        for row in csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")):
+            record = {field: row.get(column, "") for column, field in CSV_COLUMNS.items()}
+            record["is_verified"] = str(record["is_verified"]).lower() == "true"
+            yield record
+
+def key_by_group(record):
+    """
+    Maps a record to ((product_asin, variant_asin, country, month), (rating, is_verified)).
+    Records without a valid 1-5 rating or date are counted in the invalid_records metric and dropped.
+    """
+    try:
+        rating = int(float(record["rating_score"]))
+    except (TypeError, ValueError):
+        rating = None
+    month = review_month(record["review_date"])
+    if rating not in RATINGS or month is None:
+        invalid_records.inc()
+        return
+    yield (record["product_asin"], record["variant_asin"], record["country"], month), (rating, bool(record["is_verified"]))
+
+class RatingStatsFn(beam.CombineFn):
+    """
+    Combines (rating, is_verified) pairs into [review_count, verified_count, rating_1, ..., rating_5].
+    """
+    def create_accumulator(self):
+        return [0] * (2 + len(RATINGS))
+
+    def add_input(self, accumulator, value):
+        rating, verified = value
+        accumulator[0] += 1
+        accumulator[1] += verified
+        accumulator[1 + rating] += 1
+        return accumulator
+
+    def merge_accumulators(self, accumulators):
+        accumulators = iter(accumulators)
+        merged = next(accumulators)
+        for accumulator in accumulators:
+            for index, value in enumerate(accumulator):
+                merged[index] += value
+        return merged
+
+    def extract_output(self, accumulator):
+        return accumulator
+
+def to_row(key, stats):
+    product_asin, variant_asin, country, month = key
+    review_count, verified_count, *distribution = stats
+    row = {"product_asin": product_asin, "variant_asin": variant_asin, "country": country, "month": month,
+           "review_count": review_count, "verified_count": verified_count,
+           "verified_ratio": verified_count / review_count,
+           "mean_rating": sum(rating * count for rating, count in zip(RATINGS, distribution)) / review_count}
+    row.update({f"rating_{rating}": count for rating, count in zip(RATINGS, distribution)})
+    return row
+
+def build_pipeline(pipeline, inputs, output, num_shards=0):
+    """
+    Adds the read, rollup and Parquet write steps for the input file patterns (*.csv or *.avro) to the pipeline.
+    """
+    csv_patterns = [pattern for pattern in inputs if pattern.lower().endswith(".csv")]
+    avro_patterns = [pattern for pattern in inputs if pattern.lower().endswith(".avro")]
+    unknown = sorted(set(inputs) - set(csv_patterns) - set(avro_patterns))
+    if unknown:
+        raise ValueError(f"Input patterns must end in .csv or .avro: {unknown}")
+
+    sources = []
+    if csv_patterns:
+        sources.append(pipeline
+                       | "CsvPatterns" >> beam.Create(csv_patterns)
+                       | "MatchCsv" >> fileio.MatchAll()
+                       | "OpenCsv" >> fileio.ReadMatches()
+                       | "SpreadCsvFiles" >> beam.Reshuffle() # One file per worker instead of all files on one
+                       | "ParseCsv" >> beam.FlatMap(parse_csv_file))
+    if avro_patterns:
+        sources.append(pipeline
+                       | "AvroPatterns" >> beam.Create(avro_patterns)
+                       | "ReadAvro" >> beam.io.ReadAllFromAvro())
+
+    return (sources
+            | "Merge" >> beam.Flatten()
+            | "KeyByGroup" >> beam.FlatMap(key_by_group)
+            | "RatingStats" >> beam.CombinePerKey(RatingStatsFn())
+            | "ToRow" >> beam.MapTuple(to_row)
+            | "WriteParquet" >> beam.io.WriteToParquet(output, OUTPUT_SCHEMA, file_name_suffix=".parquet", num_shards=num_shards))
+
+def run(inputs, output, workers=1, running_mode=None, num_shards=0, pipeline_args=None):
+    """
+    Runs the rollup and waits for it. On the DirectRunner, `workers` > 1 runs that many worker processes
+    (running_mode defaults to "multi_processing" then, "in_memory" otherwise). Returns the PipelineResult.
+    """
+    options = PipelineOptions(pipeline_args or [], direct_num_workers=workers,
+                              direct_running_mode=running_mode or ("multi_processing" if workers > 1 else "in_memory"))
+    pipeline = beam.Pipeline(options=options)
+    build_pipeline(pipeline, inputs, output, num_shards)
+    result = pipeline.run()
+    result.wait_until_finish()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll up review ratings per ASIN, variant, country and month with Apache Beam")
+    parser.add_argument("inputs", nargs="+", help="CSV (*.csv) and IphoneFeedback Avro (*.avro) file patterns")
+    parser.add_argument("--output", default="feedback_rollup/part", help="Output path prefix of the Parquet shards")
+    parser.add_argument("--workers", type=int, default=1, help="DirectRunner worker processes")
+    parser.add_argument("--shards", type=int, default=0, help="Number of Parquet files (0: chosen by the runner)")
+    args, pipeline_args = parser.parse_known_args(argv)
+
+    result = run(args.inputs, args.output, args.workers, num_shards=args.shards, pipeline_args=pipeline_args)
+    invalid = result.metrics().query(beam.metrics.MetricsFilter().with_name("invalid_records"))["counters"]
+    print(f"Wrote {args.output}*.parquet, {sum(counter.committed or 0 for counter in invalid)} invalid records dropped")
+
+if __name__ == "__main__":
+    main()
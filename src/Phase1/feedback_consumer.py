@@ -0,0 +1,243 @@
+"""
+Micro-batching FeedbackHub consumer that lands the IphoneFeedback events as partitioned Parquet.
+
+Events are received in batches per Event Hub partition, decoded into Arrow record batches and
+buffered. A partition's buffer is written out when it reaches `row_group_size` rows or is older
+than `flush_interval` seconds, as Parquet files partitioned by country and review_date
+(hive style: country=India/review_date=11-08-2024/part-....parquet). The partition is checkpointed
+only after its files have been fsync'ed and moved into place, so a crash never skips events.
+
+Run against Event Hubs:   python feedback_consumer.py --output feedback_parquet
+Offline (LocalEventHub):  python feedback_consumer.py --local --count 100000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.dataset as ds
+from avro_codec import SchemaRegistry, SingleObjectDecoder
+from generate_feedback import CONNECTION_STR, EVENT_HUB_NAME, load_schema
+
+PARTITION_COLUMNS = ["country", "review_date"]
+CHECKPOINT_CONTAINER_NAME = os.environ.get("CHECKPOINT_CONTAINER_NAME", "feedback-checkpoints")
+
+# Avro primitive type -> Arrow type
+AVRO_TO_ARROW = {
+    "string": pa.string(),
+    "int": pa.int32(),
+    "long": pa.int64(),
+    "float": pa.float32(),
+    "double": pa.float64(),
+    "boolean": pa.bool_(),
+    "bytes": pa.binary(),
+}
+
+def arrow_schema_from_avro(schema):
+    """
+    Converts a flat Avro record schema (primitive fields, optionally ["null", type] unions)
+    to the equivalent Arrow schema.
+    """
+    fields = []
+    for field in schema["fields"]:
+        avro_type = field["type"]
+        nullable = False
+        if isinstance(avro_type, list):
+            nullable = "null" in avro_type
+            avro_type = next(t for t in avro_type if t != "null")
+        fields.append(pa.field(field["name"], AVRO_TO_ARROW[avro_type], nullable=nullable))
+    return pa.schema(fields)
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class ParquetSink:
+    """
+    Writes Arrow tables as hive-partitioned Parquet files under `root`.
+
+    Files are first written to a staging directory, fsync'ed and then moved into place with
+    os.replace, so a file in `root` is always complete and on disk once write() returns.
+    """
+    def __init__(self, root, row_group_size=100000):
+        self.root = root
+        self.row_group_size = row_group_size
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, table, name_prefix):
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        written = []
+        try:
+            ds.write_dataset(
+                table, staging, format="parquet",
+                partitioning=PARTITION_COLUMNS, partitioning_flavor="hive",
+                basename_template=f"{name_prefix}-{uuid.uuid4().hex}-{{i}}.parquet",
+                max_rows_per_group=self.row_group_size, min_rows_per_group=min(self.row_group_size, len(table)),
+                file_visitor=lambda written_file: written.append(written_file.path),
+            )
+            for staged_path in written:
+                _fsync_path(staged_path)
+                target_path = os.path.join(self.root, os.path.relpath(staged_path, staging))
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                os.replace(staged_path, target_path)
+                # Persist the directory entry of the moved file as well
+                _fsync_path(os.path.dirname(target_path))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return len(written)
+
+class FeedbackConsumer:
+    """
+    on_event_batch callback for EventHubConsumerClient.receive_batch.
+
+    The client calls it from one thread per Event Hub partition, so every partition gets its own
+    buffer and is flushed and checkpointed independently.
+    """
+    def __init__(self, sink, decoder, arrow_schema, row_group_size=100000, flush_interval=60):
+        self.sink = sink
+        self.decoder = decoder
+        self.arrow_schema = arrow_schema
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffers = {} # partition id -> {"batches": [...], "rows": int, "since": float, "last_event": EventData}
+        self.rows_written = 0
+        self.files_written = 0
+        self.decode_errors = 0
+
+    def on_event_batch(self, partition_context, events):
+        partition_id = partition_context.partition_id
+        with self._lock:
+            buffer = self._buffers.setdefault(partition_id, {"batches": [], "rows": 0, "since": time.monotonic(), "last_event": None})
+
+        if events:
+            records, errors = self.decoder.decode_batch([b"".join(event.body) for event in events])
+            # A malformed event must not block the partition; it is skipped (and counted)
+            for index, error in errors:
+                print(f"Skipping undecodable event at offset {events[index].offset} in partition {partition_id}: {error}")
+            if errors:
+                with self._lock:
+                    self.decode_errors += len(errors)
+            if records:
+                buffer["batches"].append(pa.RecordBatch.from_pylist(records, schema=self.arrow_schema))
+                buffer["rows"] += len(records)
+            buffer["last_event"] = events[-1]
+
+        # receive_batch calls us with an empty list after max_wait_time, which drives the time-based flush
+        if buffer["rows"] >= self.row_group_size or time.monotonic() - buffer["since"] >= self.flush_interval:
+            self.flush(partition_context)
+
+    def flush(self, partition_context):
+        buffer = self._buffers.get(partition_context.partition_id)
+        if not buffer or buffer["last_event"] is None:
+            return
+        if buffer["rows"]:
+            table = pa.Table.from_batches(buffer["batches"], schema=self.arrow_schema)
+            files = self.sink.write(table, f"p{partition_context.partition_id}")
+            with self._lock:
+                self.rows_written += buffer["rows"]
+                self.files_written += files
+        # The files are durable now, so it is safe to move the checkpoint past these events
+        partition_context.update_checkpoint(buffer["last_event"])
+        buffer.update(batches=[], rows=0, since=time.monotonic(), last_event=None)
+
+    def flush_all(self, partition_contexts):
+        for partition_context in partition_contexts:
+            self.flush(partition_context)
+
+class LocalPartitionContext:
+    """
+    Stand-in for azure.eventhub.PartitionContext when replaying a LocalEventHub.
+    """
+    def __init__(self, partition_id):
+        self.partition_id = partition_id
+        self.checkpoint = None
+
+    def update_checkpoint(self, event):
+        self.checkpoint = event
+
+def consume_eventhub(consumer, max_batch_size, max_wait_time, consumer_group="$Default", starting_position="-1",
+                     checkpoint_container=CHECKPOINT_CONTAINER_NAME):
+    """
+    Receives batches from FeedbackHub into consumer.on_event_batch until interrupted.
+
+    Every application reading the hub needs its own consumer_group and checkpoint_container: clients of one
+    group share out the partitions between them, and a checkpoint stored in the container takes precedence
+    over starting_position. checkpoint_container=None keeps the checkpoints in memory only.
+    """
+    from azure.eventhub import EventHubConsumerClient
+    checkpoint_store = None
+    if checkpoint_container is not None:
+        try:
+            # Durable checkpoints need the optional azure-eventhub-checkpointstoreblob package
+            from azure.eventhub.extensions.checkpointstoreblob import BlobCheckpointStore
+            checkpoint_store = BlobCheckpointStore.from_connection_string(os.environ["AzureWebJobsStorage"], checkpoint_container)
+        except (ImportError, KeyError):
+            print("No blob checkpoint store configured, checkpoints are kept in memory only.")
+
+    client = EventHubConsumerClient.from_connection_string(
+        conn_str=CONNECTION_STR, consumer_group=consumer_group, eventhub_name=EVENT_HUB_NAME,
+        checkpoint_store=checkpoint_store)
+    with client:
+        client.receive_batch(on_event_batch=consumer.on_event_batch, max_batch_size=max_batch_size,
+                             max_wait_time=max_wait_time, starting_position=starting_position)
+
+def consume_local(consumer, count, max_batch_size, csv_path, schema, registry):
+    # Produce `count` events into an in-process hub, then replay them through the consumer
+    import csv_cache
+    from async_producer import LocalEventHub, produce
+    from avro_codec import SingleObjectEncoder
+    from generate_feedback import build_records
+
+    hub = LocalEventHub(send_latency_ms=0, keep_events=True)
+    encode = SingleObjectEncoder(schema, registry).encode
+    asyncio.run(produce(hub, build_records(csv_cache.read_csv(csv_path)), encode, count))
+
+    started = time.monotonic()
+    contexts = []
+    for partition_id, events in hub.partitions.items():
+        context = LocalPartitionContext(partition_id)
+        contexts.append(context)
+        for start in range(0, len(events), max_batch_size):
+            consumer.on_event_batch(context, events[start:start + max_batch_size])
+    consumer.flush_all(contexts)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Consumed {consumer.rows_written} rows into {consumer.files_written} Parquet files in {elapsed:.2f}s: "
+          f"{consumer.rows_written / elapsed:.0f} rows/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Land FeedbackHub events as partitioned Parquet")
+    parser.add_argument("--output", default="feedback_parquet", help="Root directory of the Parquet dataset")
+    parser.add_argument("--row-group-size", type=int, default=100000, help="Rows per Parquet row group (and flush threshold)")
+    parser.add_argument("--flush-interval", type=float, default=60, help="Seconds before a partition's buffer is flushed")
+    parser.add_argument("--max-batch-size", type=int, default=1000, help="Events per receive batch")
+    parser.add_argument("--local", action="store_true", help="Consume events from the in-process LocalEventHub")
+    parser.add_argument("--count", type=int, default=100000, help="Events to produce with --local")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--schema", default="feedback_schema.avsc")
+    parser.add_argument("--registry", default="schema_registry")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    registry = SchemaRegistry(args.registry)
+    consumer = FeedbackConsumer(
+        ParquetSink(args.output, args.row_group_size),
+        SingleObjectDecoder(registry, reader_schema=schema),
+        arrow_schema_from_avro(schema),
+        row_group_size=args.row_group_size,
+        flush_interval=args.flush_interval,
+    )
+    if args.local:
+        consume_local(consumer, args.count, args.max_batch_size, args.csv, schema, registry)
+    else:
+        consume_eventhub(consumer, args.max_batch_size, max_wait_time=min(args.flush_interval, 5))
+
+if __name__ == "__main__":
+    main()
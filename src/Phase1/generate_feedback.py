@@ -1,52 +1,171 @@
 import pandas as pd
+import argparse
 import json
+import os
 import time
 import uuid
 from datetime import datetime
 from azure.eventhub import EventHubProducerClient, EventData
 from fastavro import writer, parse_schema
 from io import BytesIO
-
-# Load Avro schema
-import json
-with open("feedback_schema.avsc", "r") as f:
-    schema = parse_schema(json.load(f))
-
-# Load data
-df = pd.read_csv("iphone.csv")
+import csv_cache
+from avro_codec import SchemaRegistry, SingleObjectEncoder
+from text_features import TextFeatureExtractor
 
 # Initialize Event Hub
-CONNECTION_STR = "add connection string"
+CONNECTION_STR = os.environ.get("EVENTHUB_CONNECTION_STR", "add connection string")
 EVENT_HUB_NAME = "FeedbackHub"
-producer = EventHubProducerClient.from_connection_string(conn_str=CONNECTION_STR, eventhub_name=EVENT_HUB_NAME)
 
-# Function to convert dict to Avro bytes
+# Shared by every build_records call, so its vocabulary cache survives across batches
+_text_features = TextFeatureExtractor()
+
+# Load Avro schema (as a dict, parse_schema() it before use with fastavro's writer)
+def load_schema(path="feedback_schema.avsc"):
+    with open(path, "r") as f:
+        return json.load(f)
+
+# Function to convert dict to Avro bytes (a full Avro container file per record)
 def to_avro_bytes(record, schema):
     buffer = BytesIO()
     writer(buffer, schema, [record])
     return buffer.getvalue()
 
-# Send messages
-for _, row in df.iterrows():
-    feedback = {
-        "review_id": str(uuid.uuid4()),
-        "product_asin": str(row.get("productAsin", "")),
-        "variant_asin": str(row.get("variantAsin", "")),
-        "country": str(row.get("country", "")),
-        "review_title": str(row.get("reviewTitle", "")),
-        "review_description": str(row.get("reviewDescription", "")),
-        "rating_score": int(row.get("ratingScore", 0)),
-        "is_verified": str(row.get("isVerified", "")).lower() == "true",
-        "review_date": str(row.get("date", "")),
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-
-    avro_data = to_avro_bytes(feedback, schema)
-    event_data = EventData(body=avro_data)
-
-    with producer:
-        producer.send_batch([event_data])
-    
-    print(f"Sent review_id: {feedback['review_id']}")
-    time.sleep(1)  # Simulate real-time feed (1 message per second)
+def _column(df, name, default):
+    # Same as row.get(name, default) but for a whole column at once.
+    # Text columns are converted with .map(str) so missing values become "nan" exactly like str(row.get(...))
+    return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+def build_records(df, with_features=True):
+    """
+    Builds the feedback records for every row of the DataFrame.
+    The conversions are done per column instead of per row (no iterrows), which is what makes
+    the throughput mode fast enough to produce tens of thousands of events per second.
+    With with_features, the text features of text_features.py are added to every record.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    records = pd.DataFrame({
+        "review_id": [str(uuid.uuid4()) for _ in range(len(df))],
+        "product_asin": _column(df, "productAsin", "").map(str),
+        "variant_asin": _column(df, "variantAsin", "").map(str),
+        "country": _column(df, "country", "").map(str),
+        "review_title": _column(df, "reviewTitle", "").map(str),
+        "review_description": _column(df, "reviewDescription", "").map(str),
+        "rating_score": _column(df, "ratingScore", 0).fillna(0).astype(int),
+        "is_verified": _column(df, "isVerified", "").map(str).str.lower() == "true",
+        "review_date": _column(df, "date", "").map(str),
+        "timestamp": timestamp,
+    })
+    if with_features:
+        features = _text_features.extract(records["review_title"], records["review_description"])
+        for name, values in features.items():
+            # An object column keeps missing topics as None (Avro null); a string column would make them NaN
+            records[name] = pd.Series(values.to_pylist(), index=records.index, dtype=object) if name == "complaint_topics" else values.to_numpy()
+    return records.to_dict("records")
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` events per second on average with bursts of up to `burst` events.
+    A rate of 0 disables throttling.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self, count=1):
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Requests larger than the bucket are let through once it is full
+            if self.tokens >= min(count, self.capacity):
+                self.tokens -= count
+                return
+            time.sleep((min(count, self.capacity) - self.tokens) / self.rate)
+
+# Simulate a real-time feed: one event per second, like the original script
+def run_realtime(producer, df, encode):
+    with producer: # Open the producer once, leaving the block closes it
+        for feedback in build_records(df):
+            feedback["timestamp"] = datetime.utcnow().isoformat()
+            avro_data = encode(feedback)
+            producer.send_batch([EventData(body=avro_data)])
+
+            print(f"Sent review_id: {feedback['review_id']}")
+            time.sleep(1)  # Simulate real-time feed (1 message per second)
+
+# Load-test mode: send `count` events as fast as `rate` allows, packing full EventDataBatch objects
+def run_throughput(producer, df, encode, rate=0, count=None):
+    if df.empty:
+        raise ValueError("The CSV has no rows to send")
+    count = count or len(df)
+    bucket = TokenBucket(rate)
+    sent_events = 0
+    sent_bytes = 0
+    started = time.monotonic()
+
+    with producer: # One long-lived producer (and AMQP connection) for the whole run
+        batch = producer.create_batch()
+        while sent_events + len(batch) < count:
+            # Re-use the CSV rows (with fresh review ids) until `count` events have been produced
+            for feedback in build_records(df):
+                if sent_events + len(batch) >= count:
+                    break
+                body = encode(feedback)
+                try:
+                    batch.add(EventData(body=body))
+                except ValueError:
+                    # The batch reached the maximum message size: send it and start a new one
+                    bucket.acquire(len(batch))
+                    producer.send_batch(batch)
+                    sent_events += len(batch)
+                    sent_bytes += batch.size_in_bytes
+                    batch = producer.create_batch()
+                    batch.add(EventData(body=body))
+
+        if len(batch):
+            bucket.acquire(len(batch))
+            producer.send_batch(batch)
+            sent_events += len(batch)
+            sent_bytes += batch.size_in_bytes
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Sent {sent_events} events ({sent_bytes} bytes) in {elapsed:.2f}s: "
+          f"{sent_events / elapsed:.0f} events/s, {sent_bytes / elapsed / 1024:.0f} KiB/s")
+    return sent_events, sent_bytes, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Send iPhone feedback events to Event Hub")
+    parser.add_argument("--mode", choices=["realtime", "throughput"], default="realtime",
+                        help="realtime: 1 event/s (default), throughput: batched load test")
+    parser.add_argument("--rate", type=float, default=0, help="Target events/s in throughput mode (0 = unthrottled)")
+    parser.add_argument("--count", type=int, default=None, help="Events to send in throughput mode (default: one per CSV row)")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--schema", default="feedback_schema.avsc")
+    parser.add_argument("--encoding", choices=["single-object", "container"], default="single-object",
+                        help="single-object: schemaless Avro with a schema fingerprint header (default), "
+                             "container: a full Avro container file per event (the old format)")
+    parser.add_argument("--registry", default="schema_registry", help="Directory of the local schema registry")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    if args.encoding == "single-object":
+        # Registers the schema so consumers can resolve the fingerprint in each event
+        encode = SingleObjectEncoder(schema, SchemaRegistry(args.registry)).encode
+    else:
+        parsed_schema = parse_schema(schema)
+        encode = lambda record: to_avro_bytes(record, parsed_schema)
+    # Load data
+    df = csv_cache.read_csv(args.csv)
+    producer = EventHubProducerClient.from_connection_string(conn_str=CONNECTION_STR, eventhub_name=EVENT_HUB_NAME)
+
+    if args.mode == "throughput":
+        run_throughput(producer, df, encode, rate=args.rate, count=args.count)
+    else:
+        run_realtime(producer, df, encode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Live rating aggregates of the FeedbackHub stream, served over a small Flask API.
+
+Every IphoneFeedback record updates the counters of its (variant_asin, country) key and of
+(variant_asin, "*"), the variant over all countries:
+
+    [review_count, rating_sum, verified_count, rating_1, ..., rating_5]
+
+Lookups are a dict access. top_k() scans the keys of one country with a heap, O(keys log k). The
+counters are snapshotted to a JSON file every `snapshot_interval` seconds, together with the position
+reached in every Event Hub partition. On restart the snapshot is loaded and every partition resumes
+right after its position, so no event is counted twice or lost between snapshot and checkpoint.
+
+The aggregator reads FeedbackHub in its own consumer group (--consumer-group, "rating-aggregates" by
+default), next to the Parquet consumer in $Default: within one group the clients would share out the
+partitions and each application would only see part of the stream. It keeps no blob checkpoints, since
+a stored checkpoint would take precedence over the snapshot's positions; the snapshot is where it resumes.
+
+    python rating_aggregates.py --snapshot feedback_aggregates.json --port 5000
+    python rating_aggregates.py --local --count 100000      (offline, replaying a LocalEventHub)
+
+    GET /ratings/<variant_asin>              all countries
+    GET /ratings/<variant_asin>/<country>
+    GET /top?k=10&by=mean_rating&country=India&min_count=20
+    GET /health
+"""
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+from avro_codec import SchemaRegistry, SingleObjectDecoder
+from feedback_consumer import LocalPartitionContext, _fsync_path, consume_eventhub
+from generate_feedback import load_schema
+
+ALL_COUNTRIES = "*"
+RATINGS = range(1, 6)
+SNAPSHOT_VERSION = 1
+TOP_K_ORDERS = ("mean_rating", "review_count", "verified_ratio")
+
+def _stats(counters):
+    review_count, rating_sum, verified_count, *distribution = counters
+    return {"review_count": review_count, "mean_rating": rating_sum / review_count if review_count else None,
+            "verified_count": verified_count, "verified_ratio": verified_count / review_count if review_count else None,
+            "distribution": {str(rating): count for rating, count in zip(RATINGS, distribution)}}
+
+class RatingAggregates:
+    """
+    Thread-safe counters per (variant_asin, country). update() may run on the Event Hub receive threads
+    while the API reads from its own threads.
+    """
+    def __init__(self):
+        self._counters = {} # (variant_asin, country) -> [review_count, rating_sum, verified_count, rating_1..rating_5]
+        self._products = {} # variant_asin -> product_asin
+        self._lock = threading.Lock()
+        self.records = 0
+        self.rejected = 0
+
+    def update(self, record):
+        """
+        Adds one IphoneFeedback record. Records without a 1-5 rating are counted in `rejected` and ignored.
+        """
+        rating = record.get("rating_score")
+        if rating not in RATINGS:
+            with self._lock:
+                self.rejected += 1
+            return False
+        variant_asin = record["variant_asin"]
+        verified = 1 if record.get("is_verified") else 0
+        with self._lock:
+            for key in ((variant_asin, record["country"]), (variant_asin, ALL_COUNTRIES)):
+                counters = self._counters.get(key)
+                if counters is None:
+                    counters = self._counters[key] = [0] * (3 + len(RATINGS))
+                counters[0] += 1
+                counters[1] += rating
+                counters[2] += verified
+                counters[2 + rating] += 1
+            self._products[variant_asin] = record.get("product_asin", "")
+            self.records += 1
+        return True
+
+    def get(self, variant_asin, country=ALL_COUNTRIES):
+        """
+        The stats of a variant in a country (default: all countries), or None if it has no reviews there.
+        """
+        with self._lock:
+            counters = self._counters.get((variant_asin, country))
+            if counters is None:
+                return None
+            counters = list(counters)
+        return dict(_stats(counters), variant_asin=variant_asin, product_asin=self._products.get(variant_asin), country=country)
+
+    def top_k(self, k=10, by="mean_rating", country=ALL_COUNTRIES, min_count=1):
+        """
+        The k variants with the highest `by` (one of TOP_K_ORDERS) in a country, among those with at least
+        min_count reviews. Ties are broken by review count.
+        """
+        if by not in TOP_K_ORDERS:
+            raise ValueError(f"by must be one of {TOP_K_ORDERS}, got {by!r}")
+        order = {
+            "mean_rating": lambda counters: (counters[1] / counters[0], counters[0]),
+            "review_count": lambda counters: (counters[0],),
+            "verified_ratio": lambda counters: (counters[2] / counters[0], counters[0]),
+        }[by]
+        with self._lock:
+            candidates = [(key[0], list(counters)) for key, counters in self._counters.items()
+                          if key[1] == country and counters[0] >= min_count]
+        top = heapq.nlargest(k, candidates, key=lambda candidate: order(candidate[1]))
+        return [dict(_stats(counters), variant_asin=variant_asin, product_asin=self._products.get(variant_asin), country=country)
+                for variant_asin, counters in top]
+
+    def snapshot(self, path, positions=None):
+        """
+        Atomically writes the counters and the stream positions they include to `path`.
+        """
+        with self._lock:
+            state = {"version": SNAPSHOT_VERSION, "created": time.time(), "records": self.records, "rejected": self.rejected,
+                     "positions": positions or {}, "products": dict(self._products),
+                     "counters": [[variant_asin, country, counters] for (variant_asin, country), counters in self._counters.items()]}
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        _fsync_path(temp_path)
+        os.replace(temp_path, path)
+        _fsync_path(os.path.dirname(os.path.abspath(path)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns (aggregates, positions) restored from a snapshot, or empty ones if `path` doesn't exist.
+        """
+        aggregates = cls()
+        if not os.path.exists(path):
+            return aggregates, {}
+        with open(path, "r") as f:
+            state = json.load(f)
+        if state.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')} in {path}")
+        aggregates._counters = {(variant_asin, country): counters for variant_asin, country, counters in state["counters"]}
+        aggregates._products = state["products"]
+        aggregates.records = state["records"]
+        aggregates.rejected = state["rejected"]
+        return aggregates, state["positions"]
+
+class AggregatingConsumer:
+    """
+    on_event_batch callback for EventHubConsumerClient.receive_batch: decodes the events, updates the
+    aggregates and snapshots them every `snapshot_interval` seconds.
+
+    positions holds, per partition, the offset of the last event counted (used to resume from Event Hubs)
+    and how many events were counted (used to resume a LocalEventHub replay, whose events have no offset).
+    """
+    def __init__(self, aggregates, decoder, snapshot_path, snapshot_interval=30, positions=None):
+        self.aggregates = aggregates
+        self.decoder = decoder
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.positions = positions or {} # partition id -> {"offset": str or None, "events": int}
+        self.decode_errors = 0
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._contexts = {}
+
+    def on_event_batch(self, partition_context, events):
+        partition_id = partition_context.partition_id
+        records, errors = self.decoder.decode_batch([b"".join(event.body) for event in events])
+        for index, error in errors:
+            print(f"Skipping undecodable event at offset {events[index].offset} in partition {partition_id}: {error}")
+        if events:
+            # A batch's counters and its position change together, so a snapshot never holds only half of a batch
+            with self._lock:
+                self.decode_errors += len(errors)
+                for record in records:
+                    self.aggregates.update(record)
+                position = self.positions.setdefault(partition_id, {"offset": None, "events": 0})
+                position["offset"] = events[-1].offset
+                position["events"] += len(events)
+                self._contexts[partition_id] = (partition_context, events[-1])
+        # receive_batch calls us with an empty list after max_wait_time, which drives the snapshots
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            self.aggregates.snapshot(self.snapshot_path, self.positions)
+            self._last_snapshot = time.monotonic()
+            # The counters up to these events are on disk now, so the checkpoints may move past them
+            for partition_context, last_event in self._contexts.values():
+                partition_context.update_checkpoint(last_event)
+            self._contexts.clear()
+
+    def starting_position(self):
+        # Resume after the last counted event of every partition, or from the start of the stream
+        offsets = {partition_id: position["offset"] for partition_id, position in self.positions.items() if position["offset"] is not None}
+        return offsets or "-1"
+
+def create_app(aggregates):
+    """
+    The Flask app serving the aggregates. Flask is only imported here, so the store works without it.
+    """
+    from flask import Flask, jsonify, request
+
+    app = Flask(__name__)
+
+    @app.get("/ratings/<variant_asin>")
+    @app.get("/ratings/<variant_asin>/<country>")
+    def ratings(variant_asin, country=ALL_COUNTRIES):
+        stats = aggregates.get(variant_asin, country)
+        if stats is None:
+            return jsonify({"error": f"No reviews for variant {variant_asin} in {country}"}), 404
+        return jsonify(stats)
+
+    @app.get("/top")
+    def top():
+        try:
+            k = int(request.args.get("k", 10))
+            min_count = int(request.args.get("min_count", 1))
+            results = aggregates.top_k(k, request.args.get("by", "mean_rating"), request.args.get("country", ALL_COUNTRIES), min_count)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(results)
+
+    @app.get("/health")
+    def health():
+        return jsonify({"records": aggregates.records, "rejected": aggregates.rejected})
+
+    return app
+
+def consume_local(consumer, count, max_batch_size, csv_path, schema, registry):
+    # Produce `count` events into an in-process hub, then replay the ones not in the snapshot yet
+    import asyncio
+    import csv_cache
+    from async_producer import LocalEventHub, produce
+    from avro_codec import SingleObjectEncoder
+    from generate_feedback import build_records
+
+    hub = LocalEventHub(send_latency_ms=0, keep_events=True)
+    encode = SingleObjectEncoder(schema, registry).encode
+    asyncio.run(produce(hub, build_records(csv_cache.read_csv(csv_path)), encode, count))
+
+    started = time.monotonic()
+    records_before = consumer.aggregates.records
+    for partition_id, events in hub.partitions.items():
+        context = LocalPartitionContext(partition_id)
+        done = consumer.positions.get(partition_id, {}).get("events", 0)
+        for start in range(done, len(events), max_batch_size):
+            consumer.on_event_batch(context, events[start:start + max_batch_size])
+    consumer.snapshot()
+    elapsed = max(time.monotonic() - started, 1e-6)
+    updated = consumer.aggregates.records - records_before
+    print(f"Aggregated {updated} records in {elapsed:.2f}s: {updated / elapsed:.0f} records/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve live rating aggregates of the FeedbackHub stream")
+    parser.add_argument("--snapshot", default="feedback_aggregates.json", help="Snapshot file, loaded on start if it exists")
+    parser.add_argument("--snapshot-interval", type=float, default=30, help="Seconds between snapshots")
+    parser.add_argument("--max-batch-size", type=int, default=1000, help="Events per receive batch")
+    parser.add_argument("--consumer-group", default="rating-aggregates",
+                        help="Event Hub consumer group, not shared with any other reader of the hub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--local", action="store_true", help="Consume events from the in-process LocalEventHub")
+    parser.add_argument("--count", type=int, default=100000, help="Events to produce with --local")
+    parser.add_argument("--csv", default="iphone.csv")
+    parser.add_argument("--schema", default="feedback_schema.avsc")
+    parser.add_argument("--registry", default="schema_registry")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    registry = SchemaRegistry(args.registry)
+    started = time.monotonic()
+    aggregates, positions = RatingAggregates.load(args.snapshot)
+    print(f"Loaded {aggregates.records} records from {args.snapshot} in {time.monotonic() - started:.3f}s")
+    consumer = AggregatingConsumer(aggregates, SingleObjectDecoder(registry, reader_schema=schema),
+                                   args.snapshot, args.snapshot_interval, positions)
+
+    if args.local:
+        target = lambda: consume_local(consumer, args.count, args.max_batch_size, args.csv, schema, registry)
+    else:
+        # No checkpoint store: the snapshot's positions are where to resume, a stored checkpoint would override them
+        target = lambda: consume_eventhub(consumer, args.max_batch_size, max_wait_time=min(args.snapshot_interval, 5),
+                                          consumer_group=args.consumer_group, starting_position=consumer.starting_position(),
+                                          checkpoint_container=None)
+    threading.Thread(target=target, name="feedback-aggregates", daemon=True).start()
+    try:
+        create_app(aggregates).run(host=args.host, port=args.port, threaded=True)
+    finally:
+        consumer.snapshot()
+
+if __name__ == "__main__":
+    main()
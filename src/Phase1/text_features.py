@@ -0,0 +1,161 @@
+"""
+Batch feature extraction for the review texts (review_title + review_description).
+
+A whole column of texts is tokenized at once with NumPy over the UTF-8 bytes of the pyarrow array
+(ASCII lower-case, split on anything that isn't a letter, digit or apostrophe), and the scores are
+computed with NumPy over the flattened tokens:
+
+    review_length     characters of review_description
+    word_count        tokens of title + description
+    sentiment_score   (positive - negative) / (positive + negative) lexicon hits, in [-1, 1], 0 without hits;
+                      a hit right after a negation ("not good", "no charger") counts for the other side
+    complaint_topics  comma separated topics mentioned (charger, battery, ...), null if none
+
+Token lookups go through the batch's dictionary: every distinct token of a batch is looked up once,
+in a vocabulary cache shared by all batches, instead of once per occurrence.
+
+    features = TextFeatureExtractor().extract(titles, descriptions)   # dict of column -> pyarrow array
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+POSITIVE_WORDS = {
+    "good", "great", "excellent", "awesome", "amazing", "best", "love", "loved", "lovely", "nice", "perfect",
+    "fantastic", "superb", "smooth", "fast", "happy", "satisfied", "beautiful", "brilliant", "worth", "recommend",
+    "recommended", "premium", "outstanding", "wonderful", "impressive", "fabulous", "pleasant", "like", "genuine",
+}
+NEGATIVE_WORDS = {
+    "bad", "worst", "poor", "terrible", "horrible", "awful", "disappointed", "disappointing", "waste", "useless",
+    "defective", "broken", "damaged", "slow", "problem", "problems", "issue", "issues", "faulty", "fake", "hate",
+    "worse", "return", "returned", "refund", "complaint", "lag", "lagging", "cheap", "expensive", "overpriced",
+}
+NEGATIONS = {"not", "no", "never", "don't", "didn't", "doesn't", "isn't", "wasn't", "can't", "won't", "without", "nothing"}
+COMPLAINT_TOPICS = {
+    "charger": {"charger", "charging", "adapter", "adaptor", "cable"},
+    "battery": {"battery", "drain", "drains", "draining", "backup"},
+    "heating": {"heat", "heating", "heats", "hot", "overheating", "overheat", "warm"},
+    "camera": {"camera", "cameras", "photo", "photos", "picture", "pictures"},
+    "display": {"display", "screen", "scratch", "scratches", "brightness"},
+    "network": {"network", "signal", "5g", "sim", "wifi", "calls"},
+    "delivery": {"delivery", "delivered", "packaging", "package", "seller", "replacement", "box"},
+    "price": {"price", "expensive", "costly", "overpriced", "cost"},
+}
+FEATURE_FIELDS = ("review_length", "word_count", "sentiment_score", "complaint_topics")
+
+_NEGATION = 1 << len(COMPLAINT_TOPICS) # Flag bit next to the topic bits
+
+# Byte -> lower-cased byte, and whether the byte is part of a token. ASCII letters, digits and the apostrophe
+# are; bytes >= 0x80 (the rest of UTF-8) are too, so non-ASCII words stay whole (they are not case folded).
+_LOWER = np.arange(256, dtype=np.uint8)
+_LOWER[ord("A"):ord("Z") + 1] += 32
+_TOKEN_BYTE = np.zeros(256, dtype=bool)
+for _chars in ("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "0123456789", "'"):
+    _TOKEN_BYTE[list(_chars.encode())] = True
+_TOKEN_BYTE[0x80:] = True
+
+def _tokenize(texts):
+    """
+    Splits a string array into lower-case tokens. Returns (flat string array of tokens, NumPy array of the
+    row index of every token). Works on the array's UTF-8 bytes, without a Python object per text or token.
+    """
+    texts = texts.combine_chunks() if isinstance(texts, pa.ChunkedArray) else texts
+    _, offsets_buffer, data_buffer = texts.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int32)[texts.offset:texts.offset + len(texts) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]] if data_buffer is not None else np.empty(0, np.uint8)
+    offsets = offsets - offsets[0]
+
+    in_token = _TOKEN_BYTE[data]
+    # A token starts at a token byte that follows a separator or begins a row
+    starts = in_token.copy()
+    starts[1:] &= ~in_token[:-1]
+    row_starts = offsets[:-1][offsets[:-1] < len(data)]
+    starts[row_starts] = in_token[row_starts]
+    start_positions = np.flatnonzero(starts)
+
+    # A token ends at a token byte followed by a separator or by the next row
+    ends = in_token.copy()
+    ends[:-1] &= ~in_token[1:] | starts[1:]
+    end_positions = np.flatnonzero(ends) + 1
+
+    # Without the separator bytes the tokens are back to back, which is the layout of a string array
+    token_offsets = np.zeros(len(start_positions) + 1, dtype=np.int32)
+    np.cumsum(end_positions - start_positions, out=token_offsets[1:])
+    tokens = pa.StringArray.from_buffers(len(start_positions), pa.py_buffer(token_offsets), pa.py_buffer(_LOWER[data[in_token]]))
+    parents = np.searchsorted(offsets, start_positions, side="right") - 1
+    return tokens, parents
+
+class TextFeatureExtractor:
+    """
+    Scores batches of review texts. Keeps a cache of token -> (polarity, flags) across batches,
+    bounded by max_vocabulary tokens (cleared when full).
+    """
+    def __init__(self, max_vocabulary=1_000_000):
+        self.max_vocabulary = max_vocabulary
+        self._vocabulary = {}
+        self._topic_names = list(COMPLAINT_TOPICS)
+
+    def _lookup(self, token):
+        polarity = 1 if token in POSITIVE_WORDS else -1 if token in NEGATIVE_WORDS else 0
+        flags = _NEGATION if token in NEGATIONS else 0
+        for bit, words in enumerate(COMPLAINT_TOPICS.values()):
+            if token in words:
+                flags |= 1 << bit
+        return polarity, flags
+
+    def _token_scores(self, tokens):
+        """
+        (polarity, flags) NumPy arrays for every token of a flat string array.
+        """
+        encoded = pc.dictionary_encode(tokens)
+        distinct = encoded.dictionary.to_pylist()
+        if len(self._vocabulary) + len(distinct) > self.max_vocabulary:
+            self._vocabulary.clear()
+        vocabulary = self._vocabulary
+        scores = [vocabulary.get(token) for token in distinct]
+        for index, token in enumerate(distinct):
+            if scores[index] is None:
+                scores[index] = vocabulary[token] = self._lookup(token)
+        polarity = np.array([score[0] for score in scores], dtype=np.int8)
+        flags = np.array([score[1] for score in scores], dtype=np.int32)
+        indices = encoded.indices.to_numpy(zero_copy_only=False)
+        return polarity[indices], flags[indices]
+
+    def extract(self, titles, descriptions):
+        """
+        Returns {feature name: pyarrow array} for equally long sequences (or arrays) of titles and descriptions.
+        Missing texts count as empty.
+        """
+        titles = pc.fill_null(pa.array(titles, type=pa.string()), "")
+        descriptions = pc.fill_null(pa.array(descriptions, type=pa.string()), "")
+        rows = len(descriptions)
+
+        tokens, parents = _tokenize(pc.binary_join_element_wise(titles, descriptions, " "))
+        word_count = np.bincount(parents, minlength=rows)
+
+        polarity, flags = self._token_scores(tokens)
+        if len(tokens):
+            # Flip a sentiment word that directly follows a negation in the same review
+            negated = np.zeros(len(tokens), dtype=bool)
+            negated[1:] = (flags[:-1] & _NEGATION).astype(bool) & (parents[1:] == parents[:-1])
+            polarity = np.where(negated, -polarity, polarity)
+        positive = np.bincount(parents, weights=polarity > 0, minlength=rows)
+        negative = np.bincount(parents, weights=polarity < 0, minlength=rows)
+        hits = positive + negative
+        sentiment = np.divide(positive - negative, hits, out=np.zeros(rows), where=hits > 0)
+
+        # Per review OR of the topic bits of its tokens (only the few topic tokens are visited)
+        topic_bits = np.zeros(rows, dtype=np.int32)
+        topic_tokens = np.flatnonzero(flags & (_NEGATION - 1))
+        np.bitwise_or.at(topic_bits, parents[topic_tokens], flags[topic_tokens] & (_NEGATION - 1))
+        # Each distinct combination of bits is spelled out once and taken for every review that has it
+        combinations, inverse = np.unique(topic_bits, return_inverse=True)
+        spelled = [",".join(name for bit, name in enumerate(self._topic_names) if bits >> bit & 1) or None for bits in combinations]
+        complaint_topics = pa.array(spelled, type=pa.string()).take(pa.array(inverse.ravel()))
+
+        return {
+            "review_length": pc.utf8_length(descriptions),
+            "word_count": pa.array(word_count, type=pa.int32()),
+            "sentiment_score": pa.array(sentiment, type=pa.float32()),
+            "complaint_topics": complaint_topics,
+        }
@@ -0,0 +1,6 @@
+"""
+Helpers shared by the function apps in this repo (blob trigger, blob scanner, queue senders/processors).
+
+Azure Functions only imports modules that live under the app root, so publish this folder next to
+function_app.py (or add 'src' to PYTHONPATH when running the code_samples locally).
+"""
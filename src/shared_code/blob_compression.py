@@ -0,0 +1,63 @@
+"""
+Streaming gzip / zstd transcoding of text blobs.
+
+compress_chunks() compresses an iterable of byte chunks on the fly, so it slots in between the
+download and stream_copy without buffering the blob. The compressed blob keeps its name and gets
+Content-Encoding (gzip / zstd) and a proper Content-Type, so HTTP clients and tools that honour
+Content-Encoding decompress it transparently.
+
+gzip uses the standard library; zstd needs the optional 'zstandard' package.
+"""
+import zlib
+
+CODECS = ("gzip", "zstd")
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+CONTENT_TYPES = {
+    ".txt": "text/plain; charset=utf-8",
+    ".csv": "text/csv; charset=utf-8",
+    ".json": "application/json",
+}
+
+
+def _gzip_compressor(level):
+    # wbits=31: gzip container. zlib writes a zero mtime, so equal input gives equal output (and MD5)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def _zstd_compressor(level):
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd transcoding needs the 'zstandard' package (pip install zstandard)") from e
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def compress_chunks(chunks, codec, level=None):
+    """
+    Yields the compressed form of the byte chunks. Empty outputs are skipped, so every yielded
+    chunk carries data.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported codec '{codec}', expected one of {CODECS}")
+    factory = _gzip_compressor if codec == "gzip" else _zstd_compressor
+    compress, flush = factory(DEFAULT_LEVELS[codec] if level is None else level)
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    tail = flush()
+    if tail:
+        yield tail
+
+
+def content_settings_for(file_ext, codec=None):
+    """
+    ContentSettings with the Content-Type for the file extension and, if the content is
+    compressed, the Content-Encoding.
+    """
+    from azure.storage.blob import ContentSettings # Imported on first use, like in blob_streaming
+
+    return ContentSettings(content_type=CONTENT_TYPES.get(file_ext, "application/octet-stream"),
+                           content_encoding=codec)
@@ -0,0 +1,140 @@
+"""
+Skips blob copies whose target already holds the same content.
+
+A copy is redundant when the target blob has the same size and Content-MD5 as the source. The source
+fingerprint comes for free from the listing (scanner) or the download response (process_file); when
+the source has no stored MD5 it is computed while streaming (see blob_streaming.stream_copy). The
+target fingerprint comes from a local LRU/TTL cache of recent targets, filled by our own copies and
+optionally primed from one listing of the target container, and only falls back to a HEAD request
+(get_blob_properties) on a cache miss.
+
+A source without a stored MD5 can only be compared once it has been streamed (and its blocks staged).
+To skip repeated triggers for the same source version before that, a copy also remembers the source's
+URL and ETag: a source version this worker copied recently is skipped without hashing anything. A new
+version of such a source (new ETag) is still streamed and staged before the decision.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+def _md5_bytes(md5):
+    # The SDK returns Content-MD5 as a bytearray (or None when the blob has none)
+    return bytes(md5) if md5 else None
+
+
+def _copy_incomplete(properties):
+    # The target of a copy that is still running, failed or was aborted doesn't hold the source's content yet
+    copy = getattr(properties, "copy", None)
+    return copy is not None and copy.status in ("pending", "failed", "aborted")
+
+
+class BlobDedup:
+    """
+    Decides whether a copy to a target blob can be skipped, and counts what that saved.
+
+    Counters: checks, skipped, bytes_saved, cache_hits, head_requests.
+    """
+
+    def __init__(self, max_entries=100000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # target blob url -> (size, md5 or None, (source url, etag) or None, expiry)
+        self._primed = {} # (container url, prefix) -> expiry of a complete listing of that prefix
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.skipped = 0
+        self.bytes_saved = 0
+        self.cache_hits = 0
+        self.head_requests = 0
+
+    def remember(self, target_blob_client, size, md5, source=None):
+        """
+        Records the fingerprint of what target_blob_client now holds (call after a copy), and optionally the
+        source version it holds, as (source blob url, etag).
+        """
+        self._put(target_blob_client.url, size, _md5_bytes(md5), source)
+
+    def _put(self, url, size, md5, source=None):
+        with self._lock:
+            self._entries[url] = (size, md5, source, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def prime(self, container_client, prefix=""):
+        """
+        Caches the fingerprints of every blob under `prefix` in the target container with one
+        listing. Until the TTL expires, a cache miss under this prefix means the blob doesn't exist.
+        """
+        for blob in container_client.list_blobs(name_starts_with=prefix or None, results_per_page=5000, include=["copy"]):
+            if _copy_incomplete(blob):
+                continue # Left uncached, so the blob gets a HEAD request (and a copy if it still isn't done)
+            self._put(container_client.get_blob_client(blob.name).url, blob.size, _md5_bytes(blob.content_settings.content_md5))
+        with self._lock:
+            self._primed[(container_client.url, prefix)] = time.monotonic() + self.ttl_seconds
+
+    def is_primed(self, container_client, prefix=""):
+        with self._lock:
+            return self._primed.get((container_client.url, prefix), 0) > time.monotonic()
+
+    def _target_fingerprint(self, target_blob_client):
+        now = time.monotonic()
+        url = target_blob_client.url
+        with self._lock:
+            cached = self._entries.get(url)
+            if cached and cached[3] > now:
+                self._entries.move_to_end(url)
+                self.cache_hits += 1
+                return cached[:2]
+            primed = any(expiry > now and url.startswith(f"{container_url}/{prefix}")
+                         for (container_url, prefix), expiry in self._primed.items())
+            if not primed:
+                self.head_requests += 1
+        if primed:
+            # The listing didn't see this blob and we haven't copied it since
+            return None
+        from azure.core.exceptions import ResourceNotFoundError # Only needed once a HEAD request is made
+        try:
+            properties = target_blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        if _copy_incomplete(properties):
+            # A pending copy may still fail, and a failed one left the target incomplete; neither is cached
+            return None
+        fingerprint = (properties.size, _md5_bytes(properties.content_settings.content_md5))
+        self._put(url, *fingerprint)
+        return fingerprint
+
+    def _holds_source(self, target_blob_client, source):
+        with self._lock:
+            cached = self._entries.get(target_blob_client.url)
+            if not cached or cached[3] <= time.monotonic() or cached[2] != source:
+                return False
+            self._entries.move_to_end(target_blob_client.url)
+            self.cache_hits += 1
+            return True
+
+    def is_unchanged(self, size, md5, target_blob_client, source=None):
+        """
+        True if the target already has this size and MD5, or (with `source`, as (source blob url, etag)) if
+        it was copied from this very source version. Counts the skip and the bytes saved.
+        """
+        md5 = _md5_bytes(md5)
+        with self._lock:
+            self.checks += 1
+        if source is None or source[1] is None or not self._holds_source(target_blob_client, source):
+            if md5 is None:
+                return False
+            if self._target_fingerprint(target_blob_client) != (size, md5):
+                return False
+        with self._lock:
+            self.skipped += 1
+            self.bytes_saved += size
+        logging.info(f"Skipping copy to '{target_blob_client.blob_name}': target already has the same content ({size} bytes).")
+        return True
+
+    def stats(self):
+        return {"checks": self.checks, "skipped": self.skipped, "bytes_saved": self.bytes_saved,
+                "cache_hits": self.cache_hits, "head_requests": self.head_requests}
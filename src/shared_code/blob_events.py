@@ -0,0 +1,92 @@
+"""
+Batch handling of Event Grid / CloudEvents blob notifications delivered to an HTTP webhook.
+
+Event Grid delivers events to a webhook as a JSON array (Event Grid schema) or, with the CloudEvents
+1.0 schema, as a single event or a batch array. These helpers normalize both schemas, answer the
+subscription validation handshakes, filter events by type and subject suffix in-process and turn the
+matching events into the queue messages process_blob_event writes, so one invocation can handle a
+whole delivery batch.
+"""
+import json
+
+BLOB_CREATED = "Microsoft.Storage.BlobCreated"
+SUBSCRIPTION_VALIDATION = "Microsoft.EventGrid.SubscriptionValidationEvent"
+
+
+def parse_events(body):
+    """
+    Decodes a webhook body (bytes or str) into a list of normalized events:
+    {"id", "event_type", "subject", "data"}, for both Event Grid and CloudEvents payloads.
+    A missing or null subject becomes "", so such an event is filtered out instead of failing the batch.
+    Raises ValueError if the body is not JSON or not an event / array of events.
+    """
+    payload = json.loads(body) # json.JSONDecodeError (and UnicodeDecodeError) are ValueErrors
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not all(isinstance(event, dict) for event in payload):
+        raise ValueError("Expected an event object or an array of event objects")
+    events = []
+    for event in payload:
+        if "specversion" in event:
+            # CloudEvents 1.0: "type", "subject", "data"
+            events.append({"id": event.get("id"), "event_type": event.get("type"),
+                           "subject": event.get("subject") or "", "data": event.get("data") or {}})
+        else:
+            events.append({"id": event.get("id"), "event_type": event.get("eventType"),
+                           "subject": event.get("subject") or "", "data": event.get("data") or {}})
+    return events
+
+
+def validation_response(events):
+    """
+    Returns the body answering an Event Grid subscription validation event, or None if the
+    batch is a regular delivery.
+    """
+    for event in events:
+        if event["event_type"] == SUBSCRIPTION_VALIDATION:
+            return json.dumps({"validationResponse": event["data"].get("validationCode")})
+    return None
+
+
+class BlobEventFilter:
+    """
+    Selects events whose type is in `event_types` and whose subject ends with one of
+    `subject_suffixes` (no suffixes: any subject).
+    """
+
+    def __init__(self, event_types=(BLOB_CREATED,), subject_suffixes=()):
+        self.event_types = frozenset(event_types)
+        # str.endswith takes a tuple, so all suffixes are checked in one call
+        self.subject_suffixes = tuple(subject_suffixes)
+
+    @classmethod
+    def from_settings(cls, event_types, subject_suffixes):
+        """
+        Builds a filter from comma separated settings, e.g. "Microsoft.Storage.BlobCreated" and ".csv,.json".
+        """
+        split = lambda value: [item.strip() for item in (value or "").split(",") if item.strip()]
+        return cls(split(event_types) or (BLOB_CREATED,), split(subject_suffixes))
+
+    def matches(self, event):
+        return event["event_type"] in self.event_types and (
+            not self.subject_suffixes or event["subject"].endswith(self.subject_suffixes))
+
+
+def to_queue_message(event):
+    """
+    The order-queue message for a blob event, the same shape process_blob_event sends.
+    """
+    return json.dumps({
+        "blob_url": event["data"].get("url"),
+        "event_id": event["id"],
+        "event_type": event["event_type"],
+        "subject": event["subject"]
+    })
+
+
+def queue_messages(events, event_filter):
+    """
+    Returns (messages, skipped) for a batch of normalized events.
+    """
+    messages = [to_queue_message(event) for event in events if event_filter.matches(event)]
+    return messages, len(events) - len(messages)
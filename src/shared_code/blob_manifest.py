@@ -0,0 +1,149 @@
+"""
+Persistent manifest of the blobs a scanner has already seen, used for incremental scans.
+
+The manifest maps blob name -> (etag, last modified, size) and is stored gzip-compressed in the
+metadata container. Listing is split into prefix shards and done page by page; the continuation
+token of every unfinished shard is saved with the manifest, so a run that hits its page budget
+stops and the next run resumes the listing where it left off instead of starting over.
+"""
+import gzip
+import json
+import logging
+
+MANIFEST_VERSION = 1
+
+
+class BlobManifest:
+    """
+    In-memory form of the manifest blob.
+
+    entries: blob name -> [etag, last_modified (ISO string), size, generation]
+    continuation: shard prefix -> continuation token of a listing that is still in progress
+    generations: shard prefix -> number of the listing pass currently running for that shard
+    next_shard: index of the shard the next run starts listing from (round robin)
+    """
+
+    def __init__(self, entries=None, continuation=None, generations=None, next_shard=0):
+        self.entries = entries or {}
+        self.continuation = continuation or {}
+        self.generations = generations or {}
+        self.next_shard = next_shard
+
+    def is_new_or_changed(self, blob_item):
+        # The etag changes on every write to the blob, so it is enough to detect modifications
+        entry = self.entries.get(blob_item.name)
+        return entry is None or entry[0] != blob_item.etag
+
+    def record(self, blob_item, prefix):
+        last_modified = blob_item.last_modified.isoformat() if blob_item.last_modified else None
+        self.entries[blob_item.name] = [blob_item.etag, last_modified, blob_item.size, self.generations.get(prefix, 0)]
+
+    def touch(self, blob_item, prefix):
+        # Marks an unchanged blob as seen in the current listing pass (so it isn't pruned)
+        entry = self.entries.get(blob_item.name)
+        if entry is not None:
+            entry[3] = self.generations.get(prefix, 0)
+
+    def finish_pass(self, prefix):
+        """
+        Called when a shard has been listed to the end. Entries under the prefix that were not seen
+        during this pass belong to deleted blobs and are dropped.
+        """
+        generation = self.generations.get(prefix, 0)
+        stale = [name for name, entry in self.entries.items()
+                 if name.startswith(prefix) and entry[3] != generation]
+        for name in stale:
+            del self.entries[name]
+        self.generations[prefix] = generation + 1
+        self.continuation.pop(prefix, None)
+        return len(stale)
+
+    def to_bytes(self):
+        payload = {
+            "version": MANIFEST_VERSION,
+            "entries": self.entries,
+            "continuation": self.continuation,
+            "generations": self.generations,
+            "next_shard": self.next_shard,
+        }
+        # Compact separators + gzip keep the manifest small even with hundreds of thousands of blobs
+        return gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(gzip.decompress(data).decode("utf-8"))
+        if payload.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {payload.get('version')}")
+        return cls(payload["entries"], payload["continuation"], payload["generations"], payload["next_shard"])
+
+
+def load_manifest(container_client, manifest_blob_name):
+    """
+    Downloads the manifest from the metadata container. Returns an empty manifest (i.e. a full scan)
+    if it does not exist yet or cannot be parsed.
+    """
+    blob_client = container_client.get_blob_client(manifest_blob_name)
+    if not blob_client.exists():
+        logging.info(f"'{manifest_blob_name}' not found. Starting with an empty manifest.")
+        return BlobManifest()
+    try:
+        manifest = BlobManifest.from_bytes(blob_client.download_blob().readall())
+        logging.info(f"Loaded manifest '{manifest_blob_name}' with {len(manifest.entries)} entries.")
+        return manifest
+    except (ValueError, OSError, KeyError) as e:
+        logging.warning(f"Invalid manifest '{manifest_blob_name}': {e}. Starting with an empty manifest.")
+        return BlobManifest()
+
+
+def save_manifest(container_client, manifest_blob_name, manifest):
+    """
+    Uploads the manifest, overwriting the previous version.
+    """
+    data = manifest.to_bytes()
+    container_client.get_blob_client(manifest_blob_name).upload_blob(data, overwrite=True)
+    logging.info(f"Saved manifest '{manifest_blob_name}' ({len(manifest.entries)} entries, {len(data)} bytes).")
+
+
+def iter_changed_blobs(container_client, manifest, prefixes, max_pages, results_per_page=5000):
+    """
+    Yields (prefix, blob_item) for every new or modified blob, listing at most max_pages pages in total.
+
+    Shards are visited round robin starting at manifest.next_shard, each resuming from its saved
+    continuation token. Unchanged blobs are not yielded. The manifest's continuation tokens are
+    updated after every page, so saving it at any point lets the next run pick up from there.
+    Callers should call manifest.record(blob_item, prefix) once a yielded blob has been handled.
+    """
+    pages_listed = 0
+    unchanged_count = 0
+    for offset in range(len(prefixes)):
+        shard_index = (manifest.next_shard + offset) % len(prefixes)
+        prefix = prefixes[shard_index]
+        token = manifest.continuation.get(prefix)
+
+        pager = container_client.list_blobs(name_starts_with=prefix or None, results_per_page=results_per_page)
+        page_iterator = pager.by_page(continuation_token=token)
+        for page in page_iterator:
+            for blob_item in page:
+                if manifest.is_new_or_changed(blob_item):
+                    yield prefix, blob_item
+                else:
+                    manifest.touch(blob_item, prefix)
+                    unchanged_count += 1
+            pages_listed += 1
+
+            if page_iterator.continuation_token:
+                manifest.continuation[prefix] = page_iterator.continuation_token
+            if pages_listed >= max_pages and page_iterator.continuation_token:
+                # Out of budget: the next run resumes this shard from the saved token
+                manifest.next_shard = shard_index
+                logging.info(f"Page budget reached in shard '{prefix}'. Skipped {unchanged_count} unchanged blobs.")
+                return
+
+        pruned = manifest.finish_pass(prefix)
+        logging.info(f"Finished listing shard '{prefix}' ({pruned} deleted blobs pruned from the manifest).")
+        if pages_listed >= max_pages:
+            manifest.next_shard = (shard_index + 1) % len(prefixes)
+            logging.info(f"Page budget reached. Skipped {unchanged_count} unchanged blobs.")
+            return
+
+    logging.info(f"All shards listed. Skipped {unchanged_count} unchanged blobs.")
@@ -0,0 +1,84 @@
+"""
+Bounded-memory blob copy: the source blob is downloaded chunk by chunk and written to the
+target as staged blocks, so only a few blocks are ever held in memory regardless of file size.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024 # 4 MiB per staged block
+DEFAULT_UPLOAD_CONCURRENCY = 4 # Number of stage_block calls in flight at once
+
+
+def iter_blocks(chunks, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Re-slices an iterable of byte chunks (of any size) into blocks of exactly block_size bytes.
+    The final block may be shorter. At most one block plus one incoming chunk is buffered.
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= block_size:
+            yield bytes(buffer[:block_size])
+            del buffer[:block_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def stream_copy(chunks, target_blob_client, block_size=DEFAULT_BLOCK_SIZE,
+                max_concurrency=DEFAULT_UPLOAD_CONCURRENCY, on_first_block=None, content_settings=None,
+                hasher=None, should_commit=None):
+    """
+    Copies the byte chunks to target_blob_client as a block blob and returns the number of bytes written.
+
+    Blocks are staged in parallel (up to max_concurrency at a time) and committed once all of them
+    have been uploaded, so peak memory is roughly (max_concurrency + 1) * block_size.
+    on_first_block, if given, is called with the first block before it is uploaded (e.g. for a preview).
+
+    hasher (e.g. hashlib.md5()) is updated with every block; an MD5 hasher's digest is also stored
+    as the target's Content-MD5. should_commit, if given, is called with the byte count before the
+    commit, and returning False leaves the staged blocks uncommitted (the service discards them),
+    e.g. when the hash shows the target already has this content. 0 is returned in that case.
+    """
+    # Imported here so loading the module doesn't import the blob SDK (see storage_clients)
+    from azure.storage.blob import BlobBlock, ContentSettings
+
+    # Block ids must all have the same length within a blob. A per-copy prefix keeps the
+    # uncommitted blocks of two concurrent copies to the same blob name from clashing.
+    copy_id = uuid.uuid4().hex
+    block_list = []
+    in_flight = set()
+    total_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for index, block in enumerate(iter_blocks(chunks, block_size)):
+            if index == 0 and on_first_block:
+                on_first_block(block)
+
+            # Wait for a free upload slot before reading the next block, which bounds memory.
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result() # Re-raise any upload error
+
+            if hasher is not None:
+                hasher.update(block)
+            block_id = f"{copy_id}-{index:08d}"
+            in_flight.add(pool.submit(target_blob_client.stage_block, block_id, block))
+            block_list.append(BlobBlock(block_id=block_id))
+            total_bytes += len(block)
+
+        for future in wait(in_flight).done:
+            future.result()
+
+    if should_commit is not None and not should_commit(total_bytes):
+        logging.info(f"Left {len(block_list)} staged blocks of '{target_blob_client.blob_name}' uncommitted.")
+        return 0
+    if hasher is not None and hasher.name == "md5":
+        content_settings = content_settings or ContentSettings()
+        content_settings.content_md5 = bytearray(hasher.digest())
+
+    # An empty block list still creates (or truncates) the target, matching upload_blob(b"").
+    target_blob_client.commit_block_list(block_list, content_settings=content_settings)
+    logging.info(f"Committed {len(block_list)} blocks ({total_bytes} bytes) to '{target_blob_client.blob_name}'.")
+    return total_bytes
@@ -0,0 +1,159 @@
+"""
+Concurrent server-side blob copies with copy-status tracking.
+
+start_copy_from_url only schedules a copy on the storage service, so the engine keeps up to
+max_in_flight start calls running on a thread pool, then polls the copies that are still pending
+in batches until they finish (or the poll timeout is reached) and reports throughput and failures.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+SAS_VALIDITY = timedelta(hours=1) # Lifetime of a newly minted container SAS token
+SAS_MIN_REMAINING = timedelta(minutes=15) # Mint a new token once the cached one has less time left than this
+
+_sas_lock = threading.Lock()
+_sas_cache = {} # (account name, container name) -> (token, expiry)
+
+
+def get_container_sas(blob_service_client, container_name):
+    """
+    Returns a read-only SAS token for the whole container, reusing a cached token while it is valid.
+    A single container-scoped token works for every blob URL in the container, so it replaces
+    calling generate_blob_sas once per blob.
+    IMPORTANT: This assumes the BlobServiceClient was initialized with an account key.
+    """
+    # The SAS helpers are imported on first use (see storage_clients)
+    from azure.storage.blob import generate_container_sas, ContainerSasPermissions
+
+    key = (blob_service_client.account_name, container_name)
+    utc_now = datetime.utcnow()
+    with _sas_lock:
+        cached = _sas_cache.get(key)
+        if cached and cached[1] - utc_now > SAS_MIN_REMAINING:
+            return cached[0]
+
+        expiry = utc_now + SAS_VALIDITY
+        token = generate_container_sas(
+            account_name=blob_service_client.account_name,
+            container_name=container_name,
+            account_key=blob_service_client.credential.account_key, # Access the account key from the client's credential
+            permission=ContainerSasPermissions(read=True), # Grant read permission only
+            expiry=expiry,
+        )
+        _sas_cache[key] = (token, expiry)
+        return token
+
+
+class CopyResult:
+    """
+    Outcome of one blob copy. status is the service's copy status ('success', 'pending', 'failed',
+    'aborted') or 'error' if the copy could not be started.
+    """
+
+    def __init__(self, name, target_blob_client, size=0, context=None):
+        self.name = name
+        self.target_blob_client = target_blob_client
+        self.size = size or 0
+        self.context = context # Caller data handed back with the result (e.g. the listed blob item)
+        self.copy_id = None
+        self.status = None
+        self.error = None
+
+    @property
+    def succeeded(self):
+        # A copy still 'pending' when polling stops may yet fail on the service, so it doesn't count
+        return self.status == "success"
+
+
+class CopyEngine:
+    """
+    Runs start_copy_from_url calls with at most max_in_flight running at once.
+
+    Call submit() for every blob, then finish() once to wait for the started copies, poll their
+    status and get the results back.
+    """
+
+    def __init__(self, max_in_flight=16, poll_interval=2.0, poll_batch_size=50, poll_timeout=30.0):
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.poll_batch_size = poll_batch_size
+        self.poll_timeout = poll_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._futures = []
+        self._results = []
+        self._started_at = time.monotonic()
+
+    def submit(self, name, source_url, target_blob_client, size=0, context=None):
+        """
+        Schedules a copy of source_url (a URL including a SAS token) to target_blob_client.
+        Blocks while max_in_flight copies are already being started.
+        """
+        result = CopyResult(name, target_blob_client, size, context)
+        self._results.append(result)
+        self._slots.acquire()
+        future = self._pool.submit(self._start_copy, result, source_url)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _start_copy(self, result, source_url):
+        try:
+            copy_props = result.target_blob_client.start_copy_from_url(source_url)
+            result.copy_id = copy_props.get("copy_id")
+            result.status = copy_props.get("copy_status") or "pending"
+        except Exception as e:
+            result.status = "error"
+            result.error = str(e)
+            logging.error(f"Error starting copy of '{result.name}': {e}")
+
+    def _poll_status(self, result):
+        try:
+            copy_props = result.target_blob_client.get_blob_properties().copy
+            # A newer copy may have replaced ours; only report on the copy this engine started
+            if result.copy_id and copy_props.id and copy_props.id != result.copy_id:
+                return
+            result.status = copy_props.status or result.status
+            if result.status in ("failed", "aborted"):
+                result.error = copy_props.status_description
+        except Exception as e:
+            logging.warning(f"Error polling copy status of '{result.name}': {e}")
+
+    def finish(self):
+        """
+        Waits for all copies to be started, polls the pending ones in batches until they complete
+        or poll_timeout expires, shuts the thread pool down and returns the list of CopyResult.
+        """
+        for future in self._futures:
+            future.result()
+
+        deadline = time.monotonic() + self.poll_timeout
+        pending = [result for result in self._results if result.status == "pending"]
+        while pending and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            for start in range(0, len(pending), self.poll_batch_size):
+                list(self._pool.map(self._poll_status, pending[start:start + self.poll_batch_size]))
+            pending = [result for result in pending if result.status == "pending"]
+
+        self._pool.shutdown()
+        self._log_stats()
+        return self._results
+
+    def _log_stats(self):
+        elapsed = max(time.monotonic() - self._started_at, 1e-6)
+        counts = {}
+        for result in self._results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        copied_bytes = sum(result.size for result in self._results if result.status == "success")
+        failed = counts.get("failed", 0) + counts.get("aborted", 0) + counts.get("error", 0)
+
+        logging.info(
+            f"Copy engine: {len(self._results)} copies in {elapsed:.1f}s "
+            f"({len(self._results) / elapsed:.1f} copies/s, {copied_bytes / elapsed / 1024 / 1024:.1f} MiB/s completed). "
+            f"Succeeded: {counts.get('success', 0)}, still pending: {counts.get('pending', 0)}, failed: {failed}."
+        )
+        for result in self._results:
+            if result.status in ("failed", "aborted", "error"):
+                logging.error(f"Copy of '{result.name}' {result.status}: {result.error}")
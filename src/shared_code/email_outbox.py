@@ -0,0 +1,222 @@
+"""
+Dispatcher for the order confirmation emails queued in the email_outbox table (see order_store).
+
+Instead of one blocking SendGrid call per order on the queue processing path, a dispatcher claims
+due outbox rows in batches and sends each batch as a single v3 mail/send request: every recipient is
+a personalization with its own substitutions (-order_id-, -amount-), up to 1000 per request. Requests
+go over one pooled requests.Session and are rate limited. Rows of a throttled (429) or failed (5xx,
+connection error) request are retried with exponential backoff until max_attempts; a rejected (400/413)
+batch is split in half so only the offending rows end up 'failed'. A 401/403/404 means the API key or
+URL is wrong rather than any row: the claimed rows are released untouched and drain() raises
+SendGridConfigError, so a configuration mistake never fails the pending emails.
+
+Claims are leases: a claimed row is 'sending' until next_attempt_at, so the rows of a dispatcher that
+died are picked up again once the lease expires. Point SENDGRID_API_URL at a local server (e.g.
+scripts/fake_sendgrid.py) to run without SendGrid.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from shared_code.order_store import CREATE_OUTBOX_SQL, CREATE_OUTBOX_INDEX_SQL
+
+SENDGRID_API_URL = "https://api.sendgrid.com"
+MAX_PERSONALIZATIONS = 1000 # SendGrid limit per mail/send request
+FROM_EMAIL = "no-reply@ecommerce.com"
+SUBJECT = "Order Confirmation"
+HTML_CONTENT = "Thank you for your order #-order_id-! Total: $-amount-"
+REJECTED_STATUSES = (400, 413) # The batch's content was refused: split it to find the offending rows
+CONFIG_ERROR_STATUSES = (401, 403, 404) # Wrong API key or SENDGRID_API_URL: no row is at fault
+
+CLAIM_SQL = """
+    UPDATE email_outbox SET status = 'sending', next_attempt_at = ?
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+        ORDER BY id LIMIT ?
+    )
+    RETURNING id, order_id, recipient, amount, attempts
+"""
+
+
+class SendGridConfigError(RuntimeError):
+    """
+    SendGrid refused a request because of the dispatcher's configuration (API key or URL).
+    """
+
+
+class RateLimiter:
+    """
+    Spaces calls to acquire() at least 1/rate seconds apart (rate <= 0 disables the limit).
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_until = max(self._next, now)
+            self._next = wait_until + self.interval
+        if wait_until > now:
+            time.sleep(wait_until - now)
+
+
+class OutboxDispatcher:
+    """
+    Sends the due rows of email_outbox in the database at `path` through SendGrid.
+
+    drain() sends batches until nothing is due and returns that run's counters: sent, failed,
+    retried (rows rescheduled) and requests. Reuse one dispatcher to keep its HTTP connections.
+    """
+
+    def __init__(self, path, api_key=None, api_url=None, batch_size=MAX_PERSONALIZATIONS, requests_per_second=10,
+                 max_attempts=5, backoff_seconds=5, lease_seconds=120, timeout=30, session=None):
+        self.path = path
+        self.api_key = api_key or os.environ.get("SENDGRID_API_KEY")
+        self.api_url = (api_url or os.environ.get("SENDGRID_API_URL", SENDGRID_API_URL)).rstrip("/")
+        self.batch_size = min(batch_size, MAX_PERSONALIZATIONS)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self._session = session # Built on first use, so order_processor doesn't import requests
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.requests = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = self._build_session()
+        return self._session
+
+    @staticmethod
+    def _build_session():
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Keep-alive connections are reused across batches (and across drain() calls)
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return session
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(CREATE_OUTBOX_SQL)
+        conn.execute(CREATE_OUTBOX_INDEX_SQL)
+        return conn
+
+    def drain(self, max_batches=None):
+        self.sent = self.failed = self.retried = self.requests = 0
+        conn = self._connect()
+        try:
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                rows = self._claim(conn)
+                if not rows:
+                    break
+                try:
+                    self._send(conn, rows)
+                except SendGridConfigError as e:
+                    # Every other batch would fail the same way, so the run stops here
+                    logging.error(f"Email outbox: {e}. Released {len(rows)} claimed emails and stopped.")
+                    raise
+                batches += 1
+        finally:
+            conn.close()
+        logging.info(f"Email outbox: {self.sent} sent, {self.retried} rescheduled, {self.failed} failed "
+                     f"in {self.requests} requests.")
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, "requests": self.requests}
+
+    def _claim(self, conn):
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return conn.execute(CLAIM_SQL, (now + self.lease_seconds, now, self.batch_size)).fetchall()
+
+    def _payload(self, rows):
+        return {
+            "personalizations": [
+                {"to": [{"email": recipient}], "substitutions": {"-order_id-": str(order_id), "-amount-": str(amount)}}
+                for _, order_id, recipient, amount, _ in rows
+            ],
+            "from": {"email": FROM_EMAIL},
+            "subject": SUBJECT,
+            "content": [{"type": "text/html", "value": HTML_CONTENT}],
+        }
+
+    def _send(self, conn, rows):
+        import requests # Already loaded by the session, this is a lookup in sys.modules
+
+        self.rate_limiter.acquire()
+        self.requests += 1
+        retry_after = None
+        try:
+            response = self.session.post(f"{self.api_url}/v3/mail/send", json=self._payload(rows), timeout=self.timeout,
+                                         headers={"Authorization": f"Bearer {self.api_key}"})
+        except requests.RequestException as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            if response.status_code < 300:
+                self._mark(conn, rows, "sent")
+                self.sent += len(rows)
+                return
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            if response.status_code in CONFIG_ERROR_STATUSES:
+                self._release(conn, rows, error)
+                raise SendGridConfigError(f"SendGrid refused the request to {self.api_url}, check SENDGRID_API_KEY "
+                                          f"and SENDGRID_API_URL ({error})")
+            if response.status_code in REJECTED_STATUSES:
+                # The request itself was rejected: split it so only the offending rows fail
+                if len(rows) > 1:
+                    logging.warning(f"SendGrid rejected a batch of {len(rows)} emails ({error}). Splitting and retrying.")
+                    middle = len(rows) // 2
+                    self._send(conn, rows[:middle])
+                    self._send(conn, rows[middle:])
+                else:
+                    self._mark(conn, rows, "failed", error)
+                    self.failed += 1
+                return
+            retry_after = response.headers.get("Retry-After")
+        self._reschedule(conn, rows, error, retry_after)
+
+    def _reschedule(self, conn, rows, error, retry_after=None):
+        logging.warning(f"Sending {len(rows)} emails failed ({error}), rescheduling.")
+        exhausted = [row for row in rows if row[4] + 1 >= self.max_attempts]
+        retry = [row for row in rows if row[4] + 1 < self.max_attempts]
+        if exhausted:
+            self._mark(conn, exhausted, "failed", error)
+            self.failed += len(exhausted)
+        if retry:
+            # Exponential backoff with jitter, or at least what the server asked for
+            attempts = min(row[4] for row in retry) + 1
+            delay = self.backoff_seconds * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            self._mark(conn, retry, "pending", error, next_attempt_at=time.time() + delay)
+            self.retried += len(retry)
+
+    def _release(self, conn, rows, error):
+        # Ends the lease without counting an attempt, so the rows are due again on the next drain()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE email_outbox SET status = 'pending', last_error = ?, next_attempt_at = ? WHERE id = ?",
+                             [(error, time.time(), row[0]) for row in rows])
+
+    def _mark(self, conn, rows, status, error=None, next_attempt_at=None):
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE email_outbox SET status = ?, attempts = attempts + 1, last_error = ?,"
+                " next_attempt_at = COALESCE(?, next_attempt_at) WHERE id = ?",
+                [(status, error, next_attempt_at, row[0]) for row in rows])
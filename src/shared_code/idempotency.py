@@ -0,0 +1,94 @@
+"""
+Idempotency for at-least-once queue deliveries, keyed on order_id.
+
+Queue triggers can deliver a message more than once (and order_processor re-raises so failed
+messages are retried), so the same order may arrive again after it was already stored. Two layers
+catch the duplicates:
+
+- IdempotencyCache: a bounded in-memory LRU with a TTL in front of everything. A hit skips the
+  order before any I/O.
+- The processed_orders table: the persistent seen-set with a unique index on order_id. OrderStore
+  claims order ids with INSERT OR IGNORE in the same transaction as the orders, so an order id is
+  claimed exactly when its order (and outbox email) is written, even across workers and restarts.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+CREATE_SEEN_SQL = """
+    CREATE TABLE IF NOT EXISTS processed_orders (
+        order_id TEXT NOT NULL,
+        processed_at REAL NOT NULL
+    )
+"""
+CREATE_SEEN_INDEX_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS processed_orders_order_id ON processed_orders (order_id)"
+CLAIM_SQL = "INSERT OR IGNORE INTO processed_orders (order_id, processed_at) VALUES (?, ?)"
+
+
+class IdempotencyCache:
+    """
+    Thread-safe LRU set of recently processed keys; entries expire after `ttl_seconds`.
+
+    Counters: hits and misses of contains(), seen_set_hits (duplicates only the persistent
+    seen-set caught, see OrderStore) and evictions.
+    """
+
+    def __init__(self, max_entries=100000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> expiry time, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seen_set_hits = 0
+        self.evictions = 0
+
+    def contains(self, key):
+        key = str(key)
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if expires is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False
+
+    def add(self, keys):
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key in keys:
+                key = str(key)
+                self._entries[key] = expires
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def count_seen_set_hits(self, count):
+        with self._lock:
+            self.seen_set_hits += count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"cache_hits": self.hits, "cache_misses": self.misses, "seen_set_hits": self.seen_set_hits,
+                    "cache_hit_ratio": self.hits / lookups if lookups else 0.0, "cache_entries": len(self._entries),
+                    "evictions": self.evictions}
+
+
+def claim_order_ids(conn, order_ids):
+    """
+    Adds the order ids to the persistent seen-set inside the caller's transaction and returns
+    a list of booleans: True where the id was new, False where it had been processed before
+    (or appears earlier in the same list).
+    """
+    now = time.time()
+    claimed = []
+    for order_id in order_ids:
+        # rowcount is 0 when the unique index made INSERT OR IGNORE skip the row
+        claimed.append(conn.execute(CLAIM_SQL, (str(order_id), now)).rowcount == 1)
+    return claimed
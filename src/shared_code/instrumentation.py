@@ -0,0 +1,329 @@
+"""
+Per-stage latency and throughput instrumentation for the function entry points.
+
+An invocation is split into named stages (listing, SAS minting, copying, table upserts, ...). Each stage
+is timed with spans; spans also count the items and bytes the stage handled, and latency goes into a
+fixed-bucket histogram. When the invocation ends, it is exported in two ways:
+
+- A structured JSON log line ("invocation_metrics"). Each stage in it carries its span count, seconds,
+  items, bytes and throughput.
+- An OpenMetrics text dump of the worker's cumulative counters and histograms. It is written to
+  INSTRUMENTATION_OPENMETRICS_PATH if that is set; otherwise it is logged at DEBUG level.
+
+Spans of different stages may nest or overlap (e.g. "download" runs inside "upload" while streaming),
+so stage seconds don't have to add up to the invocation's duration.
+
+    @app.timer_trigger(...)
+    @instrumented("BlobScannerFunction")
+    def blob_scanner_function(myTimer):
+        metrics = current_invocation()
+        with metrics.span("load_manifest"):
+            ...
+        for blob in metrics.iterate("list", iter_blobs()):
+            ...
+
+With INSTRUMENTATION_ENABLED=false, instrumented() returns the function unchanged and
+current_invocation() returns a shared no-op object. The only cost left is one method call per span.
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "true").lower() == "true"
+INSTRUMENTATION_OPENMETRICS_PATH = os.environ.get("INSTRUMENTATION_OPENMETRICS_PATH") # Rewritten after every invocation
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_current = contextvars.ContextVar("invocation_metrics", default=None)
+
+
+class _StageStats:
+    __slots__ = ("spans", "seconds", "items", "bytes", "buckets")
+
+    def __init__(self):
+        self.spans = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1) # The last bucket is +Inf
+
+    def observe(self, seconds, items, nbytes):
+        self.spans += 1
+        self.seconds += seconds
+        self.items += items
+        self.bytes += nbytes
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+        self.spans += other.spans
+        self.seconds += other.seconds
+        self.items += other.items
+        self.bytes += other.bytes
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+
+class Span:
+    """
+    Times one stage of an invocation. add() counts the items/bytes the stage handled.
+    """
+    __slots__ = ("_invocation", "stage", "items", "bytes", "_started")
+
+    def __init__(self, invocation, stage, items=0, nbytes=0):
+        self._invocation = invocation
+        self.stage = stage
+        self.items = items
+        self.bytes = nbytes
+
+    def add(self, items=0, nbytes=0):
+        self.items += items
+        self.bytes += nbytes
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._invocation._observe(self.stage, time.perf_counter() - self._started, self.items, self.bytes)
+        if exc_type is not None:
+            self._invocation.count(f"{self.stage}_errors")
+        return False
+
+
+class Invocation:
+    """
+    The stages and counters of one function invocation. Spans may be used from several threads.
+    """
+
+    def __init__(self, function_name, registry):
+        self.function_name = function_name
+        self._registry = registry
+        self._started = time.perf_counter()
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage, items=0, nbytes=0):
+        return Span(self, stage, items, nbytes)
+
+    def iterate(self, stage, iterable, measure=None):
+        """
+        Yields from iterable, timing each step as the stage. Every item counts as one item and, with
+        `measure` (e.g. len for byte chunks), adds measure(item) bytes. Lazy sources such as paged
+        listings or download streams are timed this way, though their work happens inside the caller's loop.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._observe(stage, time.perf_counter() - started, 0, 0)
+                return
+            self._observe(stage, time.perf_counter() - started, 1, measure(item) if measure else 0)
+            yield item
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _observe(self, stage, seconds, items, nbytes):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats()
+            stats.observe(seconds, items, nbytes)
+
+    def summary(self):
+        stages = {}
+        for stage, stats in self._stages.items():
+            stages[stage] = {"spans": stats.spans, "seconds": round(stats.seconds, 6), "items": stats.items, "bytes": stats.bytes,
+                             "items_per_s": round(stats.items / stats.seconds, 1) if stats.seconds else None,
+                             "bytes_per_s": round(stats.bytes / stats.seconds, 1) if stats.seconds else None}
+        return {"event": "invocation_metrics", "function": self.function_name,
+                "duration_seconds": round(time.perf_counter() - self._started, 6), "stages": stages, "counters": dict(self._counters)}
+
+    def finish(self, failed=False):
+        """
+        Adds the invocation to the worker's totals and exports the JSON log line and the OpenMetrics dump.
+        """
+        if failed:
+            self.count("invocation_errors")
+        summary = self.summary()
+        self._registry.merge(self.function_name, summary["duration_seconds"], self._stages, self._counters)
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(json.dumps(summary))
+        self._registry.export()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def add(self, items=0, nbytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _NoopInvocation:
+    """
+    Stand-in used when instrumentation is disabled or code runs outside an instrumented function.
+    """
+    _span = _NoopSpan()
+
+    def span(self, stage, items=0, nbytes=0):
+        return self._span
+
+    def iterate(self, stage, iterable, measure=None):
+        return iterable
+
+    def count(self, name, value=1):
+        pass
+
+
+NOOP_INVOCATION = _NoopInvocation()
+
+
+def _labels(**labels):
+    # OpenMetrics label values escape backslash, double quote and newline
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    The worker's cumulative metrics per (function, stage), filled by finished invocations.
+    """
+
+    def __init__(self, openmetrics_path=None):
+        self.openmetrics_path = openmetrics_path
+        self._stages = {} # (function, stage) -> _StageStats
+        self._counters = {} # (function, name) -> value
+        self._invocations = {} # function -> [count, total seconds]
+        self._lock = threading.Lock()
+
+    def merge(self, function_name, duration, stages, counters):
+        with self._lock:
+            totals = self._invocations.setdefault(function_name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            for stage, stats in stages.items():
+                self._stages.setdefault((function_name, stage), _StageStats()).merge(stats)
+            for name, value in counters.items():
+                self._counters[(function_name, name)] = self._counters.get((function_name, name), 0) + value
+
+    def snapshot(self):
+        """
+        The totals as a dict: function -> {"invocations", "seconds", "stages": {stage: {...}}, "counters": {...}}.
+        """
+        with self._lock:
+            functions = {name: {"invocations": count, "seconds": seconds, "stages": {}, "counters": {}}
+                         for name, (count, seconds) in self._invocations.items()}
+            for (function_name, stage), stats in self._stages.items():
+                functions[function_name]["stages"][stage] = {"spans": stats.spans, "seconds": stats.seconds,
+                                                             "items": stats.items, "bytes": stats.bytes}
+            for (function_name, name), value in self._counters.items():
+                functions[function_name]["counters"][name] = value
+        return functions
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._invocations.clear()
+
+    def openmetrics(self):
+        """
+        The metrics in the OpenMetrics text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines += ["# TYPE function_invocations counter", "# HELP function_invocations Finished invocations."]
+            lines += [f"function_invocations_total{_labels(function=name)} {count}" for name, (count, _) in self._invocations.items()]
+            lines += ["# TYPE function_invocation_seconds counter", "# UNIT function_invocation_seconds seconds",
+                      "# HELP function_invocation_seconds Wall time of the finished invocations."]
+            lines += [f"function_invocation_seconds_total{_labels(function=name)} {seconds}" for name, (_, seconds) in self._invocations.items()]
+
+            lines += ["# TYPE function_stage_duration_seconds histogram", "# UNIT function_stage_duration_seconds seconds",
+                      "# HELP function_stage_duration_seconds Latency of the spans of a stage."]
+            for (function_name, stage), stats in self._stages.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    lines.append(f"function_stage_duration_seconds_bucket{_labels(function=function_name, stage=stage, le=bound)} {cumulative}")
+                lines.append(f"function_stage_duration_seconds_count{_labels(function=function_name, stage=stage)} {stats.spans}")
+                lines.append(f"function_stage_duration_seconds_sum{_labels(function=function_name, stage=stage)} {stats.seconds}")
+
+            for unit, attribute in (("items", "items"), ("bytes", "bytes")):
+                lines += [f"# TYPE function_stage_{unit} counter", f"# HELP function_stage_{unit} {unit.capitalize()} handled by a stage."]
+                if unit == "bytes":
+                    lines.append("# UNIT function_stage_bytes bytes")
+                lines += [f"function_stage_{unit}_total{_labels(function=function_name, stage=stage)} {getattr(stats, attribute)}"
+                          for (function_name, stage), stats in self._stages.items()]
+
+            lines += ["# TYPE function_events counter", "# HELP function_events Named event counters (duplicates, skips, errors, ...)."]
+            lines += [f"function_events_total{_labels(function=function_name, name=name)} {value}"
+                      for (function_name, name), value in self._counters.items()]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        if not self.openmetrics_path:
+            # Rendering the text for every invocation is only worth it when someone reads it
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(self.openmetrics())
+            return
+        text = self.openmetrics()
+        try:
+            # Written next to the target and renamed, so a scraper never reads a half written file
+            temp_path = f"{self.openmetrics_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, self.openmetrics_path)
+        except OSError as e:
+            logging.warning(f"Failed to write OpenMetrics dump to '{self.openmetrics_path}': {e}")
+
+
+registry = MetricsRegistry(INSTRUMENTATION_OPENMETRICS_PATH)
+
+
+def current_invocation():
+    """
+    The running invocation's metrics, or a no-op object outside an instrumented function.
+    """
+    return _current.get() or NOOP_INVOCATION
+
+
+def instrumented(function_name, enabled=None):
+    """
+    Decorator creating the Invocation of each call and exporting it when the call returns or raises.
+    Put it below the app's trigger decorators, so the Functions host registers the wrapper.
+    """
+    enabled = INSTRUMENTATION_ENABLED if enabled is None else enabled
+
+    def decorate(function):
+        if not enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            invocation = Invocation(function_name, registry)
+            token = _current.set(invocation)
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _current.reset(token)
+                invocation.finish(failed=failed)
+        return wrapper
+    return decorate
@@ -0,0 +1,143 @@
+"""
+Parsing, validation and packing for bulk order submissions (the send_orders HTTP route).
+
+A bulk body is either NDJSON (one order per line) or a JSON array of orders. Items are parsed one at
+a time, so a bad line only rejects itself, and the original JSON text of every valid order is kept so
+it can be enqueued without a json.dumps round trip. With packing, consecutive orders are joined into
+multi-order queue messages (a JSON array, understood by order_store.parse_orders) that stay below the
+queue message size limit.
+"""
+import json
+
+from shared_code.order_store import validate_order
+
+# Queue messages are limited to 64 KiB and the Functions output binding base64-encodes them,
+# which grows them by a third
+MAX_MESSAGE_BYTES = 48 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def iter_ndjson(chunks):
+    """
+    Yields (line number, line bytes) for the non-blank lines of an NDJSON body given as an
+    iterable of byte chunks. Lines may span chunk boundaries.
+    """
+    line_number = 0
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end == -1:
+                break
+            line_number += 1
+            line = pending[start:end].strip()
+            if line:
+                yield line_number, line
+            start = end + 1
+        pending = pending[start:]
+    line = pending.strip()
+    if line:
+        yield line_number + 1, line
+
+
+def iter_json_array(text):
+    """
+    Yields (item number, item text) for the items of a JSON array, decoding one item at a time.
+    A syntax error ends the iteration with a ValueError.
+    """
+    index = text.index("[") + 1
+    item_number = 0
+    while True:
+        while index < len(text) and text[index] in " \t\r\n,":
+            index += 1
+        if index >= len(text):
+            raise ValueError("Unterminated JSON array")
+        if text[index] == "]":
+            return
+        item_number += 1
+        _, end = _decoder.raw_decode(text, index)
+        yield item_number, text[index:end]
+        index = end
+
+
+def _is_json_sequence(body):
+    # True if something other than whitespace follows the first JSON value, as in NDJSON
+    text = body.decode("utf-8", errors="replace").strip()
+    try:
+        _, end = _decoder.raw_decode(text)
+    except ValueError:
+        return False
+    return end < len(text)
+
+
+def iter_order_items(body, content_type=""):
+    """
+    Yields (line number, raw JSON text) for each item of an NDJSON or JSON-array body (bytes).
+    The format is taken from the content type, or from the first character of the body. A body sent
+    as application/json that holds several JSON values rather than one is read as NDJSON.
+    """
+    stripped = body.lstrip()[:1]
+    if "ndjson" in content_type or "jsonl" in content_type:
+        ndjson = True
+    elif stripped == b"[":
+        ndjson = False
+    else:
+        ndjson = "json" not in content_type or _is_json_sequence(body)
+    if ndjson:
+        for line_number, line in iter_ndjson([body]):
+            yield line_number, line.decode("utf-8", errors="replace")
+    elif stripped == b"[":
+        yield from iter_json_array(body.decode("utf-8"))
+    else:
+        # A single JSON order (application/json without an array)
+        yield 1, body.decode("utf-8").strip()
+
+
+def validate_items(items):
+    """
+    Validates each (line number, raw JSON) item. Returns the raw JSON of the valid orders and
+    a report entry per line: {"line": n, "accepted": true} or {"line": n, "accepted": false, "error": ...}.
+    """
+    accepted = []
+    report = []
+    items = iter(items)
+    while True:
+        try:
+            line_number, raw = next(items)
+        except StopIteration:
+            break
+        except ValueError as e:
+            # The body itself is malformed (e.g. a broken JSON array): nothing after this point can be read
+            report.append({"line": len(report) + 1, "accepted": False, "error": f"Malformed body, remaining items skipped: {e}"})
+            break
+        try:
+            order = validate_order(json.loads(raw))
+        except ValueError as e: # json.JSONDecodeError is a ValueError
+            report.append({"line": line_number, "accepted": False, "error": str(e)})
+            continue
+        accepted.append(raw)
+        report.append({"line": line_number, "accepted": True, "order_id": order["order_id"]})
+    return accepted, report
+
+
+def pack_messages(raw_orders, max_orders=100, max_bytes=MAX_MESSAGE_BYTES):
+    """
+    Joins raw order JSON texts into JSON-array messages of at most `max_orders` orders and
+    `max_bytes` bytes each. An order that is too big on its own is sent as a single-order message.
+    """
+    messages = []
+    batch = []
+    size = 2 # the brackets
+    for raw in raw_orders:
+        raw_size = len(raw.encode("utf-8")) + 1 # plus the comma
+        if batch and (len(batch) >= max_orders or size + raw_size > max_bytes):
+            messages.append("[" + ",".join(batch) + "]")
+            batch, size = [], 2
+        batch.append(raw)
+        size += raw_size
+    if batch:
+        messages.append("[" + ",".join(batch) + "]")
+    return messages
@@ -0,0 +1,276 @@
+"""
+SQLite persistence for queue orders with connection reuse and batched commits.
+
+Opening a connection and committing once per queue message makes every order pay for a connect and
+an fsync. OrderStore instead keeps one connection per worker thread in WAL mode (synchronous=NORMAL:
+commits are only fsync'ed at checkpoints, which is still crash safe in WAL mode) and reuses the same
+INSERT text so sqlite3's statement cache keeps it prepared. Orders are written with executemany in a
+single transaction, either as an explicit batch (insert_orders / save_messages) or by group commit:
+submit() calls from concurrent invocations are collected by a writer thread and committed together,
+and each call returns only once its own order is committed.
+
+With outbox=True every order also gets a row in email_outbox, in the same transaction, for the
+confirmation email; shared_code.email_outbox sends those outside the queue processing path.
+With an idempotency cache (shared_code.idempotency), orders whose order_id was already processed
+are skipped, so redelivered messages neither insert the order again nor queue another email.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from shared_code.idempotency import CREATE_SEEN_SQL, CREATE_SEEN_INDEX_SQL, claim_order_ids
+
+REQUIRED_FIELDS = ("order_id", "customer_email", "amount")
+INSERT_ORDER_SQL = "INSERT INTO orders (order_id, customer_email, amount, status) VALUES (?, ?, ?, ?)"
+CREATE_ORDERS_SQL = """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id TEXT,
+        customer_email TEXT NOT NULL,
+        amount REAL NOT NULL,
+        status TEXT NOT NULL
+    )
+"""
+INSERT_OUTBOX_SQL = "INSERT INTO email_outbox (order_id, recipient, amount, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)"
+# status: pending -> sending (claimed by a dispatcher until next_attempt_at) -> sent / failed
+CREATE_OUTBOX_SQL = """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        amount REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT
+    )
+"""
+CREATE_OUTBOX_INDEX_SQL = "CREATE INDEX IF NOT EXISTS email_outbox_due ON email_outbox (status, next_attempt_at)"
+
+_lock = threading.Lock()
+_stores = {} # database path -> OrderStore
+
+
+def validate_order(order):
+    """
+    Raises ValueError if `order` is not an order dict with the required fields.
+    """
+    if not isinstance(order, dict) or not all(field in order for field in REQUIRED_FIELDS):
+        raise ValueError("Missing required order fields")
+    if isinstance(order["amount"], bool) or not isinstance(order["amount"], (int, float)):
+        raise ValueError("amount must be a number")
+    if not isinstance(order["customer_email"], str) or "@" not in order["customer_email"]:
+        raise ValueError("customer_email must be an email address")
+    return order
+
+
+def parse_order(body):
+    """
+    Decodes a queue message body (bytes or str) into an order dict.
+    Raises json.JSONDecodeError for invalid JSON and ValueError for an invalid order.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return validate_order(json.loads(body))
+
+
+def parse_orders(body):
+    """
+    Like parse_order, but also accepts a message packed with several orders (a JSON array,
+    see shared_code.order_ingest) and always returns a non-empty list of orders.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    orders = json.loads(body)
+    if not isinstance(orders, list):
+        orders = [orders]
+    if not orders:
+        raise ValueError("Message contains no orders")
+    return [validate_order(order) for order in orders]
+
+
+class OrderStore:
+    """
+    Writes orders to the SQLite database at `path`, one reused connection per thread.
+
+    insert_orders() writes a batch in one transaction; submit() group-commits single orders from
+    concurrent callers in batches of up to `max_batch_size`. Pass an IdempotencyCache as
+    `idempotency` to skip orders that were already processed.
+    """
+
+    def __init__(self, path, synchronous="NORMAL", busy_timeout_ms=5000, max_batch_size=500, outbox=False,
+                 idempotency=None):
+        self.path = path
+        self.outbox = outbox
+        self.idempotency = idempotency
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_batch_size = max_batch_size
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.committed_orders = 0
+        self.transactions = 0
+
+    @property
+    def connection(self):
+        """
+        The calling thread's connection, opened (and the schema created) on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are started explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None,
+                                   check_same_thread=False) # so close() may run on another thread
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(CREATE_ORDERS_SQL)
+            conn.execute(CREATE_OUTBOX_SQL)
+            conn.execute(CREATE_OUTBOX_INDEX_SQL)
+            conn.execute(CREATE_SEEN_SQL)
+            conn.execute(CREATE_SEEN_INDEX_SQL)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def is_duplicate(self, order):
+        """
+        True if the order's order_id is in the idempotency cache (no I/O). Orders that only the
+        persistent seen-set knows about are skipped later, inside the insert transaction.
+        """
+        return self.idempotency is not None and self.idempotency.contains(order["order_id"])
+
+    def insert_orders(self, orders, status="Processed"):
+        """
+        Inserts the orders with executemany in one transaction. Returns the number of rows written
+        (already processed orders are skipped when idempotency is enabled).
+        Either every order (and its outbox row) is written or, on error, none is.
+        """
+        orders = [order for order in orders if not self.is_duplicate(order)]
+        return sum(self._insert(orders, status))
+
+    def _insert(self, orders, status):
+        # Returns one boolean per order: True if it was written, False if it was a duplicate
+        if not orders:
+            return []
+        conn = self.connection
+        # IMMEDIATE takes the write lock up front instead of failing to upgrade a read lock later
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.idempotency is not None:
+                written = claim_order_ids(conn, [order["order_id"] for order in orders])
+            else:
+                written = [True] * len(orders)
+            rows = [(order["order_id"], order["customer_email"], order["amount"], status)
+                    for order, new in zip(orders, written) if new]
+            conn.executemany(INSERT_ORDER_SQL, rows)
+            if self.outbox:
+                now = time.time()
+                conn.executemany(INSERT_OUTBOX_SQL, [(order_id, email, amount, now, now) for order_id, email, amount, _ in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.committed_orders += len(rows)
+            self.transactions += 1
+        if self.idempotency is not None:
+            self.idempotency.add(order["order_id"] for order in orders)
+            self.idempotency.count_seen_set_hits(len(orders) - len(rows))
+        return written
+
+    def save_messages(self, bodies, status="Processed"):
+        """
+        Parses a batch of queue message bodies and inserts the valid orders in one transaction.
+        Invalid messages are logged and skipped. Returns (inserted, rejected).
+        """
+        orders = []
+        rejected = 0
+        for body in bodies:
+            try:
+                orders.append(parse_order(body))
+            except ValueError as e: # json.JSONDecodeError is a ValueError
+                logging.error(f"Skipping invalid order message: {e}")
+                rejected += 1
+        return self.insert_orders(orders, status), rejected
+
+    def submit(self, order, status="Processed"):
+        """
+        Queues the order for the next group commit and blocks until it is committed.
+        Returns 1 if the order was written and 0 if it was a duplicate; raises the insert
+        error for this order, if any.
+        """
+        if self.is_duplicate(order):
+            return 0
+        self._ensure_writer()
+        future = Future()
+        self._pending.put((order, status, future))
+        return future.result()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_pending, name="order-store-writer", daemon=True)
+                    self._writer.start()
+
+    def _write_pending(self):
+        while True:
+            # Block for the first order, then take whatever else arrived in the meantime
+            batch = [self._pending.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            for status in {status for _, status, _ in batch}:
+                self._commit_group([item for item in batch if item[1] == status], status)
+
+    def _commit_group(self, items, status):
+        try:
+            written = self._insert([order for order, _, _ in items], status)
+        except Exception as e:
+            if len(items) == 1:
+                items[0][2].set_exception(e)
+                return
+            # Retry one by one so only the offending orders fail
+            logging.warning(f"Group commit of {len(items)} orders failed ({e}). Retrying individually.")
+            for item in items:
+                self._commit_group([item], status)
+            return
+        for (_, _, future), new in zip(items, written):
+            future.set_result(int(new))
+
+    def close(self):
+        """
+        Closes every connection opened by this store. Intended for tests and benchmarks.
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def get_order_store(path=None, **options):
+    """
+    Returns the process-wide OrderStore for `path` (default: ORDERS_DB_PATH or orders.db).
+    `options` (OrderStore keyword arguments) only apply when the store is first created.
+    """
+    path = path or os.environ.get("ORDERS_DB_PATH", "orders.db")
+    store = _stores.get(path)
+    if store is None:
+        with _lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = OrderStore(path, **options)
+    return store
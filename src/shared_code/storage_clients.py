@@ -0,0 +1,137 @@
+"""
+Process-wide registry of Azure Storage clients.
+
+Building a client from a connection string creates a new HTTP pipeline, so doing it on every
+invocation means a new connection pool and TLS handshake each time. The functions here build each
+service client once per worker process (keyed by connection string) and hand out container, table
+and queue clients that share the service client's pipeline and connection pool.
+"""
+import os
+import threading
+
+_lock = threading.RLock() # Re-entrant: building a child client may build its service client first
+_blob_service_clients = {} # connection string -> BlobServiceClient
+_table_service_clients = {} # connection string -> TableServiceClient
+_queue_service_clients = {} # connection string -> QueueServiceClient
+_child_clients = {} # (kind, connection string, name) -> container / table / queue client
+
+
+def _connection_string(connection_string):
+    # Default to the storage account the Functions host itself uses
+    return connection_string or os.environ["AzureWebJobsStorage"]
+
+
+def _get_or_create(cache, key, factory):
+    client = cache.get(key)
+    if client is None:
+        with _lock:
+            # Check again under the lock in case another thread created it in the meantime
+            client = cache.get(key)
+            if client is None:
+                client = factory()
+                cache[key] = client
+    return client
+
+
+def _new_blob_service_client(conn_str):
+    # Imported on first use: azure.storage.blob takes ~0.2 s to import, which would otherwise be
+    # paid at module load by every function app that imports this module
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(conn_str)
+
+
+def _new_table_service_client(conn_str):
+    # Imported here so apps that never touch Table Storage don't need azure-data-tables
+    from azure.data.tables import TableServiceClient
+    return TableServiceClient.from_connection_string(conn_str)
+
+
+def _new_queue_service_client(conn_str):
+    # Imported here so apps that never touch Queue Storage don't need azure-storage-queue
+    from azure.storage.queue import QueueServiceClient
+    return QueueServiceClient.from_connection_string(conn_str)
+
+
+def get_blob_service_client(connection_string=None):
+    """
+    Returns the shared BlobServiceClient for the connection string (default: AzureWebJobsStorage).
+    The SDK is only imported when the client has to be built, so clients registered with
+    set_clients() work without it.
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_blob_service_clients, conn_str, lambda: _new_blob_service_client(conn_str))
+
+
+def get_table_service_client(connection_string=None):
+    """
+    Returns the shared TableServiceClient for the connection string (default: AzureWebJobsStorage).
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_table_service_clients, conn_str, lambda: _new_table_service_client(conn_str))
+
+
+def get_queue_service_client(connection_string=None):
+    """
+    Returns the shared QueueServiceClient for the connection string (default: AzureWebJobsStorage).
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_queue_service_clients, conn_str, lambda: _new_queue_service_client(conn_str))
+
+
+def get_container_client(container_name, connection_string=None):
+    """
+    Returns a ContainerClient that reuses the shared BlobServiceClient's connection pool.
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_child_clients, ("container", conn_str, container_name),
+                          lambda: get_blob_service_client(conn_str).get_container_client(container_name))
+
+
+def get_table_client(table_name, connection_string=None):
+    """
+    Returns a TableClient that reuses the shared TableServiceClient's connection pool.
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_child_clients, ("table", conn_str, table_name),
+                          lambda: get_table_service_client(conn_str).get_table_client(table_name=table_name))
+
+
+def get_queue_client(queue_name, connection_string=None):
+    """
+    Returns a QueueClient that reuses the shared QueueServiceClient's connection pool.
+    """
+    conn_str = _connection_string(connection_string)
+    return _get_or_create(_child_clients, ("queue", conn_str, queue_name),
+                          lambda: get_queue_service_client(conn_str).get_queue_client(queue_name))
+
+
+def set_clients(connection_string=None, blob_service_client=None, table_service_client=None, queue_service_client=None):
+    """
+    Registers pre-built service clients for the connection string (default: AzureWebJobsStorage),
+    e.g. the in-memory fakes of scripts/fake_azure.py for offline load tests. Cached child clients
+    of that connection string are dropped so they are rebuilt from the new service clients.
+    """
+    conn_str = _connection_string(connection_string)
+    with _lock:
+        for cache, client in ((_blob_service_clients, blob_service_client), (_table_service_clients, table_service_client),
+                              (_queue_service_clients, queue_service_client)):
+            if client is not None:
+                cache[conn_str] = client
+        for key in [key for key in _child_clients if key[1] == conn_str]:
+            del _child_clients[key]
+
+
+def reset_clients():
+    """
+    Closes and forgets every cached client. Intended for tests and for recovering from a
+    broken connection; the next get_* call builds fresh clients.
+    """
+    with _lock:
+        caches = (_child_clients, _blob_service_clients, _table_service_clients, _queue_service_clients)
+        for cache in caches:
+            for client in cache.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass # Best effort, the client is being discarded anyway
+            cache.clear()
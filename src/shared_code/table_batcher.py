@@ -0,0 +1,99 @@
+"""
+Write-behind buffer for Azure Table Storage upserts.
+
+Instead of one upsert_entity round trip per entity, entities are grouped by PartitionKey and
+written as transactional batches (up to 100 entities, the service limit) with submit_transaction.
+Full batches are written in the background while more entities are added; flush() writes the rest
+and waits. A batch that fails is split in half and retried, so one bad entity only fails itself.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+MAX_BATCH_SIZE = 100 # Azure Table Storage limit for entities in one transaction
+
+
+class TableWriteBuffer:
+    """
+    Buffers entities for table_client and upserts them in per-partition transactional batches.
+
+    Use add() for every entity and call flush() before anything that depends on the entities being
+    stored (e.g. saving a scan checkpoint). succeeded/failed/requests count entities and requests,
+    failed_keys holds the (PartitionKey, RowKey) of every entity that could not be written.
+    """
+
+    def __init__(self, table_client, max_batch_size=MAX_BATCH_SIZE, max_workers=4):
+        self.table_client = table_client
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._partitions = {} # PartitionKey -> {RowKey: entity} (last write for a RowKey wins)
+        self._futures = []
+        self.succeeded = 0
+        self.failed = 0
+        self.requests = 0
+        self.failed_keys = set()
+
+    def add(self, entity):
+        """
+        Buffers an entity for upsert. Once its partition holds a full batch, the batch is
+        submitted in the background.
+        """
+        partition = self._partitions.setdefault(entity["PartitionKey"], {})
+        # A transaction may not touch the same entity twice, so keep only the latest version
+        partition[entity["RowKey"]] = entity
+        if len(partition) >= self.max_batch_size:
+            self._submit(list(partition.values()))
+            partition.clear()
+
+    def flush(self):
+        """
+        Submits every buffered entity (batches of different partitions run in parallel) and waits
+        for all outstanding batches. Returns the number of entities that failed so far.
+        """
+        for partition in self._partitions.values():
+            entities = list(partition.values())
+            for start in range(0, len(entities), self.max_batch_size):
+                self._submit(entities[start:start + self.max_batch_size])
+            partition.clear()
+
+        futures, self._futures = self._futures, []
+        for future in wait(futures).done:
+            future.result()
+        return self.failed
+
+    def close(self):
+        """
+        Flushes the remaining entities and shuts the thread pool down.
+        """
+        self.flush()
+        self._pool.shutdown()
+        logging.info(f"Table write buffer: {self.succeeded} entities upserted in {self.requests} requests, {self.failed} failed.")
+
+    def _submit(self, entities):
+        if entities:
+            self._futures.append(self._pool.submit(self._write_batch, entities))
+
+    def _write_batch(self, entities):
+        with self._lock:
+            self.requests += 1
+        try:
+            if len(entities) == 1:
+                # A single entity doesn't need the transaction overhead
+                self.table_client.upsert_entity(entity=entities[0])
+            else:
+                self.table_client.submit_transaction([("upsert", entity) for entity in entities])
+            with self._lock:
+                self.succeeded += len(entities)
+        except Exception as e:
+            if len(entities) == 1:
+                logging.error(f"Error upserting entity '{entities[0]['RowKey']}' to Azure Table: {e}")
+                with self._lock:
+                    self.failed += 1
+                    self.failed_keys.add((entities[0]["PartitionKey"], entities[0]["RowKey"]))
+                return
+            # Split the batch and retry both halves so only the offending entities fail
+            logging.warning(f"Batch of {len(entities)} entities failed ({e}). Splitting and retrying.")
+            middle = len(entities) // 2
+            self._write_batch(entities[:middle])
+            self._write_batch(entities[middle:])
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The function apps import shared_code from src/, the Phase1 scripts import each other from src/Phase1,
+# the function tests run against the in-memory fakes in scripts/
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("src", os.path.join("src", "Phase1"), "code_samples", "scripts"):
+    sys.path.insert(0, os.path.join(REPO_ROOT, path))
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from async_producer import LocalEventHub, PartitionedFeedbackProducer
+
+class FailingHub(LocalEventHub):
+    async def send_batch(self, batch):
+        raise ConnectionError("send failed")
+
+def _records(count):
+    return [{"product_asin": f"asin-{index % 3}", "review_id": str(index)} for index in range(count)]
+
+async def _produce(hub, records, **options):
+    producer = PartitionedFeedbackProducer(hub, lambda record: record["review_id"].encode(), **options)
+    for record in records:
+        await producer.send(record)
+    await producer.close()
+    return producer
+
+def test_sends_every_record():
+    hub = LocalEventHub(send_latency_ms=0)
+    producer = asyncio.run(_produce(hub, _records(100)))
+    assert producer.sent_events == 100
+    assert sum(hub.events_per_partition.values()) == 100
+
+def test_close_raises_failed_send():
+    async def scenario():
+        producer = PartitionedFeedbackProducer(FailingHub(send_latency_ms=0), lambda record: b"x" * 100, max_batch_bytes=150)
+        await producer.send(_records(1)[0])
+        await producer._flush("asin-0")
+        # The failed send task has finished (and left the task set) before close() is called
+        await asyncio.sleep(0.01)
+        with pytest.raises(ConnectionError):
+            await producer.close()
+    asyncio.run(scenario())
+
+def test_send_raises_after_failed_send():
+    async def scenario():
+        # Tiny batches, so sends start (and fail) while records are still being added
+        producer = PartitionedFeedbackProducer(FailingHub(send_latency_ms=0), lambda record: b"x" * 100, max_batch_bytes=150)
+        with pytest.raises(ConnectionError):
+            for record in _records(1000):
+                await producer.send(record)
+                await asyncio.sleep(0)
+        assert producer.sent_events == 0
+    asyncio.run(scenario())
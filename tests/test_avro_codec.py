@@ -0,0 +1,38 @@
+from io import BytesIO
+import pytest
+from fastavro import writer
+from avro_codec import HEADER_SIZE, SchemaRegistry, SingleObjectDecoder, SingleObjectEncoder
+
+V1 = {"type": "record", "name": "Review", "fields": [{"name": "id", "type": "string"}, {"name": "rating", "type": "int"}]}
+V2 = {"type": "record", "name": "Review", "fields": V1["fields"] + [{"name": "score", "type": ["null", "float"], "default": None}]}
+
+@pytest.fixture
+def registry(tmp_path):
+    return SchemaRegistry(str(tmp_path / "registry"))
+
+def test_round_trip_and_compact_header(registry):
+    payload = SingleObjectEncoder(V1, registry).encode({"id": "r1", "rating": 5})
+    assert payload[:2] == b"\xc3\x01" and len(payload) < HEADER_SIZE + 10
+    assert SingleObjectDecoder(registry, reader_schema=V1).decode(payload) == {"id": "r1", "rating": 5}
+
+def test_older_writer_schema_is_resolved_to_the_reader_schema(registry):
+    old = SingleObjectEncoder(V1, registry).encode({"id": "r1", "rating": 4})
+    new = SingleObjectEncoder(V2, registry).encode({"id": "r2", "rating": 3, "score": 0.5})
+    # A fresh registry on the same directory, like a consumer started after the producers
+    records, errors = SingleObjectDecoder(SchemaRegistry(registry.directory), reader_schema=V2).decode_batch([old, new])
+    assert errors == []
+    assert records == [{"id": "r1", "rating": 4, "score": None}, {"id": "r2", "rating": 3, "score": 0.5}]
+
+def test_container_payloads_still_decode(registry):
+    buffer = BytesIO()
+    writer(buffer, V1, [{"id": "old", "rating": 1}])
+    assert SingleObjectDecoder(registry).decode(buffer.getvalue()) == {"id": "old", "rating": 1}
+
+def test_decode_batch_reports_bad_payloads_by_index(registry):
+    encode = SingleObjectEncoder(V1, registry).encode
+    unknown = b"\xc3\x01" + b"\x00" * 8 + b"\x02a\x02"
+    records, errors = SingleObjectDecoder(registry, reader_schema=V1).decode_batch(
+        [encode({"id": "a", "rating": 1}), b"garbage", unknown, encode({"id": "b", "rating": 2})])
+    assert [record["id"] for record in records] == ["a", "b"]
+    assert [index for index, _ in errors] == [1, 2]
+    assert isinstance(errors[0][1], ValueError) and isinstance(errors[1][1], KeyError)
@@ -0,0 +1,68 @@
+import json
+import azure.functions as func
+import pytest
+from shared_code.blob_events import BLOB_CREATED, BlobEventFilter, parse_events, queue_messages, validation_response
+
+def _event_grid(subject, event_type=BLOB_CREATED, event_id="1"):
+    return {"id": event_id, "eventType": event_type, "subject": subject, "data": {"url": f"https://a/{subject}"}}
+
+def test_event_grid_and_cloud_events_are_normalized():
+    cloud = {"specversion": "1.0", "id": "2", "type": BLOB_CREATED, "subject": "/blobs/b.json", "data": {"url": "u"}}
+    events = parse_events(json.dumps([_event_grid("/blobs/a.csv"), cloud]))
+    assert [(event["id"], event["event_type"], event["subject"]) for event in events] == [
+        ("1", BLOB_CREATED, "/blobs/a.csv"), ("2", BLOB_CREATED, "/blobs/b.json")]
+    assert parse_events(json.dumps(cloud))[0]["data"] == {"url": "u"}
+
+def test_filter_by_type_and_suffix():
+    event_filter = BlobEventFilter.from_settings(None, ".csv, .json")
+    events = parse_events(json.dumps([_event_grid("/a.csv"), _event_grid("/a.txt"),
+                                      _event_grid("/b.json", event_type="Microsoft.Storage.BlobDeleted")]))
+    messages, skipped = queue_messages(events, event_filter)
+    assert [json.loads(message)["subject"] for message in messages] == ["/a.csv"]
+    assert skipped == 2
+
+def test_null_or_missing_subject_is_skipped_not_raised():
+    missing = _event_grid("/c.csv")
+    del missing["subject"]
+    events = parse_events(json.dumps([_event_grid(None), missing, _event_grid("/c.csv")]))
+    messages, skipped = queue_messages(events, BlobEventFilter(subject_suffixes=(".csv",)))
+    assert len(messages) == 1 and skipped == 2
+
+def test_validation_handshake():
+    events = parse_events(json.dumps([{"id": "v", "eventType": "Microsoft.EventGrid.SubscriptionValidationEvent",
+                                       "subject": "", "data": {"validationCode": "abc"}}]))
+    assert json.loads(validation_response(events)) == {"validationResponse": "abc"}
+    assert validation_response(parse_events(json.dumps([_event_grid("/a.csv")]))) is None
+
+@pytest.mark.parametrize("body", ["", "not json", "42", "[1, 2]", '"event"'])
+def test_malformed_body_is_rejected(body):
+    with pytest.raises(ValueError):
+        parse_events(body)
+
+class Out:
+    # Stand-in for a func.Out queue binding
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+def _deliver(body):
+    from msg_sender_event_grid import process_blob_events
+    request = func.HttpRequest("POST", "http://localhost/api/blob_events", body=body, headers={"Content-Type": "application/json"})
+    queue = Out()
+    return process_blob_events.build().get_user_function()(request, queue), queue
+
+def test_webhook_answers_400_to_a_malformed_batch_and_500_to_other_failures(monkeypatch):
+    import msg_sender_event_grid
+    for body in (b"{not json", b"\xff\xfe", b"[1]"):
+        response, queue = _deliver(body)
+        assert response.status_code == 400 and queue.value is None
+    response, queue = _deliver(json.dumps([_event_grid("/a.csv")]).encode())
+    assert response.status_code == 200 and len(queue.value) == 1
+
+    # Failures past parsing may be transient, so Event Grid should redeliver
+    def unavailable(events, event_filter):
+        raise ConnectionError("queue unavailable")
+    monkeypatch.setattr(msg_sender_event_grid, "queue_messages", unavailable)
+    assert _deliver(json.dumps([_event_grid("/a.csv")]).encode())[0].status_code == 500
@@ -0,0 +1,53 @@
+from fake_azure import FakeAzure
+from shared_code.blob_manifest import BlobManifest, iter_changed_blobs, load_manifest, save_manifest
+
+def _scan(container, manifest, prefixes=("",), max_pages=100):
+    changed = []
+    for prefix, blob_item in iter_changed_blobs(container, manifest, list(prefixes), max_pages, results_per_page=2):
+        manifest.record(blob_item, prefix)
+        changed.append(blob_item.name)
+    return changed
+
+def _backend(names):
+    backend = FakeAzure()
+    for name in names:
+        backend.put_blob("input", name, name.encode())
+    return backend, backend.blob_service_client.get_container_client("input")
+
+def test_only_new_or_changed_blobs_are_yielded():
+    backend, container = _backend(["a", "b", "c"])
+    manifest = BlobManifest()
+    assert _scan(container, manifest) == ["a", "b", "c"]
+    assert _scan(container, manifest) == []
+    backend.put_blob("input", "b", b"rewritten")
+    assert _scan(container, manifest) == ["b"]
+
+def test_page_budget_resumes_where_the_last_run_stopped():
+    _, container = _backend([f"blob-{index}" for index in range(5)])
+    manifest = BlobManifest()
+    assert _scan(container, manifest, max_pages=1) == ["blob-0", "blob-1"]
+    assert manifest.continuation
+    assert _scan(container, manifest, max_pages=1) == ["blob-2", "blob-3"]
+    assert _scan(container, manifest, max_pages=1) == ["blob-4"]
+    assert manifest.continuation == {}
+
+def test_deleted_blobs_are_pruned_after_a_full_pass():
+    backend, container = _backend(["x/1", "x/2", "y/1"])
+    manifest = BlobManifest()
+    _scan(container, manifest, prefixes=("x/", "y/"))
+    del backend.containers["input"]["x/2"]
+    _scan(container, manifest, prefixes=("x/", "y/"))
+    assert sorted(manifest.entries) == ["x/1", "y/1"]
+
+def test_round_trip_through_the_metadata_container():
+    backend, container = _backend(["a"])
+    manifest = BlobManifest()
+    _scan(container, manifest)
+    metadata = backend.blob_service_client.get_container_client("metadata")
+    backend.containers["metadata"] = {}
+    save_manifest(metadata, "manifest.json.gz", manifest)
+    loaded = load_manifest(metadata, "manifest.json.gz")
+    assert loaded.entries == manifest.entries and loaded.generations == manifest.generations
+    backend.put_blob("metadata", "broken.json.gz", b"not gzip")
+    assert load_manifest(metadata, "broken.json.gz").entries == {}
+    assert load_manifest(metadata, "missing.json.gz").entries == {}
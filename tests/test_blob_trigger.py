@@ -0,0 +1,46 @@
+import logging
+import pytest
+from fake_azure import CONNECTION_STRING, FakeAzure
+from load_harness import InputStream
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv("AzureWebJobsStorage", CONNECTION_STRING)
+    backend = FakeAzure()
+    backend.install()
+    backend.containers["output"] = {}
+    return backend
+
+def _trigger(backend, name):
+    import blob_trigger
+    blob_trigger.process_file(InputStream(f"input/{name}", backend.containers["input"][name].data))
+
+def _calls(backend, operation):
+    return backend.stats()["calls"].get(operation, 0)
+
+def test_source_without_md5_is_copied_once(backend):
+    backend.put_blob("input", "no-md5.bin", b"x" * 1000, content_md5=False)
+    _trigger(backend, "no-md5.bin")
+    assert backend.containers["output"]["no-md5.bin"].data == b"x" * 1000
+    # The same source version again: skipped before anything is staged
+    staged = _calls(backend, "stage_block")
+    _trigger(backend, "no-md5.bin")
+    assert _calls(backend, "stage_block") == staged
+
+def test_new_version_with_same_content_is_not_committed(backend):
+    backend.put_blob("input", "rewritten.bin", b"y" * 1000, content_md5=False)
+    _trigger(backend, "rewritten.bin")
+    backend.put_blob("input", "rewritten.bin", b"y" * 1000, content_md5=False) # New ETag
+    commits = _calls(backend, "commit_block_list")
+    _trigger(backend, "rewritten.bin")
+    assert _calls(backend, "commit_block_list") == commits
+
+def test_empty_source_skipped_at_commit_is_not_reported_as_copied(backend, caplog):
+    backend.put_blob("input", "empty.bin", b"", content_md5=False)
+    _trigger(backend, "empty.bin")
+    backend.put_blob("input", "empty.bin", b"", content_md5=False)
+    commits = _calls(backend, "commit_block_list")
+    with caplog.at_level(logging.INFO):
+        _trigger(backend, "empty.bin")
+    assert _calls(backend, "commit_block_list") == commits
+    assert not any("Successfully streamed" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+from azure.core.exceptions import ResourceNotFoundError
+from shared_code.blob_dedup import BlobDedup
+from shared_code.copy_engine import CopyEngine
+
+MD5 = bytearray(b"0123456789abcdef")
+
+class TargetBlob:
+    """
+    Target blob client whose copies stay in `copy_status` (and whose properties report it).
+    """
+    def __init__(self, copy_status, size=10, md5=MD5, exists=True):
+        self.url = f"https://account.blob.core.windows.net/target/{id(self)}"
+        self.blob_name = "blob"
+        self.copy_status = copy_status
+        self.size = size
+        self.md5 = md5
+        self.exists = exists
+
+    def start_copy_from_url(self, source_url):
+        return {"copy_id": "copy-1", "copy_status": "pending"}
+
+    def get_blob_properties(self):
+        if not self.exists:
+            raise ResourceNotFoundError("not found")
+        return SimpleNamespace(size=self.size, content_settings=SimpleNamespace(content_md5=self.md5),
+                               copy=SimpleNamespace(id="copy-1", status=self.copy_status, status_description="boom"))
+
+def _run(target, poll_timeout=0.05):
+    engine = CopyEngine(max_in_flight=2, poll_interval=0.01, poll_timeout=poll_timeout)
+    engine.submit("blob", "https://source/blob?sas", target, size=10)
+    return engine.finish()[0]
+
+def test_completed_copy_succeeds():
+    assert _run(TargetBlob("success")).succeeded
+
+def test_copy_pending_at_timeout_does_not_count():
+    result = _run(TargetBlob("pending"))
+    assert result.status == "pending"
+    assert not result.succeeded
+
+def test_failed_copy_reports_error():
+    result = _run(TargetBlob("failed"))
+    assert not result.succeeded
+    assert result.error == "boom"
+
+def test_dedup_ignores_incomplete_copy_targets():
+    dedup = BlobDedup()
+    assert not dedup.is_unchanged(10, MD5, TargetBlob("pending"))
+    assert not dedup.is_unchanged(10, MD5, TargetBlob("failed"))
+    assert dedup.is_unchanged(10, MD5, TargetBlob("success"))
+    assert not dedup.is_unchanged(10, MD5, TargetBlob(None, exists=False))
@@ -0,0 +1,62 @@
+import os
+import time
+import pandas as pd
+import pytest
+from csv_cache import CsvCache
+
+CSV = "text,number,flag\nhello,1,TRUE\n,2,FALSE\n\"multi\nline\",,TRUE\n"
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "reviews.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return str(path)
+
+def _assert_same(cached, expected):
+    pd.testing.assert_frame_equal(cached, expected)
+    # assert_frame_equal treats None and NaN alike; str() (as build_records uses) does not
+    for column in expected.columns:
+        assert cached[column].map(str).tolist() == expected[column].map(str).tolist(), column
+
+def test_read_csv_matches_pandas_on_miss_and_hit(tmp_path, csv_path):
+    cache = CsvCache(str(tmp_path / "cache"))
+    expected = pd.read_csv(csv_path)
+    _assert_same(cache.read_csv(csv_path), expected)
+    _assert_same(cache.read_csv(csv_path), expected)
+    assert (cache.misses, cache.hits) == (1, 1)
+
+def test_iphone_csv_round_trip(tmp_path):
+    path = os.path.join(os.path.dirname(__file__), "..", "src", "Phase1", "iphone.csv")
+    cache = CsvCache(str(tmp_path / "cache"))
+    cache.read_csv(path)
+    _assert_same(cache.read_csv(path), pd.read_csv(path))
+
+def test_read_options_are_part_of_the_key(tmp_path, csv_path):
+    cache = CsvCache(str(tmp_path / "cache"))
+    assert list(cache.read_csv(csv_path, usecols=["number"]).columns) == ["number"]
+    assert list(cache.read_csv(csv_path).columns) == ["text", "number", "flag"]
+    assert cache.misses == 2
+
+def test_changed_csv_is_reparsed_and_old_entry_dropped(tmp_path, csv_path):
+    cache_dir = tmp_path / "cache"
+    cache = CsvCache(str(cache_dir))
+    cache.read_csv(csv_path)
+    time.sleep(0.01)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("again,3,TRUE\n")
+    assert len(cache.read_csv(csv_path)) == 4
+    assert cache.misses == 2
+    assert len(list(cache_dir.glob("*.arrow"))) == 1
+
+def test_evicts_least_recently_used(tmp_path, csv_path):
+    cache_dir = tmp_path / "cache"
+    cache = CsvCache(str(cache_dir))
+    cache.read_csv(csv_path)
+    entry_size = next(cache_dir.glob("*.arrow")).stat().st_size
+    cache.max_bytes = entry_size + entry_size // 2
+    time.sleep(0.01)
+    cache.read_csv(csv_path, usecols=["text", "number"])
+    # Only the newer entry fits
+    assert cache.read_csv(csv_path, usecols=["text", "number"]) is not None and cache.hits == 1
+    cache.read_csv(csv_path)
+    assert cache.misses == 3
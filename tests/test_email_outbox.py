@@ -0,0 +1,73 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+import pytest
+from shared_code.email_outbox import OutboxDispatcher, SendGridConfigError
+from shared_code.order_store import OrderStore
+
+class FakeSession:
+    """
+    Answers mail/send with respond(personalizations) -> (status, headers) and records every request.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    def post(self, url, json, timeout, headers):
+        self.requests.append(json)
+        status, response_headers = self.respond(json["personalizations"])
+        return SimpleNamespace(status_code=status, text="", headers=response_headers)
+
+def _outbox(tmp_path, emails):
+    path = str(tmp_path / "orders.db")
+    store = OrderStore(path, outbox=True)
+    store.insert_orders([{"order_id": f"o{index}", "customer_email": email, "amount": 2.5} for index, email in enumerate(emails)])
+    store.close()
+    return path
+
+def _statuses(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT recipient, status FROM email_outbox").fetchall())
+
+def _dispatcher(path, respond, **options):
+    return OutboxDispatcher(path, api_key="key", api_url="http://sendgrid", requests_per_second=1000,
+                            session=FakeSession(respond), **options)
+
+def test_due_rows_are_sent_in_batches(tmp_path):
+    path = _outbox(tmp_path, [f"user{index}@example.com" for index in range(5)])
+    dispatcher = _dispatcher(path, lambda personalizations: (202, {}), batch_size=2)
+    assert dispatcher.drain() == {"sent": 5, "failed": 0, "retried": 0, "requests": 3}
+    assert set(_statuses(path).values()) == {"sent"}
+    assert dispatcher.session.requests[0]["personalizations"][0]["substitutions"] == {"-order_id-": "o0", "-amount-": "2.5"}
+    assert dispatcher.drain()["requests"] == 0
+
+def test_rejected_batch_is_split_so_only_the_bad_row_fails(tmp_path):
+    path = _outbox(tmp_path, ["a@example.com", "bad@example.com", "c@example.com", "d@example.com"])
+    reject_bad = lambda personalizations: (400 if any(p["to"][0]["email"].startswith("bad") for p in personalizations) else 202, {})
+    counters = _dispatcher(path, reject_bad).drain()
+    assert counters["sent"] == 3 and counters["failed"] == 1
+    assert _statuses(path)["bad@example.com"] == "failed"
+
+def test_throttled_rows_are_rescheduled_until_max_attempts(tmp_path):
+    path = _outbox(tmp_path, ["a@example.com"])
+    dispatcher = _dispatcher(path, lambda personalizations: (429, {"Retry-After": "30"}), max_attempts=2, backoff_seconds=0)
+    assert dispatcher.drain()["retried"] == 1
+    with sqlite3.connect(path) as conn:
+        # Not due again before Retry-After, so drain() stops instead of spinning
+        conn.execute("UPDATE email_outbox SET next_attempt_at = 0")
+    assert dispatcher.drain()["failed"] == 1
+    assert _statuses(path)["a@example.com"] == "failed"
+
+@pytest.mark.parametrize("status", [401, 403, 404])
+def test_configuration_errors_release_the_rows_instead_of_failing_them(tmp_path, status):
+    path = _outbox(tmp_path, [f"user{index}@example.com" for index in range(8)])
+    dispatcher = _dispatcher(path, lambda personalizations: (status, {}))
+    with pytest.raises(SendGridConfigError):
+        dispatcher.drain()
+    assert len(dispatcher.session.requests) == 1
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT DISTINCT status, attempts FROM email_outbox").fetchall() == [("pending", 0)]
+        assert conn.execute("SELECT MAX(next_attempt_at) FROM email_outbox").fetchone()[0] <= time.time()
+    # Once the configuration is fixed, the next drain sends them all
+    dispatcher.session.respond = lambda personalizations: (202, {})
+    assert dispatcher.drain()["sent"] == 8
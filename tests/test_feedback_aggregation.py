@@ -0,0 +1,47 @@
+import glob
+import apache_beam as beam
+import pyarrow.parquet as pq
+from apache_beam.testing.util import assert_that, equal_to
+from feedback_aggregation import RatingStatsFn, key_by_group, review_month, run
+
+def test_rating_stats_combine_and_merge():
+    combine = RatingStatsFn()
+    left = combine.create_accumulator()
+    for value in [(5, True), (4, False), (5, True)]:
+        left = combine.add_input(left, value)
+    right = combine.add_input(combine.create_accumulator(), (1, True))
+    merged = combine.merge_accumulators([left, combine.create_accumulator(), right])
+    assert combine.extract_output(merged) == [4, 3, 1, 0, 0, 1, 2]
+
+def test_combine_per_key_in_a_pipeline():
+    with beam.Pipeline() as pipeline:
+        output = (pipeline
+                  | beam.Create([("a", (3, True)), ("b", (2, False)), ("a", (5, False))])
+                  | beam.CombinePerKey(RatingStatsFn()))
+        assert_that(output, equal_to([("a", [2, 1, 0, 0, 1, 0, 1]), ("b", [1, 0, 0, 1, 0, 0, 0])]))
+
+def test_review_month_and_invalid_records():
+    assert review_month("11-08-2024") == "2024-08"
+    assert review_month("2024-08-11T10:00:00") == "2024-08"
+    assert review_month("11-13-2024") is None and review_month("nan") is None
+    record = {"product_asin": "P", "variant_asin": "V", "country": "India", "rating_score": "4.0",
+              "is_verified": True, "review_date": "11-08-2024"}
+    assert list(key_by_group(record)) == [(("P", "V", "India", "2024-08"), (4, True))]
+    assert list(key_by_group(dict(record, rating_score="6"))) == []
+    assert list(key_by_group(dict(record, review_date=""))) == []
+
+def test_csv_rollup_end_to_end(tmp_path):
+    csv_path = tmp_path / "reviews.csv"
+    csv_path.write_text(
+        "﻿productAsin,country,date,isVerified,ratingScore,reviewTitle,reviewDescription,variantAsin\n"
+        'P1,India,11-08-2024,True,5,Good,"multi\nline",V1\n'
+        "P1,India,12-08-2024,False,3,Ok,fine,V1\n"
+        "P1,India,01-09-2024,True,1,Bad,broken,V1\n"
+        "P1,India,,True,4,No date,dropped,V1\n", encoding="utf-8")
+    run([str(csv_path)], str(tmp_path / "rollup" / "part"))
+    rows = pq.read_table(glob.glob(str(tmp_path / "rollup" / "part*.parquet"))).to_pylist()
+    by_month = {row["month"]: row for row in rows}
+    assert sorted(by_month) == ["2024-08", "2024-09"]
+    august = by_month["2024-08"]
+    assert (august["review_count"], august["verified_count"], august["mean_rating"]) == (2, 1, 4.0)
+    assert (august["rating_3"], august["rating_5"]) == (1, 1)
@@ -0,0 +1,33 @@
+import os
+from types import SimpleNamespace
+import pyarrow.dataset as ds
+from avro_codec import SchemaRegistry, SingleObjectDecoder, SingleObjectEncoder
+from feedback_consumer import FeedbackConsumer, LocalPartitionContext, ParquetSink, arrow_schema_from_avro
+from generate_feedback import load_schema
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "Phase1", "feedback_schema.avsc")
+
+def _record(index, country="India"):
+    return {"review_id": f"r{index}", "product_asin": "P1", "variant_asin": "V1", "country": country,
+            "review_title": "Good", "review_description": "nan", "rating_score": 1 + index % 5, "is_verified": True,
+            "review_date": "11-08-2024", "timestamp": "2024-08-11T00:00:00", "review_length": 3, "word_count": 1,
+            "sentiment_score": 1.0, "complaint_topics": None}
+
+def test_batches_land_as_partitioned_parquet_and_skip_bad_events(tmp_path):
+    schema = load_schema(SCHEMA_PATH)
+    registry = SchemaRegistry(str(tmp_path / "registry"))
+    encode = SingleObjectEncoder(schema, registry).encode
+    consumer = FeedbackConsumer(ParquetSink(str(tmp_path / "parquet")), SingleObjectDecoder(registry, reader_schema=schema),
+                                arrow_schema_from_avro(schema), row_group_size=3, flush_interval=60)
+    payloads = [encode(_record(0)), b"not avro", encode(_record(1, "Canada")), encode(_record(2))]
+    events = [SimpleNamespace(body=[payload], offset=str(offset)) for offset, payload in enumerate(payloads)]
+    context = LocalPartitionContext("0")
+
+    consumer.on_event_batch(context, events)
+
+    assert consumer.decode_errors == 1
+    assert consumer.rows_written == 3 # row_group_size reached, so the batch was flushed
+    assert context.checkpoint is events[-1]
+    table = ds.dataset(str(tmp_path / "parquet"), format="parquet", partitioning="hive").to_table()
+    assert sorted(table.column("review_id").to_pylist()) == ["r0", "r1", "r2"]
+    assert sorted(table.column("country").to_pylist()) == ["Canada", "India", "India"]
@@ -0,0 +1,35 @@
+import time
+from shared_code.idempotency import IdempotencyCache
+from shared_code.order_store import OrderStore
+
+def _order(order_id):
+    return {"order_id": order_id, "customer_email": f"{order_id}@example.com", "amount": 1.5}
+
+def test_cache_hits_expiry_and_eviction():
+    cache = IdempotencyCache(max_entries=2, ttl_seconds=60)
+    cache.add(["a", "b"])
+    assert cache.contains("a") and not cache.contains("c")
+    cache.add(["c"]) # "b" is the least recently used now
+    assert not cache.contains("b") and cache.contains("a") and cache.contains("c")
+    assert cache.evictions == 1
+    expiring = IdempotencyCache(ttl_seconds=0.01)
+    expiring.add([1])
+    assert expiring.contains("1")
+    time.sleep(0.02)
+    assert not expiring.contains(1)
+
+def test_redelivered_orders_are_written_once(tmp_path):
+    path = str(tmp_path / "orders.db")
+    store = OrderStore(path, outbox=True, idempotency=IdempotencyCache())
+    assert store.insert_orders([_order("o1"), _order("o2"), _order("o1")]) == 2
+    assert store.insert_orders([_order("o1")]) == 0 # Cache hit
+    assert store.submit(_order("o3")) == 1 and store.submit(_order("o3")) == 0
+    # Another worker (cold cache) on the same database: the persistent seen-set catches the duplicates
+    other = OrderStore(path, outbox=True, idempotency=IdempotencyCache())
+    assert other.insert_orders([_order("o2"), _order("o4")]) == 1
+    assert other.idempotency.seen_set_hits == 1
+    conn = store.connection
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM email_outbox").fetchone()[0] == 4
+    store.close()
+    other.close()
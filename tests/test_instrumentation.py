@@ -0,0 +1,108 @@
+import pytest
+from shared_code import instrumentation
+from shared_code.instrumentation import NOOP_INVOCATION, Invocation, MetricsRegistry, current_invocation, instrumented
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(instrumentation.time, "perf_counter", clock)
+    return clock
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(instrumentation, "registry", registry)
+    return registry
+
+def test_nested_and_overlapping_spans_are_timed_independently(clock):
+    invocation = Invocation("f", MetricsRegistry())
+    with invocation.span("upload", items=1) as upload:
+        clock.now += 1
+        with invocation.span("download") as download:
+            clock.now += 2
+            download.add(items=3, nbytes=300)
+        clock.now += 0.5
+        upload.add(nbytes=300)
+    # Overlapping (not nested) spans of one stage, as from two threads
+    first = invocation.span("copy").__enter__()
+    clock.now += 1
+    second = invocation.span("copy").__enter__()
+    clock.now += 1
+    first.__exit__(None, None, None)
+    clock.now += 1
+    second.__exit__(None, None, None)
+
+    stages = invocation.summary()["stages"]
+    assert stages["upload"] == {"spans": 1, "seconds": 3.5, "items": 1, "bytes": 300, "items_per_s": 0.3, "bytes_per_s": 85.7}
+    assert stages["download"] == {"spans": 1, "seconds": 2.0, "items": 3, "bytes": 300, "items_per_s": 1.5, "bytes_per_s": 150.0}
+    assert (stages["copy"]["spans"], stages["copy"]["seconds"]) == (2, 4.0)
+    assert invocation.summary()["duration_seconds"] == 6.5
+
+def test_iterate_counts_items_bytes_and_the_final_step(clock):
+    invocation = Invocation("f", MetricsRegistry())
+    def chunks():
+        for chunk in (b"ab", b"cde", b""):
+            clock.now += 1
+            yield chunk
+        clock.now += 1
+    assert list(invocation.iterate("download", chunks(), measure=len)) == [b"ab", b"cde", b""]
+    stats = invocation.summary()["stages"]["download"]
+    # Every item is one step, plus the step that ends the iteration
+    assert (stats["spans"], stats["seconds"], stats["items"], stats["bytes"]) == (4, 4.0, 3, 5)
+
+def test_errors_are_counted_and_reraised(registry):
+    @instrumented("Failing", enabled=True)
+    def failing():
+        with current_invocation().span("parse"):
+            raise ValueError("boom")
+    with pytest.raises(ValueError):
+        failing()
+    failing_totals = registry.snapshot()["Failing"]
+    assert failing_totals["invocations"] == 1
+    assert failing_totals["counters"] == {"parse_errors": 1, "invocation_errors": 1}
+    assert failing_totals["stages"]["parse"]["spans"] == 1
+    # The invocation is no longer current once the call has ended
+    assert current_invocation() is NOOP_INVOCATION
+
+def test_disabled_returns_the_function_unchanged(registry):
+    def handler(value):
+        assert current_invocation() is NOOP_INVOCATION
+        with current_invocation().span("work") as span:
+            span.add(items=1)
+        return list(current_invocation().iterate("list", [value]))
+    assert instrumented("Handler", enabled=False)(handler) is handler
+    assert handler(1) == [1]
+    assert registry.snapshot() == {}
+
+def test_openmetrics_buckets_are_cumulative_and_labels_escaped(clock, registry):
+    @instrumented('Quote"Back\\slash\nNewline', enabled=True)
+    def handler():
+        metrics = current_invocation()
+        for seconds in (0.002, 0.002, 0.3, 400):
+            with metrics.span("copy", nbytes=10):
+                clock.now += seconds
+        metrics.count("skipped", 2)
+    handler()
+    handler()
+    text = registry.openmetrics()
+    assert text.endswith("# EOF\n") and text.count("# EOF") == 1
+    labels = 'function="Quote\\"Back\\\\slash\\nNewline",stage="copy"'
+    buckets = {line.split(" ")[0]: int(line.split(" ")[1]) for line in text.splitlines() if line.startswith("function_stage_duration_seconds_bucket")}
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"0.001\"}}"] == 0
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"0.005\"}}"] == 4
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"0.25\"}}"] == 4
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"0.5\"}}"] == 6
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"300.0\"}}"] == 6
+    assert buckets[f"function_stage_duration_seconds_bucket{{{labels},le=\"+Inf\"}}"] == 8
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert f"function_stage_duration_seconds_count{{{labels}}} 8" in text
+    assert f"function_stage_bytes_total{{{labels}}} 80" in text
+    assert 'function_invocations_total{function="Quote\\"Back\\\\slash\\nNewline"} 2' in text
+    assert 'function_events_total{function="Quote\\"Back\\\\slash\\nNewline",name="skipped"} 4' in text
@@ -0,0 +1,40 @@
+import json
+import azure.functions as func
+import pytest
+from msg_sender_http import send_order, send_orders
+
+class Out:
+    # Stand-in for a func.Out queue binding
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+def _post(route, body, params=None):
+    return func.HttpRequest("POST", f"http://localhost/api/{route}", body=body.encode(), params=params or {},
+                            headers={"Content-Type": "application/json"})
+
+def _call(function, request):
+    # The functions are wrapped by @instrumented and the Functions decorators; call the user function
+    queue = Out()
+    return function.build().get_user_function()(request, queue), queue
+
+def test_send_order_enqueues_a_valid_order():
+    response, queue = _call(send_order, _post("send_order", json.dumps({"order_id": "1", "customer_email": "a@b.c", "amount": 9.5})))
+    assert response.status_code == 200
+    assert json.loads(queue.value)["order_id"] == "1"
+
+@pytest.mark.parametrize("body", ['{"amount": "99.99"}', '{"order_id": "1", "customer_email": "a@b.c", "amount": "99.99"}',
+                                  "not json", "[]"])
+def test_send_order_refuses_what_order_processor_would_drop(body):
+    response, queue = _call(send_order, _post("send_order", body))
+    assert response.status_code == 400
+    assert queue.value is None
+
+def test_send_orders_reports_rejected_lines():
+    body = '{"order_id": "1", "customer_email": "a@b.c", "amount": 1}\n{"order_id": "2", "amount": "x"}\n'
+    response, queue = _call(send_orders, _post("send_orders", body))
+    result = json.loads(response.get_body())
+    assert (result["accepted"], result["rejected"]) == (1, 1)
+    assert len(queue.value) == 1
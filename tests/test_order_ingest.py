@@ -0,0 +1,48 @@
+import json
+import pytest
+from shared_code.order_ingest import iter_ndjson, iter_order_items, pack_messages, validate_items
+from shared_code.order_store import parse_orders
+
+def _order(order_id, email="a@example.com", amount=10):
+    return {"order_id": order_id, "customer_email": email, "amount": amount}
+
+NDJSON = "\n".join(json.dumps(_order(f"o{index}")) for index in range(3)).encode()
+
+@pytest.mark.parametrize("content_type", ["application/x-ndjson", "application/json", "text/plain", ""])
+def test_ndjson_is_read_line_by_line_whatever_the_content_type(content_type):
+    items = list(iter_order_items(NDJSON, content_type))
+    assert [line for line, _ in items] == [1, 2, 3]
+    assert [json.loads(raw)["order_id"] for _, raw in items] == ["o0", "o1", "o2"]
+
+def test_json_array_and_single_order():
+    array = json.dumps([_order("a"), _order("b")]).encode()
+    assert [json.loads(raw)["order_id"] for _, raw in iter_order_items(array, "application/json")] == ["a", "b"]
+    pretty = json.dumps(_order("c"), indent=2).encode()
+    assert [json.loads(raw)["order_id"] for _, raw in iter_order_items(pretty, "application/json")] == ["c"]
+
+def test_ndjson_lines_may_span_chunks():
+    assert list(iter_ndjson([b'{"a":', b' 1}\n\n{"b"', b": 2}"])) == [(1, b'{"a": 1}'), (3, b'{"b": 2}')]
+
+def test_invalid_lines_only_reject_themselves():
+    body = b'{"order_id": "x", "customer_email": "x@example.com", "amount": 1}\nnot json\n{"order_id": "y"}\n'
+    accepted, report = validate_items(iter_order_items(body, "application/x-ndjson"))
+    assert len(accepted) == 1
+    assert [line["accepted"] for line in report] == [True, False, False]
+
+def test_broken_array_stops_with_a_report_entry():
+    accepted, report = validate_items(iter_order_items(b'[{"order_id": "x", "customer_email": "x@e.com", "amount": 1}, {', "application/json"))
+    assert len(accepted) == 1
+    assert not report[-1]["accepted"] and "Malformed body" in report[-1]["error"]
+
+def test_pack_messages_respects_count_and_size():
+    raws = [json.dumps(_order(f"o{index}")) for index in range(10)]
+    messages = pack_messages(raws, max_orders=4)
+    assert [len(json.loads(message)) for message in messages] == [4, 4, 2]
+    for message in pack_messages(raws, max_bytes=len(raws[0]) * 3):
+        assert len(message.encode()) <= len(raws[0]) * 3
+    assert [order["order_id"] for message in messages for order in parse_orders(message)] == [f"o{index}" for index in range(10)]
+
+def test_parse_orders_rejects_an_empty_batch():
+    with pytest.raises(ValueError, match="no orders"):
+        parse_orders(b"[]")
+    assert parse_orders(json.dumps(_order("single")).encode())[0]["order_id"] == "single"
@@ -0,0 +1,109 @@
+import json
+import os
+from types import SimpleNamespace
+import pytest
+import csv_cache
+from avro_codec import SchemaRegistry, SingleObjectDecoder, SingleObjectEncoder
+from feedback_consumer import LocalPartitionContext
+from generate_feedback import load_schema
+from rating_aggregates import ALL_COUNTRIES, AggregatingConsumer, RatingAggregates, consume_local, create_app
+
+PHASE1 = os.path.join(os.path.dirname(__file__), "..", "src", "Phase1")
+SCHEMA = load_schema(os.path.join(PHASE1, "feedback_schema.avsc"))
+
+def _record(variant, rating, country="India", verified=True):
+    return {"review_id": f"{variant}-{rating}", "product_asin": "P1", "variant_asin": variant, "country": country,
+            "review_title": "", "review_description": "", "rating_score": rating, "is_verified": verified,
+            "review_date": "11-08-2024", "timestamp": "2024-08-11T00:00:00"}
+
+def _aggregates(records):
+    aggregates = RatingAggregates()
+    for record in records:
+        aggregates.update(record)
+    return aggregates
+
+def test_counters_per_country_and_overall():
+    aggregates = _aggregates([_record("V1", 5), _record("V1", 2, "Canada", verified=False), _record("V1", 0), _record("V1", None)])
+    assert aggregates.records == 2 and aggregates.rejected == 2
+    overall = aggregates.get("V1")
+    assert (overall["review_count"], overall["mean_rating"], overall["verified_ratio"]) == (2, 3.5, 0.5)
+    assert overall["distribution"] == {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1}
+    assert aggregates.get("V1", "Canada")["review_count"] == 1
+    assert aggregates.get("V1", "Japan") is None and aggregates.get("V2") is None
+
+def test_top_k_order_ties_and_min_count():
+    aggregates = _aggregates([_record("A", 5), _record("B", 5), _record("B", 5), _record("C", 4), _record("C", 4), _record("C", 4)])
+    # A and B tie on the mean rating; B has more reviews
+    assert [row["variant_asin"] for row in aggregates.top_k(3)] == ["B", "A", "C"]
+    assert [row["variant_asin"] for row in aggregates.top_k(2, by="review_count")] == ["C", "B"]
+    assert [row["variant_asin"] for row in aggregates.top_k(10, min_count=2, country="India")] == ["B", "C"]
+    assert aggregates.top_k(10, country="Japan") == []
+    with pytest.raises(ValueError):
+        aggregates.top_k(by="rating")
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "aggregates.json")
+    aggregates = _aggregates([_record("V1", 4), _record("V2", 1, "Canada"), _record("V1", 9)])
+    aggregates.snapshot(path, {"0": {"offset": "42", "events": 3}})
+    loaded, positions = RatingAggregates.load(path)
+    assert positions == {"0": {"offset": "42", "events": 3}}
+    assert (loaded.records, loaded.rejected) == (2, 1)
+    for variant, country in (("V1", ALL_COUNTRIES), ("V1", "India"), ("V2", "Canada")):
+        assert loaded.get(variant, country) == aggregates.get(variant, country)
+    assert loaded.top_k(5) == aggregates.top_k(5)
+    assert RatingAggregates.load(str(tmp_path / "missing.json"))[0].records == 0
+    with open(path, "w") as f:
+        json.dump({"version": 0}, f)
+    with pytest.raises(ValueError):
+        RatingAggregates.load(path)
+
+def _consumer(tmp_path, registry):
+    snapshot_path = str(tmp_path / "aggregates.json")
+    aggregates, positions = RatingAggregates.load(snapshot_path)
+    return AggregatingConsumer(aggregates, SingleObjectDecoder(registry, reader_schema=SCHEMA), snapshot_path,
+                               snapshot_interval=3600, positions=positions)
+
+def test_restart_resumes_after_the_snapshot_without_double_counting(tmp_path):
+    registry = SchemaRegistry(str(tmp_path / "registry"))
+    encode = SingleObjectEncoder(SCHEMA, registry).encode
+    events = [SimpleNamespace(body=[encode(_record(f"V{index % 3}", 1 + index % 5))], offset=str(index)) for index in range(10)]
+    events.insert(4, SimpleNamespace(body=[b"garbage"], offset="x"))
+    context = LocalPartitionContext("0")
+
+    consumer = _consumer(tmp_path, registry)
+    consumer.on_event_batch(context, events[:6])
+    consumer.snapshot()
+    assert context.checkpoint is events[5]
+    consumer.on_event_batch(context, events[6:8]) # Counted, but lost: no snapshot before the "crash"
+
+    restarted = _consumer(tmp_path, registry)
+    assert restarted.aggregates.records == 5 and restarted.starting_position() == {"0": events[5].offset}
+    done = restarted.positions["0"]["events"]
+    restarted.on_event_batch(context, events[done:])
+    assert restarted.aggregates.records == 10
+    assert restarted.aggregates.get("V0")["review_count"] == 4
+
+def test_local_replay_counts_every_event_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_cache, "_default_cache", csv_cache.CsvCache(str(tmp_path / "csv_cache")))
+    registry = SchemaRegistry(str(tmp_path / "registry"))
+    csv_path = os.path.join(PHASE1, "iphone.csv")
+    consumer = _consumer(tmp_path, registry)
+    consume_local(consumer, 300, 50, csv_path, SCHEMA, registry)
+    counted = consumer.aggregates.records + consumer.aggregates.rejected
+    assert counted == 300
+
+    # Same stream again after a restart: everything is in the snapshot already
+    restarted = _consumer(tmp_path, registry)
+    consume_local(restarted, 300, 50, csv_path, SCHEMA, registry)
+    assert restarted.aggregates.records + restarted.aggregates.rejected == counted
+
+def test_api_status_codes():
+    client = create_app(_aggregates([_record("V1", 5), _record("V2", 3)])).test_client()
+    assert client.get("/ratings/V1").get_json()["review_count"] == 1
+    assert client.get("/ratings/V1/India").status_code == 200
+    assert client.get("/ratings/V1/Japan").status_code == 404
+    assert client.get("/ratings/missing").status_code == 404
+    assert [row["variant_asin"] for row in client.get("/top?k=1").get_json()] == ["V1"]
+    assert client.get("/top?k=ten").status_code == 400
+    assert client.get("/top?by=stars").status_code == 400
+    assert client.get("/health").get_json() == {"records": 2, "rejected": 0}
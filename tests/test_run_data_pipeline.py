@@ -0,0 +1,41 @@
+import json
+import os
+import fastavro
+import pyarrow.parquet as pq
+import pytest
+from run_data_pipeline import convert_file
+
+FEEDBACK_SCHEMA = os.path.join(os.path.dirname(__file__), "..", "src", "Phase1", "feedback_schema.avsc")
+BASE_COLUMNS = ["review_id", "product_asin", "variant_asin", "country", "review_title", "review_description",
+                "rating_score", "is_verified", "review_date", "timestamp"]
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def test_feedback_csv_without_the_optional_feature_columns(tmp_path):
+    csv_path = tmp_path / "feedback.csv"
+    csv_path.write_text(",".join(BASE_COLUMNS) + "\n"
+                        "r1,P1,V1,India,Good,Nice phone,5,true,11-08-2024,2024-08-11T00:00:00\n", encoding="utf-8")
+    result = convert_file(str(csv_path), str(tmp_path / "feedback.avro"), "avro", avro_schema=_load(FEEDBACK_SCHEMA))
+    assert result["rows"] == 1
+    with open(tmp_path / "feedback.avro", "rb") as f:
+        record, = fastavro.reader(f)
+    assert record["rating_score"] == 5 and record["is_verified"] is True
+    assert record["review_length"] is None and record["complaint_topics"] is None
+
+def test_missing_fields_get_their_default_and_required_ones_are_reported(tmp_path):
+    schema = {"type": "record", "name": "Row", "fields": [
+        {"name": "id", "type": "string"},
+        {"name": "count", "type": "int", "default": 7},
+        {"name": "label", "type": ["null", "string"]},
+        {"name": "rank", "type": "int"}]}
+    csv_path = tmp_path / "rows.csv"
+    csv_path.write_text("id,rank\na,1\nb,2\n", encoding="utf-8")
+    convert_file(str(csv_path), str(tmp_path / "rows.parquet"), "parquet", avro_schema=schema)
+    assert pq.read_table(tmp_path / "rows.parquet").to_pylist() == [
+        {"id": "a", "count": 7, "label": None, "rank": 1}, {"id": "b", "count": 7, "label": None, "rank": 2}]
+
+    csv_path.write_text("id\na\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=r"\['rank'\]"):
+        convert_file(str(csv_path), str(tmp_path / "rows.avro"), "avro", avro_schema=schema)
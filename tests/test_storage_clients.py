@@ -0,0 +1,24 @@
+import sys
+import pytest
+from fake_azure import CONNECTION_STRING, FakeAzure
+from shared_code import storage_clients
+
+@pytest.fixture
+def without_sdks(monkeypatch):
+    # A None entry in sys.modules makes the import raise ImportError
+    for module in ("azure.storage.blob", "azure.data.tables", "azure.storage.queue"):
+        monkeypatch.setitem(sys.modules, module, None)
+
+def test_registered_clients_do_not_need_the_sdks(monkeypatch, without_sdks):
+    monkeypatch.setenv("AzureWebJobsStorage", CONNECTION_STRING)
+    backend = FakeAzure()
+    backend.install()
+    assert storage_clients.get_queue_service_client() is backend.queue_service_client
+    assert storage_clients.get_table_service_client() is backend.table_service_client
+    assert storage_clients.get_blob_service_client() is backend.blob_service_client
+    queue_client = storage_clients.get_queue_client("order-queue")
+    assert storage_clients.get_queue_client("order-queue") is queue_client
+
+def test_unregistered_client_imports_the_sdk(without_sdks):
+    with pytest.raises(ImportError):
+        storage_clients.get_queue_service_client("UseDevelopmentStorage=true;unregistered")
@@ -0,0 +1,64 @@
+import threading
+from shared_code.table_batcher import TableWriteBuffer
+
+class RecordingTable:
+    """
+    Table client that enforces the transaction rules and rejects entities marked "bad".
+    """
+    def __init__(self):
+        self.rows = {}
+        self.transactions = []
+        self._lock = threading.Lock()
+
+    def _check(self, entities):
+        if any(entity.get("bad") for entity in entities):
+            raise ValueError("bad entity")
+
+    def upsert_entity(self, entity):
+        self._check([entity])
+        with self._lock:
+            self.rows[(entity["PartitionKey"], entity["RowKey"])] = entity
+
+    def submit_transaction(self, operations):
+        entities = [entity for _, entity in operations]
+        assert len(entities) <= 100
+        assert len({entity["PartitionKey"] for entity in entities}) == 1
+        assert len({entity["RowKey"] for entity in entities}) == len(entities)
+        self._check(entities)
+        with self._lock:
+            self.transactions.append(len(entities))
+            for entity in entities:
+                self.rows[(entity["PartitionKey"], entity["RowKey"])] = entity
+
+def _entity(partition, row, **properties):
+    return {"PartitionKey": partition, "RowKey": str(row), **properties}
+
+def test_entities_are_written_in_per_partition_batches():
+    table = RecordingTable()
+    buffer = TableWriteBuffer(table)
+    for row in range(250):
+        buffer.add(_entity("p1", row))
+    for row in range(30):
+        buffer.add(_entity("p2", row))
+    buffer.close()
+    assert len(table.rows) == 280
+    assert sorted(table.transactions) == [30, 50, 100, 100]
+    assert (buffer.succeeded, buffer.failed, buffer.requests) == (280, 0, 4)
+
+def test_last_write_of_a_row_wins():
+    table = RecordingTable()
+    buffer = TableWriteBuffer(table)
+    buffer.add(_entity("p", 1, value="old"))
+    buffer.add(_entity("p", 1, value="new"))
+    buffer.add(_entity("p", 2))
+    buffer.flush()
+    assert table.rows[("p", "1")]["value"] == "new"
+
+def test_a_bad_entity_only_fails_itself():
+    table = RecordingTable()
+    buffer = TableWriteBuffer(table, max_batch_size=8)
+    for row in range(8):
+        buffer.add(_entity("p", row, bad=row == 5))
+    assert buffer.flush() == 1
+    assert buffer.succeeded == 7
+    assert ("p", "5") not in table.rows and len(table.rows) == 7
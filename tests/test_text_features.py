@@ -0,0 +1,34 @@
+import pyarrow as pa
+import pytest
+from bench_text_features import score_row
+from text_features import TextFeatureExtractor, _tokenize
+
+def _rows(features):
+    columns = {name: array.to_pylist() for name, array in features.items()}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def test_tokens_never_span_rows():
+    tokens, parents = _tokenize(pa.array(["ab", "cd", "", "e f", "Ünï"]))
+    assert tokens.to_pylist() == ["ab", "cd", "e", "f", "Ünï"]
+    assert parents.tolist() == [0, 1, 3, 3, 4]
+
+def test_scores_and_topics():
+    rows = _rows(TextFeatureExtractor().extract(
+        ["Great phone", "Not good", None, "Battery"],
+        ["Love the CAMERA, the charger is bad", "no charger in the box", None, "drains fast, heats up, display is nice"]))
+    assert rows[0] == {"review_length": 35, "word_count": 9, "sentiment_score": pytest.approx(1 / 3), "complaint_topics": "charger,camera"}
+    assert rows[1]["sentiment_score"] == -1.0 and rows[1]["complaint_topics"] == "charger,delivery"
+    assert rows[2] == {"review_length": 0, "word_count": 0, "sentiment_score": 0.0, "complaint_topics": None}
+    assert rows[3]["complaint_topics"] == "battery,heating,display"
+
+def test_matches_the_per_row_reference_across_batches():
+    titles = ["Awesome", "Worst purchase", "", "didn't like it", "ok"] * 20
+    descriptions = ["fast and smooth, great battery backup", "phone was broken and the seller refused a refund", "",
+                    "screen scratches easily, not worth the price", "nan"] * 20
+    extractor = TextFeatureExtractor(max_vocabulary=10) # Also exercises clearing the vocabulary
+    rows = []
+    for start in range(0, len(titles), 7):
+        rows += _rows(extractor.extract(titles[start:start + 7], descriptions[start:start + 7]))
+    for row, title, description in zip(rows, titles, descriptions):
+        expected = score_row(title, description)
+        assert row == dict(expected, sentiment_score=pytest.approx(expected["sentiment_score"])) # float32
@@ -0,0 +1,45 @@
+import pytest
+from fake_azure import CONNECTION_STRING, FakeAzure, FakeTableClient
+from shared_code.blob_dedup import BlobDedup
+from shared_code.blob_manifest import load_manifest
+
+@pytest.fixture
+def backend(monkeypatch):
+    import time_trigger
+    monkeypatch.setenv("AzureWebJobsStorage", CONNECTION_STRING)
+    monkeypatch.setattr(time_trigger, "blob_dedup", BlobDedup())
+    backend = FakeAzure()
+    backend.install()
+    return backend
+
+def _fail_rows(monkeypatch, row_keys):
+    upsert_entity, submit_transaction = FakeTableClient.upsert_entity, FakeTableClient.submit_transaction
+    def check(entities):
+        if any(entity["RowKey"] in row_keys for entity in entities):
+            raise ValueError("entity rejected")
+    monkeypatch.setattr(FakeTableClient, "upsert_entity", lambda self, entity, mode=None: check([entity]) or upsert_entity(self, entity, mode))
+    monkeypatch.setattr(FakeTableClient, "submit_transaction",
+                        lambda self, operations: check([entity for _, entity in operations]) or submit_transaction(self, operations))
+
+def _scan(backend):
+    import time_trigger
+    time_trigger.blob_scanner_function(None)
+    manifest = load_manifest(backend.blob_service_client.get_container_client("function-metadata"), "scan_manifest.json.gz")
+    return set(manifest.entries), {row_key for _, row_key in backend.tables["BlobMetadataTable"]}
+
+def test_blobs_whose_metadata_failed_are_not_recorded(backend, monkeypatch):
+    for index in range(5):
+        backend.put_blob("input", f"2025/file-{index}.csv", b"row %d" % index)
+    with monkeypatch.context() as patch:
+        _fail_rows(patch, {"2025---file-3.csv"})
+        recorded, rows = _scan(backend)
+    assert len(backend.containers["output"]) == 5
+    assert recorded == {f"2025/file-{index}.csv" for index in (0, 1, 2, 4)}
+    assert rows == {f"2025---file-{index}.csv" for index in (0, 1, 2, 4)}
+
+    # The next pass picks the blob up again: the dedup check skips the copy and the metadata is written
+    copies = backend.stats()["calls"].get("start_copy_from_url", 0)
+    recorded, rows = _scan(backend)
+    assert recorded == {f"2025/file-{index}.csv" for index in range(5)}
+    assert "2025---file-3.csv" in rows
+    assert backend.stats()["calls"].get("start_copy_from_url", 0) == copies